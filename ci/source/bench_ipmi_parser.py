@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/ci/source/bench_ipmi_parser.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+"""
+.. module:: bench_ipmi_parser
+    :platform: Unix
+    :synopsis: This script times the common.OpTestIPMIParser parsers over large
+        ipmitool outputs.
+
+The outputs are built by repeating lines recorded from palmetto and habanero
+BMCs up to the wanted number of entries, or read from files saved with e.g.
+``ipmitool ... sel elist > sel.txt``::
+
+    python bench_ipmi_parser.py
+    python bench_ipmi_parser.py --entries 5000
+    python bench_ipmi_parser.py --sel sel.txt --sdr sdr.txt
+
+The records parsed from the recorded lines are checked first: the exit code
+is 1 when a parser gets one of them wrong.  Then every parser is run until
+--time seconds have passed and the best time of a run is printed. The exit
+code is 1 when a parser of a table output (sel, sdr, sensor) takes more than
+--budget microseconds per entry, 10 by default, i.e. 10 ms for a thousand
+entries: the parsers take 2 to 6 microseconds per entry with CPython 2.7,
+most of it spent splitting and stripping the columns and building the
+records, so the budget catches a parser gone quadratic or backtracking, not
+the cost of the tuples.
+"""
+import sys
+import os
+import time
+import argparse
+
+# Get path to base directory and append to path to get common modules
+full_path = os.path.abspath(os.path.dirname(sys.argv[0])).split('ci')[0]
+sys.path.append(full_path)
+
+from common.OpTestIPMIParser import OpTestIPMIParser as Parser
+from common.OpTestIPMIParser import OpTestSELRecord, OpTestSensorRecord, \
+    OpTestHPMComponent
+
+SEL_LINES = [
+    "   1 | 04/21/2015 | 10:00:00 | System Event #0x01 | Timestamp Clock Sync | Asserted",
+    "   2 | Pre-Init  |0000000012| System Firmware Progress #0x02 | Motherboard init | Asserted",
+    "   3 | 04/21/2015 | 10:00:05 | Temperature #0x30 | Upper Critical going high | Asserted | Reading 95 > Threshold 90 degrees C",
+    "   4 | 04/21/2015 | 10:00:06 | Processor #0x01 | Transition to Critical from less severe | Asserted",
+    "   5 | 04/21/2015 | 10:00:07 | OS Boot #0x15 | boot completed - device not specified | Asserted",
+    "   6 | 04/21/2015 | 10:00:08 | Power Unit #0x0f | Power off/down | Deasserted",
+]
+
+SDR_ELIST_LINES = [
+    "Host Status      | 10h | ok  |  7.0 | S0/G0: working, Legacy ON state",
+    "CPU Core Temp 1  | 5Bh | ok  |  3.1 | 45 degrees C",
+    "Fan 1            | 6Ah | ok  | 29.1 | 4700 RPM",
+    "Vcs Voltage      | 7Ch | ns  |  3.0 | No Reading",
+    "BMC Golden Side  | 21h | ok  |  7.1 | ",
+]
+
+SDR_LIST_LINES = [
+    "Host Status      | 0x00              | ok",
+    "CPU Core Temp 1  | 45 degrees C      | ok",
+    "Fan 1            | 4700 RPM          | ok",
+    "Vcs Voltage      | no reading        | ns",
+]
+
+SENSOR_LIST_LINES = [
+    "CPU Core Temp 1  | 45.000     | degrees C  | ok    | na        | na        | na        | 95.000    | 100.000   | na",
+    "Fan 1            | 4700.000   | RPM        | ok    | na        | 500.000   | na        | na        | na        | na",
+    "BMC Golden Side  | 0x0        | discrete   | 0x0080| na        | na        | na        | na        | na        | na",
+    "Vcs Voltage      | na         | Volts      | na    | na        | na        | na        | na        | na        | na",
+]
+
+HPM_CHECK = """
+PICMG HPM.1 Upgrade Agent 1.0.9:
+
+-------Target Information-------
+Device Id          : 0x20
+Device Revision    : 0x81
+Product Id         : 0x0985
+Manufacturer Id    : 0xa2b7 (Unknown (0xA2B7))
+
+---------------------------------------------------------------------------
+|ID  | Name        |                     Versions                          |
+|    |             |     Active      |     Backup      |      Deferred     |
+---------------------------------------------------------------------------
+|*  0|BMC          |   2.13 00000000 |   2.12 00000000 | ---.-- -------- |
+|   1|BIOS         |   1.00 00000000 | ---.-- -------- | ---.-- -------- |
+---------------------------------------------------------------------------
+(*) Component requires Payload Cold Reset
+"""
+
+MC_INFO = """Device ID                 : 32
+Device Revision           : 1
+Firmware Revision         : 2.16
+IPMI Version              : 2.0
+Manufacturer ID           : 10876
+Manufacturer Name         : Unknown (0x2A7C)
+Product ID                : 2437 (0x0985)
+Product Name              : Unknown (0x985)
+Device Available          : yes
+Provides Device SDRs      : no
+Additional Device Support :
+    Sensor Device
+    SEL Device
+    FRU Inventory Device
+Aux Firmware Rev Info     :
+    0x01
+    0x02
+    0x00
+    0x00
+"""
+
+FRU_LINES = """FRU Device Description : Builtin FRU Device (ID 0)
+ Board Mfg Date        : Mon Jan  1 00:00:00 1996
+ Board Mfg             : IBM
+ Board Product         : PALMETTO
+ Board Serial          : 0000000000000
+ Board Part Number     : 00UL865
+
+"""
+
+
+def checks():
+    """Returns the checks of the records parsed from the recorded lines
+
+    :returns: list -- (description, parsed, expected) tuples
+    """
+    sdr = Parser.sdr('\n'.join(SDR_ELIST_LINES))
+    sdrList = Parser.sdr('\n'.join(SDR_LIST_LINES))
+    sensors = Parser.sensor('\n'.join(SENSOR_LIST_LINES))
+    mcInfo = Parser.mc_info(MC_INFO)
+    return [
+        ('sel Pre-Init entry', Parser.sel_line(SEL_LINES[1]),
+         OpTestSELRecord(2, 'Pre-Init', '0000000012',
+                         'System Firmware Progress #0x02', 2,
+                         'Motherboard init', 'Asserted', '', SEL_LINES[1])),
+        ('sel threshold entry', Parser.sel_line(SEL_LINES[2])[3:8],
+         ('Temperature #0x30', 0x30, 'Upper Critical going high', 'Asserted',
+          'Reading 95 > Threshold 90 degrees C')),
+        ('sel deasserted entry', Parser.sel_line(SEL_LINES[5]).direction,
+         'Deasserted'),
+        ('sel record IDs', [x.id for x in Parser.sel(repeat(SEL_LINES, 40,
+                                                            True))],
+         range(1, 41)),
+        ('sdr elist states', Parser.states(sdr[0].reading),
+         ['S0/G0: working', 'Legacy ON state']),
+        ('sdr elist number and value', (sdr[1].number, sdr[1].value,
+                                        sdr[1].units),
+         (0x5b, 45.0, 'degrees C')),
+        ('sdr elist no reading', (sdr[3].status, sdr[3].value), ('ns', None)),
+        ('sdr list', [(x.name, x.value, x.status) for x in sdrList],
+         [('Host Status', None, 'ok'), ('CPU Core Temp 1', 45.0, 'ok'),
+          ('Fan 1', 4700.0, 'ok'), ('Vcs Voltage', None, 'ns')]),
+        ('sensor list thresholds', sensors[0],
+         OpTestSensorRecord('CPU Core Temp 1', 45.0, '45.000', 'degrees C',
+                            'ok', (None, None, None, 95.0, 100.0, None))),
+        ('sensor list discrete', sensors[2],
+         OpTestSensorRecord('BMC Golden Side', 0x80, '0x0', 'discrete',
+                            '0x0080', (None,) * 6)),
+        ('sensor list no reading', (sensors[3].value, sensors[3].status),
+         (None, 'na')),
+        ('mc info', mcInfo[:6], (32, 1, '2.16', '2.0', 10876, 2437)),
+        ('mc info aux bytes', mcInfo.aux, [0x01, 0x02, 0x00, 0x00]),
+        ('hpm check', Parser.hpm_check(HPM_CHECK),
+         [OpTestHPMComponent(0, 'BMC', '2.13 00000000', '2.12 00000000', '',
+                             True),
+          OpTestHPMComponent(1, 'BIOS', '1.00 00000000', '', '', False)]),
+        ('fru print', Parser.fru(FRU_LINES)[0].fields.get('Board Product'),
+         'PALMETTO'),
+    ]
+
+
+def repeat(i_lines, i_count, i_sel=False):
+    """Repeats recorded lines up to i_count lines, with increasing record IDs
+    for SEL lines"""
+    l_out = []
+    for l_index in range(i_count):
+        l_line = i_lines[l_index % len(i_lines)]
+        if i_sel:
+            l_line = '%4x |%s' % (l_index + 1, l_line.split('|', 1)[1])
+        l_out.append(l_line)
+    return '\n'.join(l_out) + '\n'
+
+
+def best(i_func, i_arg, i_time):
+    """Runs i_func(i_arg) for i_time seconds, returns (best seconds, result)"""
+    l_best = None
+    l_end = time.time() + i_time
+    while l_best is None or time.time() < l_end:
+        l_start = time.time()
+        l_result = i_func(i_arg)
+        l_elapsed = time.time() - l_start
+        if l_best is None or l_elapsed < l_best:
+            l_best = l_elapsed
+    return l_best, l_result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Times the ipmitool output parsers')
+    parser.add_argument('--entries', type=int, default=1000,
+                        help='Entries of the built outputs (default: 1000)')
+    parser.add_argument('--sel', type=str, help='Recorded sel elist output')
+    parser.add_argument('--sdr', type=str, help='Recorded sdr elist output')
+    parser.add_argument('--sensor', type=str,
+                        help='Recorded sensor list output')
+    parser.add_argument('--time', type=float, default=0.5,
+                        help='Seconds each parser is run (default: 0.5)')
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help='Microseconds allowed per entry of a table '
+                        'output (default: 10.0)')
+    args = parser.parse_args(argv)
+
+    def load(i_path, i_lines, i_sel=False):
+        if i_path:
+            with open(i_path) as f:
+                return f.read()
+        return repeat(i_lines, args.entries, i_sel)
+
+    # (name, parser, output, checked against the budget)
+    cases = [
+        ('sel elist', Parser.sel, load(args.sel, SEL_LINES, True), True),
+        ('sdr elist', Parser.sdr, load(args.sdr, SDR_ELIST_LINES), True),
+        ('sdr list', Parser.sdr, repeat(SDR_LIST_LINES, args.entries), True),
+        ('sensor list', Parser.sensor,
+         load(args.sensor, SENSOR_LIST_LINES), True),
+        ('mc info', Parser.mc_info, MC_INFO, False),
+        ('fru print', Parser.fru, FRU_LINES * 8, False),
+        ('hpm check', Parser.hpm_check, HPM_CHECK, False),
+    ]
+
+    rc = 0
+    for name, parsed, expected in checks():
+        if parsed != expected:
+            print "%s: parsed %r, expected %r" % (name, parsed, expected)
+            rc = 1
+
+    print "%-12s %8s %10s %12s" % ('output', 'records', 'best ms', 'us/record')
+    for name, func, output, budget in cases:
+        elapsed, result = best(func, output, args.time)
+        count = len(result) if isinstance(result, list) else 1
+        over = budget and elapsed * 1e6 > args.budget * max(count, 1)
+        print "%-12s %8d %10.3f %12.3f%s" % (
+            name, count, elapsed * 1000, elapsed * 1e6 / max(count, 1),
+            '  over budget' if over else '')
+        if over:
+            rc = 1
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
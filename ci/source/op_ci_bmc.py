@@ -42,6 +42,7 @@ sys.path.append(full_path)
 
 import ConfigParser
 from common.OpTestSystem import OpTestSystem
+from common.OpTestConstants import OpTestConstants as BMC_CONST
 
 
 def _config_read():
@@ -59,7 +60,9 @@ opTestSys = OpTestSystem(bmcCfg['ip'],bmcCfg['username'],
                          bmcCfg['password'],
                          bmcCfg['usernameipmi'],
                          bmcCfg['passwordipmi'],
-                         testCfg['ffdcdir'])
+                         testCfg['ffdcdir'],
+                         i_ipmiBackend=bmcCfg.get('ipmibackend',
+                                                  BMC_CONST.IPMI_BACKEND_IPMITOOL))
 
 
 def test_init():
@@ -81,26 +84,24 @@ def test_init():
 
 def bmc_reboot():
     """This function issues the reboot command on the BMC console.  It then
-    pings the BMC until it responds, which presumably means that it is done
-    rebooting.  It returns the number of failed pings.  The caller should make
-    returned value is greater than 1
-
-    :returns: int -- the number of ping failures while waiting for the BMC to
-        reboot - TODO
+    waits for the BMC to go down and for ping, IPMI and ssh to answer again.
 
+    :returns: int -- 0: success, 1: error
     """
-    opTestSys.sys_bmc_reboot()
-
-    return 0
+    return opTestSys.sys_bmc_reboot()
 
 
 def pnor_img_transfer():
-    """This function copies the PNOR image to the BMC /tmp dir.
+    """This function copies the PNOR image to the BMC /tmp dir. The
+    'transfermode' test option selects rsync, scp, ssh, sparse or gzip; by
+    default (auto) the fastest method the BMC supports is probed and used.
 
-    :returns: int -- the rsync command return code
+    :returns: int -- the rsync or scp command return code
     """
     return opTestSys.cv_BMC.pnor_img_transfer(testCfg['imagedir'],
-                                              testCfg['imagename'])
+                                              testCfg['imagename'],
+                                              testCfg.get('transfermode',
+                                                  BMC_CONST.TRANSFER_AUTO))
 
 
 def pnor_img_flash():
@@ -111,6 +112,16 @@ def pnor_img_flash():
     return opTestSys.cv_BMC.pnor_img_flash(testCfg['imagename'])
 
 
+def pnor_img_flash_diff():
+    """This function flashes only the PNOR partitions that changed since the
+    last flash, or the whole chip if the partition table changed.
+
+    :returns: int -- the pflash command return code
+    """
+    return opTestSys.cv_BMC.pnor_img_flash_diff(testCfg['imagedir'],
+                                                testCfg['imagename'])
+
+
 def ipmi_sel_clear():
     """This function clears the system event log
 
@@ -178,6 +189,16 @@ def ipl_wait_for_working_state(timeout=10):
     return opTestSys.sys_ipl_wait_for_working_state()
 
 
+def ipmi_boot_profile():
+    """This function writes the per phase timing of the last IPL, built from the
+    captured SOL output, to boot_profile.json and boot_profile_trace.json in the
+    FFDC directory. It only reports: a missing profile is a warning.
+
+    :returns: int -- 0
+    """
+    return opTestSys.sys_boot_profile()
+
+
 def ipmi_sel_check():
     """This function dumps the sel log and looks for specific hostboot error
     log string.
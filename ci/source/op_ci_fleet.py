@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/ci/source/op_ci_fleet.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+"""
+.. module:: op_ci_fleet
+    :platform: Unix
+    :synopsis: This script runs the op_ci_bmc test steps on every system of an
+        inventory at the same time.
+
+The inventory is an op_ci_tools.cfg style file: a [test] section with the
+image and FFDC settings, and one section per system with the keys of the
+[bmc] section::
+
+    [test]
+    imagedir = /images/
+    imagename = palmetto.pnor
+    ffdcdir = /tmp/ffdc/
+
+    [palmetto1]
+    ip = 10.0.0.1
+    username = root
+    password = ...
+    usernameipmi = ADMIN
+    passwordipmi = ...
+
+Every system writes its FFDC and console.log to ffdcdir/<section name>/, the
+result table is printed at the end and written to ffdcdir/fleet_results.json.
+
+    python op_ci_fleet.py lab.cfg
+    python op_ci_fleet.py --steps bmc_reboot,ipmi_sel_clear lab.cfg
+
+"""
+import sys
+import os
+import argparse
+import ConfigParser
+
+# Get path to base directory and append to path to get common modules
+full_path = os.path.abspath(os.path.dirname(sys.argv[0])).split('ci')[0]
+sys.path.append(full_path)
+
+from common.OpTestFleet import OpTestFleet
+from common.OpTestConstants import OpTestConstants as BMC_CONST
+from common.OpTestError import OpTestError
+
+
+def fleet_steps(testCfg):
+    """Returns the steps a fleet can run, named after the op_ci_bmc functions
+
+    :param testCfg: the [test] section of the inventory
+    :type testCfg: dict.
+    :returns: dict -- step name: function called with the OpTestSystem
+    """
+    return {
+        'ipmi_power_off': lambda s: s.sys_power_off(),
+        'ipmi_warm_reset': lambda s: s.sys_warm_reset(),
+        'ipmi_power_soft': lambda s: s.sys_power_soft(),
+        'bmc_reboot': lambda s: s.sys_bmc_reboot(),
+        'ipmi_sel_clear': lambda s: s.sys_sel_clear(),
+        'pnor_img_transfer': lambda s: s.cv_BMC.pnor_img_transfer(
+            testCfg['imagedir'], testCfg['imagename'],
+            testCfg.get('transfermode', BMC_CONST.TRANSFER_AUTO)),
+        'pnor_img_flash': lambda s: s.cv_BMC.pnor_img_flash(
+            testCfg['imagename']),
+        'pnor_img_flash_diff': lambda s: s.cv_BMC.pnor_img_flash_diff(
+            testCfg['imagedir'], testCfg['imagename']),
+        'ipmi_power_on': lambda s: s.sys_power_on(),
+        'ipl_wait_for_working_state':
+            lambda s: s.sys_ipl_wait_for_working_state(),
+        'ipmi_boot_profile': lambda s: s.sys_boot_profile(),
+        'ipmi_sel_check':
+            lambda s: s.sys_sel_check('Transition to Non-recoverable'),
+        'ipmi_apss_get': lambda s: s.sys_apss_get(),
+        'ipmi_sdr_get': lambda s: s.sys_sdr_get(),
+    }
+
+# The steps of op-ci-basic.xml
+BVT_STEPS = ['ipmi_power_off', 'ipmi_warm_reset', 'ipmi_power_soft',
+             'bmc_reboot', 'ipmi_sel_clear', 'pnor_img_transfer',
+             'pnor_img_flash', 'ipmi_power_on', 'ipl_wait_for_working_state',
+             'ipmi_boot_profile', 'ipmi_sel_check', 'ipmi_apss_get',
+             'ipmi_sdr_get']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Runs test steps on all the systems of an inventory\
+                    at the same time')
+    parser.add_argument(
+            'inventory', metavar='inventory', type=str,
+            help='Inventory file, one section per system')
+    parser.add_argument(
+            '--steps', type=str, default=','.join(BVT_STEPS),
+            help='Comma separated steps to run (default: the BVT steps)')
+    parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Systems tested at the same time (default: %d)'
+            % BMC_CONST.FLEET_WORKERS)
+    parser.add_argument(
+            '--ffdcdir', type=str, default=None,
+            help='FFDC directory (default: ffdcdir of the [test] section)')
+    args = parser.parse_args(argv)
+
+    config = ConfigParser.RawConfigParser()
+    config.read(args.inventory)
+    testCfg = {}
+    if config.has_section('test'):
+        testCfg = dict(config.items('test'))
+    ffdcDir = args.ffdcdir or testCfg.get('ffdcdir')
+    if not ffdcDir:
+        print "No FFDC directory, set ffdcdir in [test] or use --ffdcdir"
+        return 1
+
+    allSteps = fleet_steps(testCfg)
+    steps = []
+    for name in args.steps.split(','):
+        if name not in allSteps:
+            print "Unknown step %s, known steps: %s" % (
+                name, ', '.join(sorted(allSteps)))
+            return 1
+        steps.append((name, allSteps[name]))
+
+    try:
+        fleet = OpTestFleet.from_config(args.inventory, ffdcDir, args.workers)
+    except OpTestError:
+        return 1
+    return fleet.run(steps)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,612 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/ci/source/op_ci_server.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+"""
+.. module:: op_ci_server
+    :platform: Unix
+    :synopsis: This script keeps op_ci_bmc loaded in a background process that
+        runs the BVT steps sent by op-ci-bmc-run.
+
+Each ``op-ci-bmc-run "op_ci_bmc.xxx()"`` step of a BVT used to start a python
+interpreter that imported op_ci_bmc, read op_ci_tools.cfg and built a new
+OpTestSystem, losing the SSH sessions, SDR cache, SEL records and SOL capture
+of the steps before.  op-ci-bmc-run now sends the step over a Unix socket to
+this server, which runs it in the same process as the steps before and sends
+back its output and exit code.  op-ci-bmc-run starts the server when it is not
+running, and falls back to an interpreter per step when it can not be started
+or for a step that is not a plain op_ci_bmc function call::
+
+    python op_ci_server.py start
+    python op_ci_server.py status
+    python op_ci_server.py stop
+
+The socket is /tmp/op-ci-bmc-<uid>/<md5 of this directory>-<source stamp>.sock,
+or the OP_CI_BMC_SOCKET environment variable, and what the server prints
+between steps goes to the .log file next to it.  The source stamp is an md5 of
+the names and modification times of the python files of common/ and
+ci/source/: after a code update op-ci-bmc-run starts a new server, and the old
+one exits once it sees the sources changed.  op_ci_bmc is reloaded when
+op_ci_tools.cfg changes, e.g. when run-bvt-setup writes it.  The server exits
+after --idle seconds without a step.  Set OP_CI_BMC_SERVER=0 to have
+op-ci-bmc-run start an interpreter per step as before.
+
+The client sends one line: 'run <expression>', 'status' or 'stop'.  The
+server answers with frames made of a type letter and 8 hex digits: 'O' and 'E'
+are followed by that many bytes of stdout and stderr output, 'X' ends the
+answer with the exit code as the number, 'R' ends it when the server does not
+run that expression and 'B' when it is busy with another step.  A step runs in
+a thread while the server goes on answering; when its client goes away, e.g.
+op-ci-bmc-run was killed by the BVT runner or timed out, the server kills
+itself and the processes of the step, as a hung step can not be stopped
+otherwise.
+"""
+import sys
+import os
+import ast
+import time
+import array
+import errno
+import fcntl
+import glob
+import select
+import signal
+import socket
+import hashlib
+import termios
+import argparse
+import threading
+import traceback
+
+# Get path to base directory and append to path to get common modules
+full_path = os.path.abspath(os.path.dirname(sys.argv[0])).split('ci')[0]
+sys.path.append(full_path)
+
+SOCKET_DIR = '/tmp/op-ci-bmc-%d'
+# Seconds without a step before the server exits
+IDLE_TIMEOUT = 4 * 3600
+# Seconds the start command waits for op_ci_bmc to be loaded
+START_TIMEOUT = 120
+# Seconds the end of a step waits for the output of its child processes
+DRAIN_TIMEOUT = 2
+# Seconds a client has to send its request line
+REQUEST_TIMEOUT = 10
+# Seconds between two checks of the source stamp by an idle server
+SOURCE_CHECK = 60
+
+
+def source_stamp():
+    """Returns an md5 of the names and modification times of the python files
+    of common/ and ci/source/, computed the same way by op-ci-bmc-run
+
+    :returns: string -- 8 hex digits
+    """
+    srcDir = os.path.realpath(os.path.dirname(os.path.abspath(__file__)))
+    baseDir = os.path.dirname(os.path.dirname(srcDir))
+    stamp = ''
+    for name in sorted(glob.glob(os.path.join(baseDir, 'common', '*.py')) +
+                       glob.glob(os.path.join(srcDir, '*.py'))):
+        try:
+            stamp += '%s %d\n' % (name[len(baseDir) + 1:],
+                                   int(os.stat(name).st_mtime))
+        except OSError:
+            continue
+    return hashlib.md5(stamp).hexdigest()[:8]
+
+
+def socket_path():
+    """Returns the socket of the server of this checkout and code level
+
+    :returns: string -- path
+    """
+    if os.environ.get('OP_CI_BMC_SOCKET'):
+        return os.environ['OP_CI_BMC_SOCKET']
+    srcDir = os.path.realpath(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(SOCKET_DIR % os.getuid(), '%s-%s.sock' % (
+        hashlib.md5(srcDir).hexdigest()[:12], source_stamp()))
+
+
+def socket_dir(path):
+    """Creates the directory of the socket, only readable by this user when it
+    is the default one
+
+    :returns: bool -- False when the directory belongs to another user
+    """
+    sockDir = os.path.dirname(path)
+    try:
+        os.makedirs(sockDir, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    if os.environ.get('OP_CI_BMC_SOCKET'):
+        return True
+    st = os.lstat(sockDir)
+    if st.st_uid != os.getuid() or st.st_mode & 077:
+        print "%s is not a private directory of this user" % sockDir
+        return False
+    return True
+
+
+def parse_step(expr):
+    """Parses an 'op_ci_bmc.function(arguments)' expression whose arguments
+    are literals
+
+    :param expr: the expression op-ci-bmc-run was called with
+    :type expr: str.
+    :returns: tuple -- (function name, args, kwargs), or None for any other
+        expression
+    """
+    try:
+        node = ast.parse(expr.strip(), mode='eval').body
+    except SyntaxError:
+        return None
+    if not isinstance(node, ast.Call) or node.starargs or node.kwargs:
+        return None
+    func = node.func
+    if not isinstance(func, ast.Attribute) or \
+       not isinstance(func.value, ast.Name) or \
+       func.value.id != 'op_ci_bmc' or func.attr.startswith('_'):
+        return None
+    try:
+        args = [ast.literal_eval(x) for x in node.args]
+        kwargs = dict((x.arg, ast.literal_eval(x.value))
+                      for x in node.keywords)
+    except ValueError:
+        return None
+    return func.attr, args, kwargs
+
+
+def exit_code(result):
+    """Returns the exit code sys.exit(result) gives, printing result to stderr
+    when it is not a number
+
+    :returns: int
+    """
+    if result is None:
+        return 0
+    if isinstance(result, (int, long)):
+        return result
+    print >> sys.stderr, result
+    return 1
+
+
+def frame(kind, data='', number=None):
+    """Returns a frame of the protocol, see the module documentation"""
+    if number is None:
+        number = len(data)
+    return '%s%08x%s' % (kind, number & 0xffffffff, data)
+
+
+def recv_all(sock, size):
+    """Reads size bytes from sock
+
+    :returns: str -- the bytes, or None when the connection was closed first
+    """
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class StepServer():
+
+    def __init__(self, path, idle, log=None):
+        self.cv_path = path
+        self.cv_idle = idle
+        self.cv_module = None
+        self.cv_cfgStamp = None
+        # connection the output of the step running goes to, None between
+        # steps or once the client went away
+        self.cv_client = None
+        # thread, connection and name of the step running
+        self.cv_step = None
+        self.cv_stepConn = None
+        self.cv_stepName = None
+        # set once the step returned, before its exit code is sent
+        self.cv_stepDone = False
+        self.cv_lock = threading.Lock()
+        if log is None:
+            log = open(os.path.splitext(path)[0] + '.log', 'w', 0)
+        self.cv_log = log
+        self.cv_pipes = []
+
+    def redirect(self):
+        """Sends stdout and stderr of this process and of the processes it
+        starts through pipes, so that the output of a step goes to its client,
+        even when printed by a child process or a thread of an earlier step
+        """
+        for fd, kind in ((1, 'O'), (2, 'E')):
+            readFd, writeFd = os.pipe()
+            os.dup2(writeFd, fd)
+            os.close(writeFd)
+            self.cv_pipes.append(readFd)
+            pump = threading.Thread(target=self.pump, args=(readFd, kind))
+            pump.daemon = True
+            pump.start()
+        sys.stdout = os.fdopen(1, 'w', 1)
+        sys.stderr = os.fdopen(2, 'w', 0)
+
+    def pump(self, fd, kind):
+        """Copies the output read from fd to the log and to the client"""
+        while True:
+            select.select([fd], [], [])
+            # read under the lock, so that pending() sees all the output
+            # not sent yet
+            with self.cv_lock:
+                data = os.read(fd, 65536)
+                if not data:
+                    return
+                self.cv_log.write(data)
+                if self.cv_client is None:
+                    continue
+                try:
+                    self.cv_client.sendall(frame(kind, data))
+                except socket.error:
+                    # the client went away, the step goes on
+                    self.cv_client = None
+
+    def pending(self):
+        """Returns the number of output bytes not read yet from the pipes"""
+        count = 0
+        for fd in self.cv_pipes:
+            buf = array.array('i', [0])
+            fcntl.ioctl(fd, termios.FIONREAD, buf, True)
+            count += buf[0]
+        return count
+
+    def end_step(self):
+        """Sends the rest of the output of the step to its client and detaches
+        it"""
+        sys.stdout.flush()
+        sys.stderr.flush()
+        end = time.time() + DRAIN_TIMEOUT
+        while True:
+            with self.cv_lock:
+                if not self.pending() or time.time() > end:
+                    client = self.cv_client
+                    self.cv_client = None
+                    return client
+            time.sleep(0.01)
+
+    def load(self):
+        """Imports op_ci_bmc, or reloads it when op_ci_tools.cfg changed since
+        it was loaded"""
+        if self.cv_module is None:
+            import ci.source.op_ci_bmc as op_ci_bmc
+            self.cv_module = op_ci_bmc
+            self.cv_cfgStamp = self.cfg_stamp()
+            return
+        stamp = self.cfg_stamp()
+        if stamp != self.cv_cfgStamp:
+            print "op_ci_tools.cfg changed, reloading op_ci_bmc"
+            reload(self.cv_module)
+            self.cv_cfgStamp = stamp
+
+    def cfg_stamp(self):
+        """Returns the modification time and size of op_ci_tools.cfg"""
+        cfgFile = os.path.join(os.path.dirname(self.cv_module.__file__),
+                               'op_ci_tools.cfg')
+        try:
+            st = os.stat(cfgFile)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def start_step(self, conn, expr):
+        """Starts running an op_ci_bmc function in a thread, which sends its
+        output and exit code to conn
+
+        :returns: bool -- True when the step was started
+        """
+        step = parse_step(expr)
+        if step is None or \
+           not callable(getattr(self.cv_module, step[0], None)):
+            conn.sendall(frame('R'))
+            return False
+        if self.cv_step is not None:
+            conn.sendall(frame('B'))
+            return False
+        with self.cv_lock:
+            self.cv_log.write("===== %s\n" % expr.strip())
+            self.cv_client = conn
+        self.cv_stepConn = conn
+        self.cv_stepName = expr.strip()
+        self.cv_stepDone = False
+        self.cv_step = threading.Thread(target=self.run_step, args=step)
+        self.cv_step.daemon = True
+        self.cv_step.start()
+        return True
+
+    def run_step(self, name, args, kwargs):
+        """Runs an op_ci_bmc function, in the step thread"""
+        start = time.time()
+        try:
+            self.load()
+            rc = exit_code(getattr(self.cv_module, name)(*args, **kwargs))
+        except SystemExit as e:
+            rc = exit_code(e.code)
+        except Exception:
+            traceback.print_exc()
+            rc = 1
+        client = self.end_step()
+        self.cv_log.write("===== %s returned %s (%.1fs)\n" % (
+            name, rc, time.time() - start))
+        self.cv_stepDone = True
+        if client is not None:
+            try:
+                client.sendall(frame('X', number=rc))
+            except socket.error:
+                pass
+
+    def end_thread(self):
+        """Forgets the step thread once it ended"""
+        self.cv_step.join()
+        self.cv_stepConn.close()
+        self.cv_step = None
+        self.cv_stepConn = None
+        self.cv_stepName = None
+
+    def abort(self, reason):
+        """Ends the server during a step.  A python thread can not be stopped,
+        so the whole process goes, with the processes of its group the step
+        started."""
+        self.cv_log.write("%s, killing the step %s\n" % (reason,
+                                                          self.cv_stepName))
+        try:
+            os.unlink(self.cv_path)
+        except OSError:
+            pass
+        if os.getpgrp() == os.getpid():
+            os.killpg(os.getpid(), signal.SIGKILL)
+        os._exit(1)
+
+    def handle(self, conn):
+        """Serves one request
+
+        :returns: bool -- False when the server has to stop
+        """
+        # a client that does not send its request does not hold up the others
+        conn.settimeout(REQUEST_TIMEOUT)
+        request = conn.makefile('rb').readline().strip()
+        conn.settimeout(None)
+        command, _, expr = request.partition(' ')
+        if command == 'run':
+            self.start_step(conn, expr)
+        elif command == 'status':
+            running = ''
+            if self.cv_step is not None:
+                running = ', running %s' % self.cv_stepName
+            conn.sendall(frame('O', 'op_ci_server %d serving %s%s\n' % (
+                os.getpid(), self.cv_module.__file__, running)))
+            conn.sendall(frame('X', number=0))
+        elif command == 'stop':
+            conn.sendall(frame('X', number=0))
+            if self.cv_step is not None:
+                self.abort('Stopped')
+            return False
+        else:
+            conn.sendall(frame('E', 'Unknown request %r\n' % request))
+            conn.sendall(frame('X', number=1))
+        return True
+
+    def serve(self, ready=None):
+        """Loads op_ci_bmc, then runs the steps sent to the socket until it is
+        told to stop or is idle for too long
+
+        :param ready: file descriptor written to once the socket listens
+        :type ready: int.
+        :returns: int -- 0: success, 1: error
+        """
+        # SIGTERM stops the server like Ctrl-C, even during a step
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.redirect()
+        try:
+            self.load()
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+        if os.path.exists(self.cv_path):
+            os.unlink(self.cv_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.cv_path)
+        os.chmod(self.cv_path, 0600)
+        sock.listen(5)
+        stamp = source_stamp()
+        last = time.time()
+        print "op_ci_server %d listening on %s" % (os.getpid(), self.cv_path)
+        if ready is not None:
+            os.write(ready, 'ok\n')
+            os.close(ready)
+
+        try:
+            while True:
+                if self.cv_step is None:
+                    readable = select.select([sock], [], [],
+                                             min(self.cv_idle, SOURCE_CHECK))[0]
+                else:
+                    readable = select.select([sock, self.cv_stepConn], [], [],
+                                             1)[0]
+                    if not self.cv_step.is_alive():
+                        self.end_thread()
+                        last = time.time()
+                    elif self.cv_stepConn in readable and \
+                         not self.cv_stepDone:
+                        # the client never sends more than its request line
+                        self.abort('op-ci-bmc-run went away')
+
+                if sock in readable:
+                    conn, _ = sock.accept()
+                    try:
+                        if not self.handle(conn):
+                            print "Stopped"
+                            return 0
+                    except socket.error as e:
+                        print "Lost client: %s" % e
+                    finally:
+                        if conn is not self.cv_stepConn:
+                            conn.close()
+                    last = time.time()
+                elif self.cv_step is None:
+                    if time.time() - last >= self.cv_idle:
+                        print "Idle for %d seconds, exiting" % self.cv_idle
+                        return 0
+                    if source_stamp() != stamp:
+                        # op-ci-bmc-run now talks to a server of the new code
+                        print "The sources changed, exiting"
+                        return 0
+        except KeyboardInterrupt:
+            if self.cv_step is not None:
+                self.abort('Interrupted')
+            raise
+        finally:
+            sock.close()
+            if os.path.exists(self.cv_path):
+                os.unlink(self.cv_path)
+
+
+def request(path, line):
+    """Sends a request to the server and prints its answer
+
+    :returns: int -- the exit code of the request, or None when the server is
+        not running or did not run it
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendall(line + '\n')
+        while True:
+            header = recv_all(sock, 9)
+            if header is None:
+                return None
+            kind, number = header[0], int(header[1:], 16)
+            if kind == 'X':
+                return number
+            if kind in ('R', 'B'):
+                return None
+            data = recv_all(sock, number)
+            if data is None:
+                return None
+            (sys.stderr if kind == 'E' else sys.stdout).write(data)
+    except socket.error:
+        return None
+    finally:
+        sock.close()
+
+
+def start(path, idle):
+    """Starts the server in the background, unless it is running already
+
+    :returns: int -- 0: the server is running, 1: error
+    """
+    if not socket_dir(path):
+        return 1
+    lockFile = open(os.path.splitext(path)[0] + '.lock', 'w')
+    try:
+        fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        # another server runs or is loading op_ci_bmc, wait for its socket
+        end = time.time() + START_TIMEOUT
+        while time.time() < end:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                return 0
+            except socket.error:
+                time.sleep(0.5)
+            finally:
+                sock.close()
+        print "op_ci_server on %s does not answer" % path
+        return 1
+
+    readFd, writeFd = os.pipe()
+    if os.fork():
+        # the server writes to the pipe once listening, and holds the lock
+        # for as long as it runs
+        os.close(writeFd)
+        lockFile.close()
+        answer = os.read(readFd, 16)
+        if answer.startswith('ok'):
+            return 0
+        print "op_ci_server failed to start, see %s" % (
+            os.path.splitext(path)[0] + '.log')
+        return 1
+
+    os.close(readFd)
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    # a process group of its own, which abort() kills with the step
+    os.setpgid(0, 0)
+    null = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null, 0)
+    os.close(null)
+    server = StepServer(path, idle)
+    try:
+        rc = server.serve(writeFd)
+    except KeyboardInterrupt:
+        rc = 0
+    except Exception:
+        traceback.print_exc()
+        rc = 1
+    # the log gets what the pumps did not write yet
+    server.end_step()
+    os._exit(rc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Runs the op_ci_bmc steps of op-ci-bmc-run in one\
+                    process')
+    parser.add_argument(
+            'command', choices=['start', 'status', 'stop', 'serve'],
+            help='serve runs the server in the foreground')
+    parser.add_argument(
+            '--socket', type=str, default=socket_path(),
+            help='Unix socket of the server (default: %(default)s)')
+    parser.add_argument(
+            '--idle', type=int, default=IDLE_TIMEOUT,
+            help='Seconds without a step before the server exits\
+                    (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'start':
+        return start(args.socket, args.idle)
+    if args.command == 'serve':
+        if not socket_dir(args.socket):
+            return 1
+        log = os.fdopen(os.dup(1), 'w', 0)
+        return StepServer(args.socket, args.idle, log).serve()
+    rc = request(args.socket, args.command)
+    if rc is None:
+        print "op_ci_server is not running on %s" % args.socket
+        return 1
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -57,12 +57,18 @@ def test_pnor_img_transfer():
 def test_pnor_img_flash():
     assert op_ci_bmc.pnor_img_flash() == 0
 
+def test_pnor_img_flash_diff():
+    assert op_ci_bmc.pnor_img_flash_diff() == 0
+
 def test_ipmi_power_on():
     assert op_ci_bmc.ipmi_power_on() == 0
 
 def test_wait_for_working_state():
     assert op_ci_bmc.ipl_wait_for_working_state() == 0
 
+def test_ipmi_boot_profile():
+    assert op_ci_bmc.ipmi_boot_profile() == 0
+
 def test_ipmi_sel_check():
     assert op_ci_bmc.ipmi_sel_check() == 0
 
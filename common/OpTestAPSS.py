@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestAPSS.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestAPSS
+#  APSS register dump decoding
+#
+#  This class turns APSS register dumps, as read by OpTestIPMI.ipmi_apss_read()
+#  or written to host_apss.log by OpTestIPMI.ipmi_apss_get(), into NumPy
+#  arrays. Any number of snapshots are stacked into one (N, 0x3b) array of
+#  register bytes and decoded at once: the 16 ADC channels (LSB | MSB << 8),
+#  the 8 DAC values and the GPIO bitfields, and optionally per rail power
+#  from per board gain/offset tables. NumPy is only needed by this module.
+
+import re
+import csv
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from OpTestError import OpTestError
+
+class OpTestAPSS():
+
+    # Register layout, see OpTestIPMI.ResponseDict
+    REG_COUNT = 0x3b
+    REG_REV_CODE = 0x01
+    REG_DAC = 0x02
+    DAC_COUNT = 8
+    REG_ADC = 0x14
+    ADC_COUNT = 16
+    REG_GPIO_IN = 0x34
+    REG_GPIO_MODE = 0x36
+    REG_GPIO_READONLY = 0x38
+
+    LOG_LINE = re.compile(r'^\|\s*0x([0-9a-fA-F]+)\s*\|[^|]*\|\s*0x([0-9a-fA-F]+)\s*\|')
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_gain @type list: optional per ADC channel gain (W per count)
+    # @param i_offset @type list: optional per ADC channel offset (W)
+    # @param i_rails @type list: optional per ADC channel rail names
+    #
+    def __init__(self, i_gain=None, i_offset=None, i_rails=None):
+        if numpy is None:
+            raise OpTestError("APSS decoding needs the numpy module")
+        self.cv_gain = None
+        self.cv_offset = None
+        self.cv_rails = i_rails or ['CH%d' % x for x in range(self.ADC_COUNT)]
+        if i_gain is not None:
+            self.set_table(i_gain, i_offset)
+
+    ##
+    # @brief Sets the gain/offset table used to compute per rail power
+    #
+    # @param i_gain @type list: per ADC channel gain, 16 values
+    # @param i_offset @type list: per ADC channel offset, 16 values or None
+    #
+    def set_table(self, i_gain, i_offset=None):
+        l_gain = numpy.asarray(i_gain, dtype=numpy.float64)
+        if i_offset is None:
+            l_offset = numpy.zeros(self.ADC_COUNT)
+        else:
+            l_offset = numpy.asarray(i_offset, dtype=numpy.float64)
+        if l_gain.shape != (self.ADC_COUNT,) or l_offset.shape != (self.ADC_COUNT,):
+            raise OpTestError("APSS gain/offset tables need %d entries"
+                              % self.ADC_COUNT)
+        self.cv_gain = l_gain
+        self.cv_offset = l_offset
+
+    ##
+    # @brief Loads a board gain/offset table from a csv file with the columns
+    #        channel,rail,gain,offset (a header line is allowed)
+    #
+    def load_table(self, i_path):
+        l_gain = [None] * self.ADC_COUNT
+        l_offset = [0.0] * self.ADC_COUNT
+        with open(i_path) as f:
+            for l_row in csv.reader(f):
+                if not l_row or not l_row[0].strip().isdigit():
+                    continue
+                l_chan = int(l_row[0])
+                if l_chan >= self.ADC_COUNT:
+                    raise OpTestError("Bad APSS channel %d in %s"
+                                      % (l_chan, i_path))
+                self.cv_rails[l_chan] = l_row[1].strip()
+                l_gain[l_chan] = float(l_row[2])
+                if len(l_row) > 3 and l_row[3].strip():
+                    l_offset[l_chan] = float(l_row[3])
+        if None in l_gain:
+            raise OpTestError("%s does not cover all %d APSS channels"
+                              % (i_path, self.ADC_COUNT))
+        self.set_table(l_gain, l_offset)
+
+    ##
+    # @brief Stacks snapshots into a (N, REG_COUNT) uint8 register array
+    #
+    # @param i_snapshots: a list of {address: value} dicts (ipmi_apss_read),
+    #        a single dict, or anything numpy.asarray turns into (N, REG_COUNT)
+    #
+    # @return numpy uint8 array or raise OpTestError
+    #
+    def stack(self, i_snapshots):
+        if isinstance(i_snapshots, dict):
+            i_snapshots = [i_snapshots]
+        if isinstance(i_snapshots, list) and i_snapshots and \
+           isinstance(i_snapshots[0], dict):
+            l_regs = numpy.zeros((len(i_snapshots), self.REG_COUNT), numpy.uint8)
+            for l_row, l_snap in enumerate(i_snapshots):
+                l_keys = numpy.fromiter(l_snap.keys(), numpy.intp, len(l_snap))
+                l_vals = numpy.fromiter(l_snap.values(), numpy.intp, len(l_snap))
+                l_regs[l_row, l_keys] = l_vals
+            return l_regs
+        l_regs = numpy.asarray(i_snapshots, dtype=numpy.uint8)
+        if l_regs.ndim == 1:
+            l_regs = l_regs[numpy.newaxis, :]
+        if l_regs.ndim != 2 or l_regs.shape[1] != self.REG_COUNT:
+            raise OpTestError("APSS snapshots must have %d registers"
+                              % self.REG_COUNT)
+        return l_regs
+
+    ##
+    # @brief Reads host_apss.log files into a (N, REG_COUNT) register array
+    #
+    # @param i_paths @type list: log files written by ipmi_apss_get
+    #
+    # @return numpy uint8 array
+    #
+    def read_logs(self, i_paths):
+        l_regs = numpy.zeros((len(i_paths), self.REG_COUNT), numpy.uint8)
+        for l_row, l_path in enumerate(i_paths):
+            with open(l_path) as f:
+                for l_line in f:
+                    l_match = self.LOG_LINE.match(l_line)
+                    if l_match:
+                        l_regs[l_row, int(l_match.group(1), 16)] = \
+                            int(l_match.group(2), 16)
+        return l_regs
+
+    ##
+    # @brief Decodes a stack of snapshots
+    #
+    # @param i_snapshots: anything accepted by stack()
+    #
+    # @return dict of numpy arrays, N being the number of snapshots:
+    #         'rev' (N,), 'dac' (N, 8), 'adc' (N, 16) uint16,
+    #         'gpio_in' / 'gpio_mode' (N, 16) and 'gpio_readonly' (N, 8) bool
+    #         bit arrays (bit 0 first), and 'power' (N, 16) / 'total_power'
+    #         (N,) when a gain/offset table is set
+    #
+    def decode(self, i_snapshots):
+        l_regs = self.stack(i_snapshots)
+        l_adcBytes = l_regs[:, self.REG_ADC:self.REG_ADC + 2 * self.ADC_COUNT]
+        l_adc = l_adcBytes[:, 0::2].astype(numpy.uint16) | \
+                (l_adcBytes[:, 1::2].astype(numpy.uint16) << 8)
+        l_result = {
+            'rev': l_regs[:, self.REG_REV_CODE].copy(),
+            'dac': l_regs[:, self.REG_DAC:self.REG_DAC + self.DAC_COUNT].copy(),
+            'adc': l_adc,
+            'gpio_in': self._bits(l_regs[:, self.REG_GPIO_IN:self.REG_GPIO_IN + 2]),
+            'gpio_mode': self._bits(l_regs[:, self.REG_GPIO_MODE:self.REG_GPIO_MODE + 2]),
+            'gpio_readonly': self._bits(l_regs[:, self.REG_GPIO_READONLY:self.REG_GPIO_READONLY + 1]),
+        }
+        if self.cv_gain is not None:
+            l_result['power'] = self.power(l_adc)
+            l_result['total_power'] = l_result['power'].sum(axis=1)
+        return l_result
+
+    ##
+    # @brief Computes per rail power from ADC counts with the gain/offset table
+    #
+    # @param i_adc: (N, 16) ADC array as returned by decode()
+    #
+    # @return (N, 16) float64 array
+    #
+    def power(self, i_adc):
+        if self.cv_gain is None:
+            raise OpTestError("No APSS gain/offset table set")
+        return numpy.asarray(i_adc, dtype=numpy.float64) * self.cv_gain + \
+               self.cv_offset
+
+    def _bits(self, i_bytes):
+        return numpy.unpackbits(i_bytes[:, :, numpy.newaxis], axis=2)[:, :, ::-1] \
+               .reshape(i_bytes.shape[0], -1).astype(bool)
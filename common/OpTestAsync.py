@@ -0,0 +1,683 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestAsync.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestAsync
+#  Event loop driven IPMI, BMC and host operations
+#
+#  OpTestEventLoop is a select() based event loop running generator
+#  coroutines: a coroutine yields an OpTestFuture (or another coroutine, or a
+#  list of them) and is resumed with its result, or has its error raised at the
+#  yield. It returns a value by raising AsyncReturn. Child processes are read
+#  through non blocking pipes or ptys registered with the loop, so one thread
+#  can drive ipmitool, ssh and SOL consoles of many systems at once.
+#
+#  AsyncOpTestSystem wraps an OpTestSystem with coroutine versions of the
+#  power, IPL wait, SEL/SDR and BMC/host command operations:
+#
+#      l_loop = OpTestEventLoop()
+#      l_systems = [AsyncOpTestSystem(x, l_loop) for x in systems]
+#      l_loop.run_until_complete([x.power_on() for x in l_systems])
+#      l_loop.run_until_complete([x.ipl_wait() for x in l_systems])
+
+import os
+import sys
+import time
+import heapq
+import fcntl
+import errno
+import shlex
+import types
+import select
+import threading
+import collections
+import subprocess
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+from OpTestSSHMaster import OpTestSSHMaster
+from OpTestSOL import OpTestSOL
+from OpTestIPMIParser import OpTestIPMIParser
+
+##
+# Raised by a coroutine to return a value
+#
+class AsyncReturn(Exception):
+
+    def __init__(self, i_value=None):
+        Exception.__init__(self)
+        self.cv_value = i_value
+
+
+class OpTestFuture():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_loop @type OpTestEventLoop: loop running the done callbacks
+    #
+    def __init__(self, i_loop):
+        self.cv_loop = i_loop
+        self.cv_done = False
+        self.cv_result = None
+        # (error, traceback) once failed
+        self.cv_error = None
+        self.cv_callbacks = []
+        # subprocess.Popen object of OpTestEventLoop.subprocess() futures
+        self.cv_proc = None
+
+    def done(self):
+        return self.cv_done
+
+    ##
+    # @brief Returns the result, or raises the error the future failed with
+    #
+    def result(self):
+        if not self.cv_done:
+            raise OpTestError("Result requested before the operation ended")
+        if self.cv_error is not None:
+            raise self.cv_error[0].__class__, self.cv_error[0], self.cv_error[1]
+        return self.cv_result
+
+    def set_result(self, i_value):
+        if self.cv_done:
+            return
+        self.cv_result = i_value
+        self._finish()
+
+    ##
+    # @brief Fails the future
+    #
+    # @param i_error: exception instance
+    # @param i_traceback: optional traceback it was raised with
+    #
+    def set_error(self, i_error, i_traceback=None):
+        if self.cv_done:
+            return
+        self.cv_error = (i_error, i_traceback)
+        self._finish()
+
+    ##
+    # @brief Calls callback(future) from the loop once the future is done
+    #
+    def add_done_callback(self, i_callback):
+        if self.cv_done:
+            self.cv_loop.call_soon(i_callback, self)
+        else:
+            self.cv_callbacks.append(i_callback)
+
+    def _finish(self):
+        self.cv_done = True
+        for l_callback in self.cv_callbacks:
+            self.cv_loop.call_soon(l_callback, self)
+        self.cv_callbacks = []
+
+
+class OpTestTask(OpTestFuture):
+
+    ##
+    # @brief Initialize this object and schedule the first step of the
+    #        coroutine, use OpTestEventLoop.ensure() to create one
+    #
+    # @param i_coro: generator coroutine
+    #
+    def __init__(self, i_loop, i_coro):
+        OpTestFuture.__init__(self, i_loop)
+        self.cv_coro = i_coro
+        i_loop.call_soon(self._step, None, None)
+
+    def _step(self, i_value, i_error):
+        try:
+            if i_error is not None:
+                l_yielded = self.cv_coro.throw(i_error[0].__class__,
+                                               i_error[0], i_error[1])
+            else:
+                l_yielded = self.cv_coro.send(i_value)
+        except StopIteration:
+            self.set_result(None)
+            return
+        except AsyncReturn as e:
+            self.set_result(e.cv_value)
+            return
+        except Exception as e:
+            self.set_error(e, sys.exc_info()[2])
+            return
+
+        try:
+            l_future = self.cv_loop.ensure(l_yielded)
+        except OpTestError as e:
+            self.cv_loop.call_soon(self._step, None, (e, None))
+            return
+        l_future.add_done_callback(self._wakeup)
+
+    def _wakeup(self, i_future):
+        self._step(i_future.cv_result, i_future.cv_error)
+
+
+##
+# A callback scheduled by OpTestEventLoop.call_later()
+#
+class _OpTestTimer():
+
+    def __init__(self, i_when, i_callback, i_args):
+        self.cv_when = i_when
+        self.cv_callback = i_callback
+        self.cv_args = i_args
+        self.cv_active = True
+
+    def cancel(self):
+        self.cv_active = False
+
+
+class OpTestEventLoop():
+
+    def __init__(self):
+        self.cv_ready = collections.deque()
+        # heap of (when, sequence, _OpTestTimer)
+        self.cv_timers = []
+        self.cv_seq = 0
+        # fd: callback() called when the fd is readable
+        self.cv_readers = {}
+        # callbacks queued by other threads, the pipe wakes up select()
+        self.cv_lock = threading.Lock()
+        self.cv_threadsafe = []
+        self.cv_wakeRead, self.cv_wakeWrite = os.pipe()
+        for l_fd in (self.cv_wakeRead, self.cv_wakeWrite):
+            self._set_nonblocking(l_fd)
+        self.add_reader(self.cv_wakeRead, self._wakeup_read)
+
+    def _set_nonblocking(self, i_fd):
+        l_flags = fcntl.fcntl(i_fd, fcntl.F_GETFL)
+        fcntl.fcntl(i_fd, fcntl.F_SETFL, l_flags | os.O_NONBLOCK)
+
+    ##
+    # @brief Closes the wakeup pipe, the loop can not be used afterwards
+    #
+    def close(self):
+        self.remove_reader(self.cv_wakeRead)
+        os.close(self.cv_wakeRead)
+        os.close(self.cv_wakeWrite)
+
+    def call_soon(self, i_callback, *i_args):
+        self.cv_ready.append((i_callback, i_args))
+
+    ##
+    # @brief Schedules a callback from another thread
+    #
+    def call_soon_threadsafe(self, i_callback, *i_args):
+        with self.cv_lock:
+            self.cv_threadsafe.append((i_callback, i_args))
+        try:
+            os.write(self.cv_wakeWrite, 'x')
+        except OSError as e:
+            # the pipe is full, the loop is already being woken up
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def _wakeup_read(self):
+        try:
+            while os.read(self.cv_wakeRead, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        with self.cv_lock:
+            l_calls = self.cv_threadsafe
+            self.cv_threadsafe = []
+        self.cv_ready.extend(l_calls)
+
+    ##
+    # @brief Schedules a callback
+    #
+    # @param i_delay @type float: seconds from now
+    #
+    # @return timer object with a cancel() method
+    #
+    def call_later(self, i_delay, i_callback, *i_args):
+        l_timer = _OpTestTimer(time.time() + i_delay, i_callback, i_args)
+        self.cv_seq += 1
+        heapq.heappush(self.cv_timers, (l_timer.cv_when, self.cv_seq, l_timer))
+        return l_timer
+
+    def add_reader(self, i_fd, i_callback):
+        self.cv_readers[i_fd] = i_callback
+
+    def remove_reader(self, i_fd):
+        self.cv_readers.pop(i_fd, None)
+
+    def _run_once(self):
+        l_timeout = None
+        if self.cv_ready:
+            l_timeout = 0
+        elif self.cv_timers:
+            l_timeout = max(0, self.cv_timers[0][0] - time.time())
+        try:
+            l_readable = select.select(self.cv_readers.keys(), [], [],
+                                       l_timeout)[0]
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            l_readable = []
+        for l_fd in l_readable:
+            l_callback = self.cv_readers.get(l_fd)
+            if l_callback is not None:
+                l_callback()
+
+        l_now = time.time()
+        while self.cv_timers and self.cv_timers[0][0] <= l_now:
+            l_timer = heapq.heappop(self.cv_timers)[2]
+            if l_timer.cv_active:
+                self.cv_ready.append((l_timer.cv_callback, l_timer.cv_args))
+
+        # callbacks scheduled by these run on the next pass
+        for l_index in range(len(self.cv_ready)):
+            l_callback, l_args = self.cv_ready.popleft()
+            l_callback(*l_args)
+
+    ##
+    # @brief Returns a future for a coroutine, a future or a list of them
+    #
+    # @return OpTestFuture object, a list gives a future of the list of
+    #         results (see gather)
+    #
+    def ensure(self, i_work):
+        if isinstance(i_work, OpTestFuture):
+            return i_work
+        if isinstance(i_work, types.GeneratorType):
+            return OpTestTask(self, i_work)
+        if isinstance(i_work, (list, tuple)):
+            return self.gather(i_work)
+        raise OpTestError("Can not wait for %r" % (i_work,))
+
+    ##
+    # @brief Runs the loop until a coroutine, future or list of them is done
+    #
+    # @return its result, or raise its error
+    #
+    def run_until_complete(self, i_work):
+        l_future = self.ensure(i_work)
+        while not l_future.done():
+            self._run_once()
+        return l_future.result()
+
+    ##
+    # @brief Returns a future done after a delay
+    #
+    def sleep(self, i_delay, i_value=None):
+        l_future = OpTestFuture(self)
+        self.call_later(i_delay, l_future.set_result, i_value)
+        return l_future
+
+    ##
+    # @brief Returns a future of the results of several coroutines or
+    #        futures, in order. It fails with the first error.
+    #
+    def gather(self, i_works):
+        l_future = OpTestFuture(self)
+        l_futures = [self.ensure(x) for x in i_works]
+        l_results = [None] * len(l_futures)
+        l_left = [len(l_futures)]
+        def done(i_index, i_done):
+            if i_done.cv_error is not None:
+                l_future.set_error(*i_done.cv_error)
+                return
+            l_results[i_index] = i_done.cv_result
+            l_left[0] -= 1
+            if l_left[0] == 0:
+                l_future.set_result(l_results)
+        for l_index, l_item in enumerate(l_futures):
+            l_item.add_done_callback(lambda f, i=l_index: done(i, f))
+        if not l_futures:
+            l_future.set_result([])
+        return l_future
+
+    ##
+    # @brief Returns a future done when the first of several coroutines or
+    #        futures is done, with that one as result
+    #
+    def first(self, i_works):
+        l_future = OpTestFuture(self)
+        for l_item in [self.ensure(x) for x in i_works]:
+            l_item.add_done_callback(l_future.set_result)
+        return l_future
+
+    ##
+    # @brief Runs a blocking function in a thread
+    #
+    # @return future of its return value
+    #
+    def run_in_thread(self, i_func, *i_args):
+        l_future = OpTestFuture(self)
+        def worker():
+            try:
+                l_value = i_func(*i_args)
+            except Exception as e:
+                self.call_soon_threadsafe(l_future.set_error, e,
+                                          sys.exc_info()[2])
+            else:
+                self.call_soon_threadsafe(l_future.set_result, l_value)
+        l_thread = threading.Thread(target=worker)
+        l_thread.daemon = True
+        l_thread.start()
+        return l_future
+
+    ##
+    # @brief Runs a command, reading its output from the loop
+    #
+    # @param i_args @type list: command and arguments
+    # @param i_timeout @type float: seconds after which the command is killed
+    #        and the future fails, None to wait forever
+    # @param i_onData: optional function called with every chunk of output
+    #        instead of collecting it
+    # @param i_pty @type bool: run the command on a pseudo terminal, for
+    #        commands like 'ipmitool sol activate' that need one
+    #
+    # @return future of (exit code, output), with the subprocess.Popen object
+    #         in cv_proc
+    #
+    def subprocess(self, i_args, i_timeout=None, i_onData=None, i_pty=False):
+        l_future = OpTestFuture(self)
+        try:
+            if i_pty:
+                l_fd, l_slave = os.openpty()
+                try:
+                    l_proc = subprocess.Popen(i_args, stdin=l_slave,
+                                              stdout=l_slave, stderr=l_slave,
+                                              close_fds=True,
+                                              preexec_fn=os.setsid)
+                finally:
+                    os.close(l_slave)
+            else:
+                l_null = open(os.devnull, 'r')
+                try:
+                    l_proc = subprocess.Popen(i_args, stdin=l_null,
+                                              stdout=subprocess.PIPE,
+                                              stderr=subprocess.STDOUT,
+                                              close_fds=True)
+                finally:
+                    l_null.close()
+                l_fd = l_proc.stdout.fileno()
+        except OSError as e:
+            if i_pty:
+                os.close(l_fd)
+            l_future.set_error(OpTestError("Can not run %s: %s"
+                                           % (i_args[0], e)))
+            return l_future
+        self._set_nonblocking(l_fd)
+        l_future.cv_proc = l_proc
+
+        l_chunks = []
+        l_killed = []
+        l_timer = [None]
+        def kill():
+            l_killed.append(True)
+            try:
+                l_proc.kill()
+            except OSError:
+                pass
+        def reap():
+            l_rc = l_proc.poll()
+            if l_rc is None:
+                self.call_later(BMC_CONST.ASYNC_REAP_INTERVAL, reap)
+                return
+            if l_timer[0] is not None:
+                l_timer[0].cancel()
+            if l_killed:
+                l_future.set_error(OpTestError(
+                    "Timeout occured after %d seconds: %s" % (i_timeout,
+                                                              i_args[0])))
+            else:
+                l_future.set_result((l_rc, ''.join(l_chunks)))
+        def read():
+            try:
+                l_data = os.read(l_fd, BMC_CONST.ASYNC_READ_SIZE)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return
+                # a pty reads EIO once the command exited
+                l_data = ''
+            if l_data:
+                if i_onData is None:
+                    l_chunks.append(l_data)
+                else:
+                    try:
+                        i_onData(l_data)
+                    except Exception as e:
+                        print "Output handler of %s failed: %s" % (i_args[0], e)
+                return
+            self.remove_reader(l_fd)
+            if i_pty:
+                os.close(l_fd)
+            else:
+                l_proc.stdout.close()
+            reap()
+
+        self.add_reader(l_fd, read)
+        if i_timeout is not None:
+            l_timer[0] = self.call_later(i_timeout, kill)
+        return l_future
+
+
+class AsyncOpTestSystem():
+
+    ##
+    # @brief Initialize this object. Every method is a coroutine, run it with
+    #        the loop, e.g. loop.run_until_complete(system.power_on()), or
+    #        yield it from another coroutine.
+    #
+    # @param i_system @type OpTestSystem: system to operate on
+    # @param i_loop @type OpTestEventLoop: loop to run on, a new one if None
+    #
+    def __init__(self, i_system, i_loop=None):
+        self.cv_system = i_system
+        self.cv_IPMI = i_system.cv_IPMI
+        self.cv_BMC = i_system.cv_BMC
+        self.cv_LPAR = i_system.cv_LPAR
+        self.cv_loop = i_loop or OpTestEventLoop()
+
+    ##
+    # @brief Runs an ipmitool command, e.g. 'chassis power status'
+    #
+    # @return (coroutine) the command output or raise OpTestError
+    #
+    def ipmitool(self, i_args, i_timeout=BMC_CONST.ASYNC_CMD_TIMEOUT):
+        l_rc, l_output = yield self.cv_loop.subprocess(
+            shlex.split(self.cv_IPMI.cv_cmd + i_args), i_timeout)
+        if l_rc != 0:
+            l_msg = "%s: ipmitool %s failed (rc %d): %s" % (
+                self.cv_IPMI.cv_bmcIP, i_args, l_rc, l_output.strip())
+            print l_msg
+            raise OpTestError(l_msg)
+        raise AsyncReturn(l_output)
+
+    def _power(self, i_action, i_expect, i_what):
+        if i_action == 'on':
+            self.cv_IPMI.ipmi_flash_manifest_invalidate()
+        l_output = yield self.ipmitool('chassis power ' + i_action)
+        if OpTestIPMIParser.power_control(l_output) != i_expect:
+            l_msg = "%s: Power %s Failed" % (self.cv_IPMI.cv_bmcIP, i_what)
+            print l_msg
+            raise OpTestError(l_msg)
+        raise AsyncReturn(BMC_CONST.FW_SUCCESS)
+
+    ##
+    # @brief Power on, power off and power soft the system
+    #
+    # @return (coroutine) BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def power_on(self):
+        return self._power('on', 'Up/On', 'ON')
+
+    def power_off(self):
+        return self._power('off', 'Down/Off', 'OFF')
+
+    def power_soft(self):
+        return self._power('soft', 'Soft', 'Soft')
+
+    ##
+    # @brief Reads the system event log and the sensor data records
+    #
+    # @return (coroutine) 'sel elist' and 'sdr elist' output
+    #
+    def sel_list(self):
+        return self.ipmitool('sel elist')
+
+    def sdr_list(self):
+        return self.ipmitool('sdr elist')
+
+    ##
+    # @brief Returns the number of a sensor, shared with the OpTestIPMI cache.
+    #        The first lookup may have to dump the SDR repository, it runs in
+    #        a thread.
+    #
+    # @return (coroutine) sensor number or None
+    #
+    def sensor_number(self, i_name):
+        if self.cv_IPMI.cv_sensorNums is None:
+            l_num = yield self.cv_loop.run_in_thread(
+                self.cv_IPMI.ipmi_get_sensor_number, i_name)
+            raise AsyncReturn(l_num)
+        raise AsyncReturn(self.cv_IPMI.cv_sensorNums.get(i_name))
+
+    ##
+    # @brief Reads the Host Status sensor, see
+    #        OpTestIPMI.ipmi_host_status_working
+    #
+    # @return (coroutine) True, False or None
+    #
+    def host_status_working(self):
+        l_num = yield self.sensor_number(BMC_CONST.HOST_STATUS_SENSOR)
+        if l_num is None:
+            l_output = yield self.sdr_list()
+            l_records = [x for x in OpTestIPMIParser.sdr(l_output)
+                         if x.name == BMC_CONST.HOST_STATUS_SENSOR]
+            if not l_records:
+                raise AsyncReturn(None)
+            raise AsyncReturn(BMC_CONST.HOST_STATUS_WORKING_STATE in
+                              OpTestIPMIParser.states(l_records[0].reading))
+        # like the blocking read, a failed reading is None and the IPL wait
+        # keeps polling
+        try:
+            l_rc, l_output = yield self.cv_loop.subprocess(
+                shlex.split(self.cv_IPMI.cv_cmd + 'raw 0x04 0x2d 0x%02x' % l_num),
+                BMC_CONST.ASYNC_CMD_TIMEOUT)
+        except OpTestError:
+            raise AsyncReturn(None)
+        raise AsyncReturn(self.cv_IPMI.ipmi_host_status_parse(l_output))
+
+    ##
+    # @brief Captures the SOL console to host_sol.log and host_sol.idx in the
+    #        FFDC directory and waits for the IPL to end: the Host Status
+    #        sensor reading working state or the petitboot banner on the
+    #        console, as OpTestIPMI.ipl_wait_for_working_state does
+    #
+    # @param i_timeout @type int: minutes to wait
+    #
+    # @return (coroutine) BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def ipl_wait(self, i_timeout=10):
+        l_loop = self.cv_loop
+        l_ipmi = self.cv_IPMI
+        try:
+            yield self.ipmitool('sol deactivate')
+        except OpTestError:
+            print 'SOL already deactivated'
+        yield l_loop.sleep(2)
+
+        l_sol = OpTestSOL(l_ipmi.cv_bmcIP, l_ipmi.cv_bmcUser, l_ipmi.cv_bmcPwd,
+                          l_ipmi.cv_ffdcDir + '/' + 'host_sol.log', False,
+                          l_ipmi.cv_ffdcDir + '/' + 'host_sol.idx')
+        l_sol.attach()
+        l_banner = OpTestFuture(l_loop)
+        l_sol.watch(BMC_CONST.IPL_SOL_BANNER,
+                    lambda w, m: l_banner.set_result(True))
+        l_capture = l_loop.subprocess(shlex.split(l_sol.cv_cmd), None,
+                                      l_sol.feed, True)
+
+        l_start = time.time()
+        l_end = l_start + BMC_CONST.IPL_SETTLE_TIME + 60 * i_timeout
+        l_seenOff = False
+        l_interval = BMC_CONST.IPL_POLL_MIN
+        try:
+            while True:
+                l_working = yield self.host_status_working()
+                if l_working:
+                    if l_seenOff or \
+                       time.time() - l_start >= BMC_CONST.IPL_SETTLE_TIME:
+                        print "%s: Host Status is S0/G0: working, IPL " \
+                              "finished" % l_ipmi.cv_bmcIP
+                        break
+                elif l_working is not None:
+                    l_seenOff = True
+                if time.time() > l_end:
+                    l_msg = "%s: IPL timeout" % l_ipmi.cv_bmcIP
+                    print l_msg
+                    raise OpTestError(l_msg)
+                yield l_loop.first([l_loop.sleep(l_interval), l_banner])
+                if l_banner.done():
+                    print "%s: Petitboot banner seen on SOL, IPL finished" \
+                          % l_ipmi.cv_bmcIP
+                    break
+                l_interval = min(l_interval * BMC_CONST.IPL_POLL_BACKOFF,
+                                 BMC_CONST.IPL_POLL_MAX)
+        finally:
+            if l_capture.cv_proc is not None and not l_capture.done():
+                l_capture.cv_proc.kill()
+                yield l_capture
+            l_sol.detach()
+
+        try:
+            yield self.ipmitool('sol deactivate')
+        except OpTestError:
+            print 'SOL already deactivated'
+        raise AsyncReturn(BMC_CONST.FW_SUCCESS)
+
+    def _ssh_run(self, i_master, i_cmd, i_timeout):
+        if not i_master.cv_up:
+            # the password login is done once, in a thread
+            yield self.cv_loop.run_in_thread(i_master.start)
+        l_result = yield self.cv_loop.subprocess(
+            [i_master.SSH] + i_master.ssh_options() + [i_master.cv_host, i_cmd],
+            i_timeout)
+        # 255 is what ssh exits with when the connection failed
+        if l_result[0] == 255:
+            i_master.cv_up = False
+        raise AsyncReturn(l_result)
+
+    ##
+    # @brief Runs a shell command on the BMC, or on the host, over a
+    #        persistent ssh connection (see OpTestSSHMaster)
+    #
+    # @return (coroutine) (exit code, output) or raise OpTestError
+    #
+    def bmc_run(self, i_cmd, i_timeout=BMC_CONST.ASYNC_CMD_TIMEOUT):
+        return self._ssh_run(OpTestSSHMaster.get_master(
+            self.cv_BMC.cv_bmcIP, self.cv_BMC.cv_bmcUser,
+            self.cv_BMC.cv_bmcPasswd), i_cmd, i_timeout)
+
+    def host_run(self, i_cmd, i_timeout=BMC_CONST.LPAR_SSH_TIMEOUT):
+        return self._ssh_run(OpTestSSHMaster.get_master(
+            self.cv_LPAR.ip, self.cv_LPAR.user, self.cv_LPAR.passwd),
+            i_cmd, i_timeout)
@@ -30,15 +30,28 @@
 #  This class encapsulates all function which deals with the BMC in OpenPower
 #  systems
 
+import os
 import sys
 import time
-import pxssh
+import hashlib
+import binascii
 import pexpect
-import subprocess
+import tempfile
+import threading
 from OpTestIPMI import OpTestIPMI
+from OpTestSSHPool import OpTestSSHPool
+from OpTestReachability import OpTestReachability
+from OpTestPNOR import OpTestPNOR
+from OpTestSSHMaster import OpTestSSHMaster
+from OpTestTransfer import OpTestTransfer
+from OpTestTempDir import private_dir
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 
+# Image delivery method found by OpTestBMC.delivery_mode, per (bmc ip, user)
+_deliveryModes = {}
+_deliveryLock = threading.Lock()
+
 class OpTestBMC():
 
 
@@ -47,6 +60,8 @@ class OpTestBMC():
         self.cv_bmcUser = i_bmcUser
         self.cv_bmcPasswd = i_bmcPasswd
         self.cv_ffdcDir = i_ffdcDir
+        self.cv_rebootTimes = {}
+        self.cv_md5Cache = {}
 
     ##
     # @brief This function runs a command on the BMC
@@ -62,95 +77,97 @@ class OpTestBMC():
     #
     def _cmd_run(self, cmdStr, timeout=30, logFile=None):
 
-        ''' Add -k to the SSH options '''
-        hostname = self.cv_bmcIP + " -k"
-
-        try:
-            p = pxssh.pxssh()
-            p.logfile = sys.stdout
-            p.PROMPT = '# '
+        rc, output = self._cmd_run_batch([cmdStr], timeout)[0]
 
-            ''' login but do not try to change the prompt since the AMI bmc
-                busybox does support it '''
+        ''' if optional argument is set, save command output to file '''
 
-            # http://superuser.com/questions/839878/how-to-solve-python-bug-without-root-permission
-            p.login(hostname, self.cv_bmcUser, self.cv_bmcPasswd, auto_prompt_reset=False)
-            p.sendline()
-            p.prompt()
-            print 'At BMC %s prompt...' % self.cv_bmcIP
+        if logFile is not None:
+            fn = self.cv_ffdcDir + "/" + logFile
+            with open(fn, 'w') as f:
+                f.write(output)
 
-            p.sendline(cmdStr)
-            p.prompt(timeout=timeout)
+        if rc != 0:
+            l_msg = 'Non-zero return code %d detected, command failed' % rc
+            print l_msg
+            raise OpTestError(l_msg)
 
-            ''' if optional argument is set, save command output to file '''
+        return rc
 
-            if logFile is not None:
-                fn = self.cv_ffdcDir + "/" + logFile
-                with open(fn, 'w') as f:
-                    f.write(p.before)
+    ##
+    # @brief This function runs a command on the BMC and returns its output
+    #
+    # @param timeout @type int: Command timeout in seconds
+    #
+    # @return string -- the command output,
+    #                or raises: OpTestError on a non-zero return code
+    #
+    def _cmd_run_output(self, cmdStr, timeout=30):
 
-            p.sendline('echo $?')
-            index = p.expect(['0', pexpect.TIMEOUT])
-        except:
-            l_msg = "__cmd_run Failed"
+        rc, output = self._cmd_run_batch([cmdStr], timeout)[0]
+        if rc != 0:
+            l_msg = 'Non-zero return code %d detected, command failed' % rc
             print l_msg
             raise OpTestError(l_msg)
+        return output
 
-        if index == 0:
-            rc = 0
-        if index == 1:
-            l_msg = 'Non-zero return code detected, command failed'
-            print l_msg
-            raise OpTestError(l_msg)
-            #rc = p.before
+    ##
+    # @brief This function runs several commands on the BMC in one round trip
+    #        over a pooled login session
+    #
+    # @param cmdList @type list: commands to run, in order
+    # @param timeout @type int: timeout in seconds for each command
+    #
+    # @return list of (return code, output) tuples, one per command,
+    #         or raises: OpTestError if the session failed
+    #
+    def _cmd_run_batch(self, cmdList, timeout=30):
 
-        return rc
+        return OpTestSSHPool.get_pool(self.cv_bmcIP, self.cv_bmcUser,
+                                      self.cv_bmcPasswd).run(cmdList, timeout)
 
     ##
     # @brief This function issues the reboot command on the BMC console.  It then
-    #    pings the BMC until it responds, which presumably means that it is done
-    #    rebooting.  It returns the number of failed pings.  The caller should make
-    #    returned value is greater than 1
+    #    waits for the BMC to stop answering pings, and then for it to answer
+    #    pings, IPMI (session-less Get Channel Authentication Capabilities)
+    #    and ssh again, in that order. The seconds each service took to come
+    #    back are kept in cv_rebootTimes.
+    #
+    # @param i_probes @type list: services to wait for, see
+    #        OpTestReachability.PROBES
     #
     # @return BMC_CONST.FW_SUCCESS on success and
     #         raise OpTestError on failure
     #
-    def reboot(self):
+    def reboot(self, i_probes=('icmp', 'ipmi', 'ssh_banner')):
 
-        retries = 0
+        l_reach = OpTestReachability(self.cv_bmcIP)
         self._cmd_run('reboot', logFile='bmc_reboot.log')
+        ''' the logged in sessions do not survive the reboot '''
+        OpTestSSHPool.get_pool(self.cv_bmcIP, self.cv_bmcUser,
+                               self.cv_bmcPasswd).close()
         print 'Sent reboot command now waiting for reboot to complete...'
-        time.sleep(30)
-        '''  Ping the system until it reboots  '''
-        while True:
-            try:
-                subprocess.check_call(["ping", self.cv_bmcIP, "-c1"])
-                break
-            except subprocess.CalledProcessError as e:
-                print "Ping return code: ", e.returncode, "retrying..."
-                retries += 1
-                time.sleep(30)
-
-            if retries > 5:
-                l_msg = "Error. BMC is not responding to pings"
-                print l_msg
-                raise OpTestError(l_msg)
+
+        l_down = l_reach.wait_down('icmp', BMC_CONST.BMC_REBOOT_DOWN_TIMEOUT)
+        if l_down is None:
+            print 'BMC still answers pings, waiting for its services anyway'
+        self.cv_rebootTimes = l_reach.wait(i_probes, BMC_CONST.BMC_REBOOT_TIMEOUT)
+        self.cv_rebootTimes['down'] = l_down
 
         print 'BMC reboot complete.'
 
         return BMC_CONST.FW_SUCCESS
 
     ##
-    # @brief This function copies the PNOR image to the BMC /tmp dir
+    # @brief This function copies a file to the BMC with rsync
     #
     # @return the rsync command return code
     #
-    def pnor_img_transfer(self,i_imageDir,i_imageName):
+    def _rsync(self, i_local, i_remote):
 
-        pnor_path = i_imageDir + i_imageName
-        rsync_cmd = 'rsync -v -e "ssh -k" %s %s@%s:/tmp' % (pnor_path,
-                                                            self.cv_bmcUser,
-                                                            self.cv_bmcIP)
+        rsync_cmd = 'rsync -v -e "ssh -k" %s %s@%s:%s' % (i_local,
+                                                          self.cv_bmcUser,
+                                                          self.cv_bmcIP,
+                                                          i_remote)
 
         print rsync_cmd
         rsync = pexpect.spawn(rsync_cmd)
@@ -162,6 +179,288 @@ class OpTestBMC():
         rsync.close()
         return rsync.exitstatus
 
+    ##
+    # @brief This function copies a file to the BMC with scp over the
+    #        persistent ssh connection
+    #
+    # @return the scp command return code
+    #
+    def _scp(self, i_local, i_remote):
+
+        rc, output = OpTestSSHMaster.get_master(
+            self.cv_bmcIP, self.cv_bmcUser,
+            self.cv_bmcPasswd).scp(i_local, i_remote)
+        if rc != 0:
+            print 'scp to BMC %s failed (rc %d): %s' % (self.cv_bmcIP, rc,
+                                                       output.strip())
+        return rc
+
+    ##
+    # @brief This function copies a file to the BMC
+    #
+    # @param i_mode @type string: BMC_CONST.TRANSFER_RSYNC,
+    #        BMC_CONST.TRANSFER_SCP, or over a persistent ssh connection
+    #        BMC_CONST.TRANSFER_SSH (plain stream), BMC_CONST.TRANSFER_SPARSE
+    #        (only the regions that are not erased flash, for PNOR images) or
+    #        BMC_CONST.TRANSFER_GZIP (compressed). BMC_CONST.TRANSFER_AUTO
+    #        uses the fastest method this BMC supports, see delivery_mode.
+    #
+    # @return the rsync or scp command return code, 0 for the ssh modes
+    #         (which raise OpTestError on failure)
+    #
+    def _img_send(self, i_local, i_remote, i_mode):
+
+        if i_mode == BMC_CONST.TRANSFER_AUTO:
+            l_mode = self.delivery_mode()
+            try:
+                rc = self._img_send(i_local, i_remote, l_mode)
+            except (OpTestError, pexpect.ExceptionPexpect):
+                rc = None
+            if rc != 0:
+                # probe again next time, the BMC may have changed
+                self.delivery_mode_reset()
+                l_msg = '%s delivery to BMC %s failed' % (l_mode, self.cv_bmcIP)
+                print l_msg
+                raise OpTestError(l_msg)
+            return rc
+
+        if i_mode == BMC_CONST.TRANSFER_RSYNC:
+            return self._rsync(i_local, i_remote)
+        if i_mode == BMC_CONST.TRANSFER_SCP:
+            return self._scp(i_local, i_remote)
+
+        l_transfer = OpTestTransfer(OpTestSSHMaster.get_master(
+            self.cv_bmcIP, self.cv_bmcUser, self.cv_bmcPasswd))
+        if i_mode == BMC_CONST.TRANSFER_SSH:
+            l_transfer.put(i_local, i_remote, l_transfer.print_progress,
+                           i_resume=False, i_verify=False)
+        elif i_mode == BMC_CONST.TRANSFER_SPARSE:
+            l_pnor = OpTestPNOR(i_local)
+            l_extents = l_pnor.extents()
+            l_pnor.close()
+            l_transfer.put_sparse(i_local, i_remote, l_extents,
+                                  i_progress=l_transfer.print_progress,
+                                  i_verify=False)
+        elif i_mode == BMC_CONST.TRANSFER_GZIP:
+            l_transfer.put_gzip(i_local, i_remote, l_transfer.print_progress,
+                                i_verify=False)
+        else:
+            raise OpTestError("Unknown transfer mode '%s'" % i_mode)
+        return 0
+
+    ##
+    # @brief Sends a file of random data with a delivery method and checks
+    #        that it arrived intact
+    #
+    # @return seconds taken, or None if the method does not work
+    #
+    def _delivery_send(self, i_path, i_md5, i_remote, i_mode):
+
+        self._cmd_run('rm -f ' + i_remote)
+        l_start = time.time()
+        try:
+            rc = self._img_send(i_path, i_remote, i_mode)
+        except (OpTestError, pexpect.ExceptionPexpect, OSError) as e:
+            print '%s delivery to BMC %s does not work: %s' % (
+                i_mode, self.cv_bmcIP, e)
+            return None
+        l_time = time.time() - l_start
+        if rc != 0:
+            print '%s delivery to BMC %s does not work: rc %s' % (
+                i_mode, self.cv_bmcIP, rc)
+            return None
+        l_rc, output = self._cmd_run_batch(['md5sum < ' + i_remote])[0]
+        if l_rc != 0 or output.split()[:1] != [i_md5]:
+            print '%s delivery to BMC %s corrupted the data' % (
+                i_mode, self.cv_bmcIP)
+            return None
+        return l_time
+
+    ##
+    # @brief Sends a BMC_CONST.TRANSFER_PROBE_SETUP_SIZE and then a
+    #        BMC_CONST.TRANSFER_PROBE_SIZE file of random data with each method
+    #        of BMC_CONST.TRANSFER_PROBE_ORDER. The rate is taken from the
+    #        difference, so the setup time of a method (ssh handshake, rsync
+    #        file list) is left out.
+    #
+    # @return dict of method: bytes per second, for the methods that worked
+    #
+    def _delivery_probe(self):
+
+        l_remote = BMC_CONST.BMC_IMG_CACHE_DIR + '/probe.part'
+        self._cmd_run('mkdir -p ' + BMC_CONST.BMC_IMG_CACHE_DIR)
+
+        l_probes = []
+        for l_size in (BMC_CONST.TRANSFER_PROBE_SETUP_SIZE,
+                       BMC_CONST.TRANSFER_PROBE_SIZE):
+            l_data = os.urandom(l_size)
+            l_probe = tempfile.NamedTemporaryFile(prefix='optest-probe-')
+            l_probe.write(l_data)
+            l_probe.flush()
+            l_probes.append((l_probe, hashlib.md5(l_data).hexdigest()))
+
+        l_rates = {}
+        try:
+            for l_mode in BMC_CONST.TRANSFER_PROBE_ORDER:
+                l_times = []
+                for l_probe, l_md5 in l_probes:
+                    l_time = self._delivery_send(l_probe.name, l_md5, l_remote,
+                                                 l_mode)
+                    if l_time is None:
+                        break
+                    l_times.append(l_time)
+                else:
+                    l_rates[l_mode] = (BMC_CONST.TRANSFER_PROBE_SIZE -
+                                       BMC_CONST.TRANSFER_PROBE_SETUP_SIZE) / \
+                                      max(l_times[1] - l_times[0], 0.001)
+                    print '%s delivery to BMC %s: %.0f KB/s, %.2fs setup' % (
+                        l_mode, self.cv_bmcIP, l_rates[l_mode] / 1024,
+                        l_times[0])
+        finally:
+            for l_probe, l_md5 in l_probes:
+                l_probe.close()
+        self._cmd_run('rm -f ' + l_remote)
+        return l_rates
+
+    def _delivery_mode_path(self):
+        return os.path.join(private_dir(BMC_CONST.TRANSFER_MODE_DIR),
+                            '%s-%s' % (self.cv_bmcIP, self.cv_bmcUser))
+
+    ##
+    # @brief Returns the fastest way of copying images to this BMC. The
+    #        methods are probed once per BMC, the result is shared by every
+    #        OpTestBMC of the same BMC and kept on disk for the next runs.
+    #
+    # @return transfer mode, see _img_send, or raise OpTestError if none of
+    #         them works
+    #
+    def delivery_mode(self):
+
+        l_key = (self.cv_bmcIP, self.cv_bmcUser)
+        with _deliveryLock:
+            if l_key in _deliveryModes:
+                return _deliveryModes[l_key]
+            try:
+                with open(self._delivery_mode_path()) as f:
+                    l_mode = f.read().strip()
+            except IOError:
+                l_mode = None
+            if l_mode in BMC_CONST.TRANSFER_PROBE_ORDER:
+                _deliveryModes[l_key] = l_mode
+                return l_mode
+
+        l_rates = self._delivery_probe()
+        if not l_rates:
+            l_msg = 'No way of copying images to BMC %s works (tried %s)' % (
+                self.cv_bmcIP, ', '.join(BMC_CONST.TRANSFER_PROBE_ORDER))
+            print l_msg
+            raise OpTestError(l_msg)
+        l_mode = max(l_rates, key=l_rates.get)
+        print 'Using %s to copy images to BMC %s' % (l_mode, self.cv_bmcIP)
+        with _deliveryLock:
+            _deliveryModes[l_key] = l_mode
+            with open(self._delivery_mode_path(), 'w') as f:
+                f.write(l_mode + '\n')
+        return l_mode
+
+    ##
+    # @brief Forgets the delivery method of this BMC, it is probed again on
+    #        the next transfer
+    #
+    def delivery_mode_reset(self):
+
+        with _deliveryLock:
+            _deliveryModes.pop((self.cv_bmcIP, self.cv_bmcUser), None)
+            try:
+                os.remove(self._delivery_mode_path())
+            except OSError:
+                pass
+
+    ##
+    # @brief Returns the md5sum of a local image, computed once per version
+    #        of the file
+    #
+    def _img_md5(self, i_path):
+
+        l_stat = os.stat(i_path)
+        l_key = (os.path.abspath(i_path), l_stat.st_size, l_stat.st_mtime)
+        if l_key not in self.cv_md5Cache:
+            l_md5 = hashlib.md5()
+            with open(i_path, 'rb') as f:
+                for l_data in iter(lambda: f.read(BMC_CONST.TRANSFER_CHUNK), ''):
+                    l_md5.update(l_data)
+            self.cv_md5Cache[l_key] = l_md5.hexdigest()
+        return self.cv_md5Cache[l_key]
+
+    ##
+    # @brief Removes the least recently used images from the BMC image cache
+    #        so that an image of i_size bytes fits in it
+    #
+    def _img_cache_evict(self, i_size):
+
+        l_dir = BMC_CONST.BMC_IMG_CACHE_DIR
+        output = self._cmd_run_output('ls -lt %s' % l_dir)
+        l_entries = []
+        for l_line in output.splitlines():
+            l_fields = l_line.split()
+            if len(l_fields) < 9 or not l_fields[0].startswith('-'):
+                continue
+            l_entries.append((l_fields[-1], int(l_fields[4])))
+
+        l_keep = 0
+        l_bytes = i_size
+        l_remove = []
+        for l_name, l_size in l_entries:
+            if l_name.endswith('.part') or \
+               l_keep + 1 >= BMC_CONST.BMC_IMG_CACHE_ENTRIES or \
+               l_bytes + l_size > BMC_CONST.BMC_IMG_CACHE_BYTES:
+                l_remove.append(l_dir + '/' + l_name)
+            else:
+                l_keep += 1
+                l_bytes += l_size
+        if l_remove:
+            print 'Evicting %s from the BMC image cache' % ' '.join(l_remove)
+            self._cmd_run('rm -f ' + ' '.join(l_remove))
+
+    ##
+    # @brief This function copies the PNOR image to the BMC /tmp dir. The BMC
+    #        keeps copies by md5sum in BMC_CONST.BMC_IMG_CACHE_DIR and
+    #        /tmp/<image name> links to the copy, so an image already on the
+    #        BMC is not sent again.
+    #
+    # @param i_mode @type string: how the image is sent, see _img_send
+    #
+    # @return the rsync or scp command return code, 0 if the image was cached
+    #
+    def pnor_img_transfer(self,i_imageDir,i_imageName,
+                          i_mode=BMC_CONST.TRANSFER_AUTO):
+
+        pnor_path = i_imageDir + i_imageName
+        l_md5 = self._img_md5(pnor_path)
+        l_entry = BMC_CONST.BMC_IMG_CACHE_DIR + '/' + l_md5
+        l_link = '/tmp/' + i_imageName
+
+        l_rc, output = self._cmd_run_batch(
+            ['mkdir -p ' + BMC_CONST.BMC_IMG_CACHE_DIR,
+             'test -f %s && touch %s' % (l_entry, l_entry)])[1]
+        if l_rc == 0:
+            print '%s (md5 %s) is already on the BMC' % (pnor_path, l_md5)
+        else:
+            self._img_cache_evict(os.path.getsize(pnor_path))
+            rc = self._img_send(pnor_path, l_entry + '.part', i_mode)
+            if rc != 0:
+                return rc
+            output = self._cmd_run_output('md5sum < %s.part' % l_entry)
+            if output.split()[0] != l_md5:
+                self._cmd_run('rm -f %s.part' % l_entry)
+                l_msg = 'md5sum of the PNOR image copied to the BMC does not match'
+                print l_msg
+                raise OpTestError(l_msg)
+            self._cmd_run('mv %s.part %s' % (l_entry, l_entry))
+
+        self._cmd_run('ln -sf %s %s' % (l_entry, l_link))
+        return 0
+
     ##
     # @brief This function flashes the PNOR image
     # @param i_imageName @type string:
@@ -169,6 +468,164 @@ class OpTestBMC():
     # @return pflash command return code
     #
     def pnor_img_flash(self,i_imageName):
-        cmd = '/usr/local/bin/pflash -E -f -p /tmp/%s' % i_imageName
+        ''' a full flash invalidates the manifest of pnor_img_flash_diff '''
+        self._cmd_run('rm -f ' + BMC_CONST.BMC_FLASH_MANIFEST)
+        cmd = BMC_CONST.BMC_PFLASH + ' -E -f -p /tmp/%s' % i_imageName
         rc = self._cmd_run(cmd, timeout=1800, logFile='pflash.log')
         return rc
+
+    ##
+    # @brief Returns the local file holding the token of the flash manifest
+    #        of this BMC, see OpTestIPMI.ipmi_flash_manifest_invalidate
+    #
+    def _flash_token_path(self):
+        return os.path.join(private_dir(BMC_CONST.FLASH_TOKEN_DIR),
+                            self.cv_bmcIP + '.token')
+
+    ##
+    # @brief Removes the flash manifest and its local token, once the flash
+    #        no longer matches what the manifest describes
+    #
+    def _flash_manifest_drop(self):
+        self._cmd_run_batch(['rm -f ' + BMC_CONST.BMC_FLASH_MANIFEST])
+        try:
+            os.unlink(self._flash_token_path())
+        except OSError:
+            pass
+
+    ##
+    # @brief Reads back the md5sums of partitions from flash
+    #
+    # @param i_parts @type list: partitions to read (OpTestPNOR dicts)
+    #
+    # @return dict of partition name: md5sum
+    #
+    def _flash_readback(self, i_parts):
+
+        l_hashes = {}
+        if not i_parts:
+            return l_hashes
+        l_tmp = BMC_CONST.BMC_IMG_CACHE_DIR + '/readback.part'
+        l_cmds = ['%s -P %s -r %s >/dev/null && md5sum < %s; rm -f %s' % (
+                  BMC_CONST.BMC_PFLASH, l_part['name'], l_tmp, l_tmp, l_tmp)
+                  for l_part in i_parts]
+        for l_part, (l_rc, output) in zip(i_parts,
+                                          self._cmd_run_batch(l_cmds, 600)):
+            if l_rc == 0 and output.split():
+                l_hashes[l_part['name']] = output.split()[0]
+        return l_hashes
+
+    ##
+    # @brief Reads the md5sums of the partitions currently on flash. The
+    #        manifest left by the last differential flash is only used if its
+    #        token is still the local one (no power on or code update since)
+    #        and the partition table read back from flash matches it. The
+    #        partitions the host writes at runtime (BMC_CONST.PNOR_HOST_WRITABLE)
+    #        and those missing from the manifest are always read back.
+    #
+    # @param i_parts @type list: partitions to look up (OpTestPNOR dicts)
+    #
+    # @return dict of partition name: md5sum
+    #
+    def _flash_hashes(self, i_parts):
+
+        l_manifest = {}
+        l_token = None
+        try:
+            with open(self._flash_token_path()) as f:
+                l_token = f.read().strip()
+        except IOError:
+            pass
+        l_rc, output = self._cmd_run_batch(['cat ' + BMC_CONST.BMC_FLASH_MANIFEST])[0]
+        l_lines = output.splitlines() if l_rc == 0 else []
+        if l_token and l_lines and l_lines[0].split() == ['token', l_token]:
+            for l_line in l_lines[1:]:
+                l_fields = l_line.split()
+                if len(l_fields) == 2:
+                    l_manifest[l_fields[1]] = l_fields[0]
+        elif l_lines:
+            print 'The flash manifest is stale, reading back all partitions'
+
+        l_toc = [p['name'] for p in i_parts if p['offset'] == 0]
+        if not l_toc or l_toc[0] not in l_manifest:
+            l_manifest = {}
+        l_read = [p for p in i_parts
+                  if p['name'] not in l_manifest or p['name'] in l_toc or
+                  p['name'].startswith(BMC_CONST.PNOR_HOST_WRITABLE)]
+        l_hashes = self._flash_readback(l_read)
+        if l_manifest and l_hashes.get(l_toc[0]) != l_manifest[l_toc[0]]:
+            print 'The partition table on flash does not match the flash ' \
+                  'manifest, reading back all partitions'
+            l_hashes.update(self._flash_readback(
+                [p for p in i_parts if p not in l_read]))
+        elif l_manifest:
+            print 'Using the flash manifest %s' % BMC_CONST.BMC_FLASH_MANIFEST
+            for l_name, l_md5 in l_manifest.items():
+                l_hashes.setdefault(l_name, l_md5)
+        return l_hashes
+
+    ##
+    # @brief This function flashes only the partitions of the PNOR image that
+    #        differ from what is on flash. The image must already be in the
+    #        BMC /tmp dir (pnor_img_transfer). If the partition table itself
+    #        changed, the whole chip is flashed as pnor_img_flash does.
+    #
+    # @param i_imageDir @type string: local directory of the image
+    # @param i_imageName @type string: image file name
+    #
+    # @return pflash command return code
+    #
+    def pnor_img_flash_diff(self, i_imageDir, i_imageName):
+
+        l_pnor = OpTestPNOR(i_imageDir + i_imageName)
+        l_new = l_pnor.hashes()
+        l_parts = l_pnor.partitions()
+        l_pnor.close()
+        l_old = self._flash_hashes(l_parts)
+
+        l_toc = [p for p in l_parts if p['offset'] == 0]
+        if not l_toc or l_old.get(l_toc[0]['name']) != l_new[l_toc[0]['name']]:
+            print 'PNOR partition table changed, flashing the whole chip'
+            rc = self.pnor_img_flash(i_imageName)
+        else:
+            l_changed = l_pnor.changed(l_old)
+            print 'Partitions to flash: %s' % (
+                ' '.join(p['name'] for p in l_changed) or 'none')
+            l_tmp = BMC_CONST.BMC_IMG_CACHE_DIR + '/flash.part'
+            l_log = ''
+            for l_part in l_changed:
+                l_cmd = 'dd if=/tmp/%s of=%s bs=%d skip=%d count=%d && ' \
+                        '%s -f -e -P %s -p %s; l_rc=$?; rm -f %s; exit $l_rc' \
+                        % (i_imageName, l_tmp, l_pnor.cv_blockSize,
+                           l_part['base'], l_part['blocks'],
+                           BMC_CONST.BMC_PFLASH, l_part['name'], l_tmp, l_tmp)
+                l_rc, output = self._cmd_run_batch(['(%s)' % l_cmd], 1800)[0]
+                l_log += output
+                if l_rc != 0:
+                    # the manifest no longer describes the flash
+                    self._flash_manifest_drop()
+                    with open(self.cv_ffdcDir + '/pflash.log', 'w') as f:
+                        f.write(l_log)
+                    l_msg = 'pflash of partition %s failed' % l_part['name']
+                    print l_msg
+                    raise OpTestError(l_msg)
+            with open(self.cv_ffdcDir + '/pflash.log', 'w') as f:
+                f.write(l_log)
+            rc = 0
+
+        if rc != 0:
+            # a partly programmed chip must be flashed whole next time
+            self._flash_manifest_drop()
+            return rc
+
+        # the token ties the manifest to this flash: the local copy is
+        # dropped when the host powers on or PNOR is updated another way
+        l_token = binascii.hexlify(os.urandom(8))
+        l_manifest = 'token %s\\n' % l_token
+        l_manifest += ''.join('%s %s\\n' % (l_new[p['name']], p['name'])
+                              for p in l_parts)
+        self._cmd_run("printf '%s' > %s" % (l_manifest,
+                                             BMC_CONST.BMC_FLASH_MANIFEST))
+        with open(self._flash_token_path(), 'w') as f:
+            f.write(l_token + '\n')
+        return rc
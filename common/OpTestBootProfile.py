@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestBootProfile.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestBootProfile
+#  Boot milestone timing profiler
+#
+#  This class timestamps the IPL milestones seen on the SOL console (hostboot
+#  isteps, skiboot, the petitboot kernel and UI, the OS kernel and login) and
+#  breaks the boot down into per phase durations. It either watches a running
+#  OpTestSOL capture, or reads a host_sol.log together with the host_sol.idx
+#  arrival time index OpTestSOL writes next to it. The result is written as
+#  JSON and as a Chrome trace (chrome://tracing, Perfetto).
+
+import re
+import json
+import bisect
+import threading
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+class OpTestBootProfile():
+
+    # Milestones in boot order: (name, regular expression). Each one is looked
+    # for after the previous milestone that was found. ipl_wait_for_working_state
+    # stops the SOL capture at the Petitboot banner, so os_kernel and os_login
+    # are only found in a capture that runs on into the OS boot.
+    MILESTONES = [
+        ('hostboot', r'ISTEP +\d+\. *\d+'),
+        ('skiboot', r'SkiBoot [^\r\n]*starting|OPAL [^\r\n]*starting'),
+        ('petitboot_kernel', r'Linux version'),
+        ('petitboot', r'Petitboot'),
+        ('os_kernel', r'Linux version'),
+        ('os_login', r'login: '),
+    ]
+    ISTEP = r'ISTEP +(\d+)\. *(\d+)'
+
+    ##
+    # @brief Initialize this object
+    #
+    def __init__(self):
+        l_patterns = []
+        for l_name, l_pattern in self.MILESTONES:
+            if l_pattern not in l_patterns:
+                l_patterns.append(l_pattern)
+        self.cv_regex = re.compile('|'.join('(?:%s)' % x for x in l_patterns))
+        self.cv_istep = re.compile(self.ISTEP)
+        self.cv_lock = threading.Lock()
+        # (time, offset, matched text) of every marker seen
+        self.cv_events = []
+        self.cv_end = None
+
+    ##
+    # @brief Records the milestones of a running SOL capture as they show up
+    #
+    # @param i_sol @type OpTestSOL: started SOL capture
+    #
+    # @return OpTestSOLWatch object, cancel() it to stop recording
+    #
+    def attach(self, i_sol):
+        def record(i_watch, i_match):
+            with self.cv_lock:
+                self.cv_events.append((i_watch.cv_time, i_watch.cv_offset,
+                                       i_match.group(0)))
+                self.cv_end = i_watch.cv_time
+        return i_sol.watch(self.cv_regex.pattern, record, i_once=False)
+
+    ##
+    # @brief Reads the milestones from a captured SOL log
+    #
+    # @param i_logFile @type string: SOL log, e.g. host_sol.log
+    # @param i_indexFile @type string: arrival time index written by OpTestSOL,
+    #        defaults to the log file name with an .idx extension
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def load(self, i_logFile, i_indexFile=None):
+        if i_indexFile is None:
+            i_indexFile = re.sub(r'\.log$', '', i_logFile) + '.idx'
+        l_offsets = []
+        l_times = []
+        try:
+            with open(i_indexFile) as f:
+                for l_line in f:
+                    l_fields = l_line.split()
+                    if len(l_fields) == 2:
+                        l_times.append(float(l_fields[0]))
+                        l_offsets.append(int(l_fields[1]))
+            with open(i_logFile) as f:
+                l_log = f.read()
+        except (IOError, ValueError) as e:
+            l_msg = "Can not read SOL log/index for boot profile: %s" % e
+            print l_msg
+            raise OpTestError(l_msg)
+        if not l_offsets:
+            l_msg = "SOL index %s is empty" % i_indexFile
+            print l_msg
+            raise OpTestError(l_msg)
+
+        l_events = []
+        for l_match in self.cv_regex.finditer(l_log):
+            l_chunk = bisect.bisect_right(l_offsets, l_match.start()) - 1
+            l_events.append((l_times[max(l_chunk, 0)], l_match.start(),
+                             l_match.group(0)))
+        with self.cv_lock:
+            self.cv_events = l_events
+            self.cv_end = l_times[-1]
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Computes the milestone and phase breakdown
+    #
+    # @return dict with 'start' (epoch seconds of the first milestone),
+    #         'milestones', 'phases' and 'isteps' lists; times in the lists
+    #         are seconds relative to 'start'
+    #
+    def profile(self):
+        with self.cv_lock:
+            l_events = sorted(self.cv_events, key=lambda x: x[1])
+            l_end = self.cv_end
+
+        l_found = []
+        l_cursor = 0
+        for l_name, l_pattern in self.MILESTONES:
+            l_regex = re.compile(l_pattern)
+            for l_index in range(l_cursor, len(l_events)):
+                if l_regex.match(l_events[l_index][2]):
+                    l_found.append((l_name, l_events[l_index]))
+                    l_cursor = l_index + 1
+                    break
+
+        if not l_found:
+            return {'start': None, 'milestones': [], 'phases': [], 'isteps': []}
+        l_start = l_found[0][1][0]
+        l_end = max(l_end, l_found[-1][1][0])
+
+        l_milestones = []
+        l_phases = []
+        for l_index, (l_name, l_event) in enumerate(l_found):
+            l_milestones.append({'name': l_name,
+                                 'time': round(l_event[0] - l_start, 3),
+                                 'text': l_event[2]})
+            if l_index + 1 < len(l_found):
+                l_next = l_found[l_index + 1][1][0]
+            else:
+                l_next = l_end
+            l_phases.append({'name': l_name,
+                             'start': round(l_event[0] - l_start, 3),
+                             'duration': round(l_next - l_event[0], 3)})
+
+        # hostboot isteps, up to the next milestone after hostboot
+        l_isteps = []
+        if l_found[0][0] == 'hostboot':
+            l_stop = l_found[1][1][1] if len(l_found) > 1 else None
+            l_steps = [e for e in l_events
+                       if self.cv_istep.match(e[2]) and
+                       (l_stop is None or e[1] < l_stop)]
+            for l_index, l_event in enumerate(l_steps):
+                l_match = self.cv_istep.match(l_event[2])
+                if l_index + 1 < len(l_steps):
+                    l_next = l_steps[l_index + 1][0]
+                elif len(l_found) > 1:
+                    l_next = l_found[1][1][0]
+                else:
+                    l_next = l_end
+                l_isteps.append({'name': 'istep %d.%d' % (int(l_match.group(1)),
+                                                          int(l_match.group(2))),
+                                 'start': round(l_event[0] - l_start, 3),
+                                 'duration': round(l_next - l_event[0], 3)})
+
+        return {'start': l_start, 'milestones': l_milestones,
+                'phases': l_phases, 'isteps': l_isteps}
+
+    ##
+    # @brief Writes the profile as JSON
+    #
+    # @return the profile dict
+    #
+    def write_json(self, i_path, i_profile=None):
+        l_profile = i_profile or self.profile()
+        with open(i_path, 'w') as f:
+            json.dump(l_profile, f, indent=2)
+        return l_profile
+
+    ##
+    # @brief Writes the profile in the Chrome trace event format, phases on
+    #        one track and hostboot isteps on a second one
+    #
+    # @return the profile dict
+    #
+    def write_trace(self, i_path, i_profile=None):
+        l_profile = i_profile or self.profile()
+        l_events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1,
+                     'args': {'name': 'boot phases'}},
+                    {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 2,
+                     'args': {'name': 'hostboot isteps'}}]
+        for l_tid, l_key in ((1, 'phases'), (2, 'isteps')):
+            for l_phase in l_profile[l_key]:
+                l_events.append({'name': l_phase['name'], 'cat': l_key,
+                                 'ph': 'X', 'pid': 1, 'tid': l_tid,
+                                 'ts': int(l_phase['start'] * 1000000),
+                                 'dur': int(l_phase['duration'] * 1000000)})
+        with open(i_path, 'w') as f:
+            json.dump({'traceEvents': l_events, 'displayTimeUnit': 'ms'}, f)
+        return l_profile
@@ -43,6 +43,8 @@ class OpTestConstants():
     BMC_WARM_RESET = " mc reset warm"
     BMC_WARM_RESET_DELAY = 100
     BMC_PASS_WARM_RESET = "Sent warm reset command to MC"
+    BMC_RESET_DOWN_TIMEOUT = 30
+    BMC_RESET_TIMEOUT = 300
 
     BMC_PRESRV_LAN = " raw 0x32 0xba 0x18 0x00"
     BMC_MCHBLD = " raw 0x3a 0x0b 0x56 0x45 0x52 0x53 0x49 " \
@@ -83,5 +85,125 @@ class OpTestConstants():
     # Sleep times
     LPAR_BRINGUP_TIME = 80
 
+    # IPL completion detection
+    HOST_STATUS_SENSOR = "Host Status"
+    HOST_STATUS_S0_WORKING = 0x01
+    HOST_STATUS_WORKING_STATE = "S0/G0: working"
+    IPL_SETTLE_TIME = 60
+    IPL_POLL_MIN = 2
+    IPL_POLL_MAX = 15
+    IPL_POLL_BACKOFF = 1.5
+    IPL_SOL_BANNER = "Petitboot"
+    # Local SDR repository cache, one 'sdr dump' per BMC firmware level, in a
+    # directory of OpTestTempDir.private_dir
+    SDR_CACHE_DIR = "optest-sdr"
+    SDR_KEY_MC_FIELDS = ("Manufacturer ID", "Product ID", "Firmware Revision",
+                         "Aux Firmware Rev Info")
+    SDR_KEY_SDR_FIELDS = ("Most recent Addition", "Most recent Erase")
+    GOLDEN_SIDE_SENSOR = "golden"
+    # Background sensor sampler: poll interval (s) and ring buffer tiers as
+    # (rows, rows of the tier before averaged per row): 1h of 5s samples,
+    # then 12h of 1 min averages, then 5 days of 10 min averages
+    SAMPLER_INTERVAL = 5
+    SAMPLER_TIERS = ((720, 1), (720, 12), (720, 10))
+
+    # SOL console capture
+    SOL_READ_SIZE = 4096
+    SOL_READ_TIMEOUT = 0.5
+    SOL_BUFFER_SIZE = 1024 * 1024
+    SOL_MATCH_WINDOW = 4096
+    SOL_LOG_BATCH = 64 * 1024
+    SOL_LOG_INTERVAL = 1
+
+    # Reachability probes (OpTestReachability)
+    REACH_PROBE_TIMEOUT = 1
+    REACH_POLL_MIN = 0.25
+    REACH_POLL_MAX = 2
+    REACH_POLL_BACKOFF = 1.5
+    REACH_SSH_PORT = 22
+    BMC_REBOOT_DOWN_TIMEOUT = 60
+    BMC_REBOOT_TIMEOUT = 300
+
     PING_RETRY_POWERCYCLE = 5
     PING_RETRY_FOR_STABILITY = 3
+
+    # IPMI backends used by OpTestIPMI._ipmitool_cmd_run
+    IPMI_BACKEND_IPMITOOL = "ipmitool"
+    IPMI_BACKEND_NATIVE = "native"
+    IPMI_BACKEND_SHELL = "shell"
+
+    # Concurrent sessions used for batched ipmitool reads
+    IPMI_BATCH_WORKERS = 1
+
+    # Persistent ipmitool shell workers
+    IPMI_SHELL_WORKERS = 2
+    IPMI_SHELL_START_TIMEOUT = 60
+    IPMI_SHELL_TIMEOUT = 300
+
+    # Multiplexed ssh connections to the host (OpTestSSHMaster)
+    LPAR_SSH_TIMEOUT = 1500
+    LPAR_SSH_LOGIN_TIMEOUT = 60
+    LPAR_SSH_PERSIST = 600
+    TRANSFER_CHUNK = 1024 * 1024
+    TRANSFER_GZIP_LEVEL = 6
+
+    # Ways of copying images to the BMC (OpTestBMC._img_send)
+    TRANSFER_RSYNC = "rsync"
+    TRANSFER_SSH = "ssh"
+    TRANSFER_SPARSE = "sparse"
+    TRANSFER_GZIP = "gzip"
+    TRANSFER_SCP = "scp"
+    # fastest of TRANSFER_PROBE_ORDER that works, probed once per BMC: the rate
+    # is taken between a TRANSFER_PROBE_SETUP_SIZE and a TRANSFER_PROBE_SIZE
+    # file, so the connection setup of each method does not count
+    TRANSFER_AUTO = "auto"
+    TRANSFER_PROBE_ORDER = (TRANSFER_RSYNC, TRANSFER_SCP, TRANSFER_SSH)
+    TRANSFER_PROBE_SETUP_SIZE = 4 * 1024
+    TRANSFER_PROBE_SIZE = 8 * 1024 * 1024
+    # local directory (OpTestTempDir.private_dir) keeping the probed method of
+    # each BMC across runs
+    TRANSFER_MODE_DIR = "optest-delivery"
+
+    # Content addressed image cache on the BMC tmpfs
+    BMC_IMG_CACHE_DIR = "/tmp/optest-cache"
+    BMC_IMG_CACHE_ENTRIES = 2
+    BMC_IMG_CACHE_BYTES = 128 * 1024 * 1024
+
+    # Differential PNOR flashing
+    BMC_PFLASH = "/usr/local/bin/pflash"
+    BMC_FLASH_MANIFEST = "/tmp/optest-flash.manifest"
+    # local directory (OpTestTempDir.private_dir) of the token that ties the
+    # manifest to the flash, dropped when the host powers on or PNOR is updated
+    FLASH_TOKEN_DIR = "optest-flash"
+    # partitions the host firmware writes at runtime, always read back
+    PNOR_HOST_WRITABLE = ('NVRAM', 'GUARD', 'HBEL', 'ATTR_', 'FIRDATA',
+                          'CVPD', 'SECBOOT')
+    PNOR_SCAN_CHUNK = 64 * 1024
+
+    # System Event Log reader (OpTestSEL)
+    SEL_WATCH_INTERVAL = 5
+    SEL_FATAL_EVENTS = ('Transition to Non-recoverable',)
+
+    # Event loop driven operations (OpTestAsync)
+    ASYNC_CMD_TIMEOUT = 300
+    ASYNC_READ_SIZE = 65536
+    ASYNC_REAP_INTERVAL = 0.05
+
+    # Systems tested at the same time by OpTestFleet
+    FLEET_WORKERS = 8
+
+    # Pooled BMC ssh sessions used by OpTestBMC._cmd_run
+    BMC_SSH_SESSIONS = 2
+    BMC_SSH_LOGIN_TIMEOUT = 60
+    BMC_SSH_CHECK_TIMEOUT = 5
+    BMC_SSH_IDLE_CHECK = 60
+
+    # Native IPMI over LAN (RMCP+) session settings
+    IPMI_LAN_PORT = 623
+    IPMI_LAN_CIPHER_SUITE = 3
+    IPMI_LAN_TIMEOUT = 2
+    IPMI_LAN_RETRIES = 3
+    IPMI_LAN_KEEPALIVE = 30
+    IPMI_LAN_SDR_CHUNK = 16
+    IPMI_BMC_SLAVE_ADDR = 0x20
+    IPMI_REMOTE_SWID = 0x81
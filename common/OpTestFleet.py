@@ -0,0 +1,319 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestFleet.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestFleet
+#  Runs the same test steps on many systems at once
+#
+#  An OpTestFleet builds one OpTestSystem per entry of an inventory, each with
+#  its own FFDC directory, and runs a sequence of steps on all of them from a
+#  pool of threads. The steps of one system run in order and stop at its first
+#  failure; the systems run side by side, so a fleet takes as long as its
+#  slowest system. The console output of each system goes to console.log in its
+#  FFDC directory, and the results are collected in one table.
+#
+#  Threads rather than processes are used: the work is waiting on BMCs, and
+#  the shared ssh, IPMI and delivery registries are keyed by BMC and locked.
+
+import os
+import sys
+import json
+import time
+import threading
+import ConfigParser
+from multiprocessing.pool import ThreadPool
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+from OpTestSystem import OpTestSystem
+
+##
+# Sends the output of fleet threads, and of the threads they start, to their
+# system's console log, and the output of any other thread to the real stdout
+#
+class _FleetOutput():
+
+    def __init__(self, i_stdout):
+        self.cv_stdout = i_stdout
+        self.cv_files = {}
+
+    def _file(self):
+        l_file = self.cv_files.get(threading.current_thread().ident)
+        # a thread can outlive the fleet thread that started it
+        if l_file is None or l_file.closed:
+            return self.cv_stdout
+        return l_file
+
+    ##
+    # @brief Wraps threading.Thread.start so that a thread started by a fleet
+    #        thread (SOL reader, SEL watcher, IPMI keepalive, batch workers)
+    #        writes to the same console log
+    #
+    # @param i_start @type function: the original threading.Thread.start
+    #
+    # @return the wrapping function
+    #
+    def inherit(self, i_start):
+        l_output = self
+
+        def start(i_thread):
+            l_file = l_output.cv_files.get(threading.current_thread().ident)
+            if l_file is not None:
+                l_run = i_thread.run
+
+                def run():
+                    l_ident = threading.current_thread().ident
+                    l_output.cv_files[l_ident] = l_file
+                    try:
+                        l_run()
+                    finally:
+                        l_output.cv_files.pop(l_ident, None)
+                i_thread.run = run
+            return i_start(i_thread)
+        return start
+
+    def write(self, i_data):
+        self._file().write(i_data)
+
+    def flush(self):
+        self._file().flush()
+
+    def fileno(self):
+        return self._file().fileno()
+
+    def __getattr__(self, i_name):
+        return getattr(self.cv_stdout, i_name)
+
+
+class OpTestFleet():
+
+    # inventory keys: OpTestSystem parameter
+    SYSTEM_KEYS = ['ip', 'username', 'password', 'usernameipmi',
+                   'passwordipmi']
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_systems @type list: (name, OpTestSystem) tuples
+    # @param i_ffdcDir @type string: directory the results are written to
+    # @param i_workers @type int: systems run at the same time, default all
+    #
+    def __init__(self, i_systems, i_ffdcDir, i_workers=None):
+        self.cv_systems = list(i_systems)
+        self.cv_ffdcDir = i_ffdcDir
+        self.cv_workers = i_workers or \
+            min(len(self.cv_systems), BMC_CONST.FLEET_WORKERS) or 1
+        # system name: list of step results, see run()
+        self.cv_results = {}
+        self.cv_wallTime = 0
+        self.cv_lock = threading.Lock()
+
+    ##
+    # @brief Builds a fleet from an inventory file. Every section but [test]
+    #        describes one system, with the keys of the [bmc] section of
+    #        op_ci_tools.cfg (ip, username, password, usernameipmi,
+    #        passwordipmi and optionally ipmibackend, lparip, lparuser,
+    #        lparpasswd).
+    #
+    # @param i_inventory @type string: inventory file
+    # @param i_ffdcDir @type string: FFDC directory, each system writes to a
+    #        sub directory named after its section
+    # @param i_workers @type int: systems run at the same time
+    #
+    # @return OpTestFleet object or raise OpTestError
+    #
+    @classmethod
+    def from_config(cls, i_inventory, i_ffdcDir, i_workers=None):
+        l_config = ConfigParser.RawConfigParser()
+        if not l_config.read(i_inventory):
+            l_msg = "Can not read the inventory %s" % i_inventory
+            print l_msg
+            raise OpTestError(l_msg)
+
+        l_systems = []
+        for l_name in l_config.sections():
+            if l_name == 'test':
+                continue
+            l_cfg = dict(l_config.items(l_name))
+            l_missing = [x for x in cls.SYSTEM_KEYS if x not in l_cfg]
+            if l_missing:
+                l_msg = "System %s in %s has no %s" % (l_name, i_inventory,
+                                                       ', '.join(l_missing))
+                print l_msg
+                raise OpTestError(l_msg)
+            l_ffdcDir = os.path.join(i_ffdcDir, l_name)
+            if not os.path.exists(l_ffdcDir):
+                os.makedirs(l_ffdcDir)
+            l_systems.append((l_name, OpTestSystem(
+                l_cfg['ip'], l_cfg['username'], l_cfg['password'],
+                l_cfg['usernameipmi'], l_cfg['passwordipmi'], l_ffdcDir,
+                l_cfg.get('lparip'), l_cfg.get('lparuser'),
+                l_cfg.get('lparpasswd'),
+                i_ipmiBackend=l_cfg.get('ipmibackend',
+                                        BMC_CONST.IPMI_BACKEND_IPMITOOL))))
+        if not l_systems:
+            l_msg = "The inventory %s lists no systems" % i_inventory
+            print l_msg
+            raise OpTestError(l_msg)
+        return cls(l_systems, i_ffdcDir, i_workers)
+
+    ##
+    # @brief Runs the steps on one system, stopping at the first failure
+    #
+    def _run_system(self, i_name, i_system, i_steps, i_output):
+        l_results = []
+        l_failed = False
+        l_log = open(os.path.join(i_system.cv_BMC.cv_ffdcDir or self.cv_ffdcDir,
+                                  'console.log'), 'a')
+        i_output.cv_files[threading.current_thread().ident] = l_log
+        try:
+            for l_step, l_func in i_steps:
+                if l_failed:
+                    l_results.append({'step': l_step, 'status': 'SKIP',
+                                      'time': 0, 'error': ''})
+                    continue
+                print "===== %s: %s" % (i_name, l_step)
+                l_start = time.time()
+                l_error = ''
+                try:
+                    l_rc = l_func(i_system)
+                    if l_rc not in (None, BMC_CONST.FW_SUCCESS):
+                        l_error = 'rc %s' % l_rc
+                except Exception as e:
+                    l_error = str(e) or e.__class__.__name__
+                l_time = round(time.time() - l_start, 3)
+                l_failed = bool(l_error)
+                l_results.append({'step': l_step,
+                                  'status': 'FAIL' if l_failed else 'PASS',
+                                  'time': l_time, 'error': l_error})
+                sys.stdout.flush()
+                i_output.cv_stdout.write("%s: %s %s (%.1fs)%s\n" % (
+                    i_name, l_step, l_results[-1]['status'], l_time,
+                    ' ' + l_error if l_error else ''))
+                i_output.cv_stdout.flush()
+        finally:
+            del i_output.cv_files[threading.current_thread().ident]
+            l_log.close()
+        with self.cv_lock:
+            self.cv_results[i_name] = l_results
+        return l_results
+
+    ##
+    # @brief Runs a sequence of steps on every system of the fleet
+    #
+    # @param i_steps @type list: (step name, function) tuples. The function
+    #        is called with the OpTestSystem and fails by returning something
+    #        other than None or BMC_CONST.FW_SUCCESS, or by raising.
+    #
+    # @return BMC_CONST.FW_SUCCESS if every step passed on every system,
+    #         else BMC_CONST.FW_FAILED
+    #
+    def run(self, i_steps):
+        self.cv_results = {}
+        if not os.path.exists(self.cv_ffdcDir):
+            os.makedirs(self.cv_ffdcDir)
+        l_output = _FleetOutput(sys.stdout)
+        l_pool = ThreadPool(self.cv_workers)
+        l_start = time.time()
+        l_threadStart = threading.Thread.start
+        threading.Thread.start = l_output.inherit(l_threadStart)
+        sys.stdout = l_output
+        try:
+            l_jobs = [l_pool.apply_async(self._run_system,
+                                         (l_name, l_system, i_steps, l_output))
+                      for l_name, l_system in self.cv_systems]
+            l_pool.close()
+            for l_job in l_jobs:
+                # a timeout keeps the main thread responsive to Ctrl-C
+                while not l_job.ready():
+                    l_job.wait(1)
+                l_job.get()
+        finally:
+            sys.stdout = l_output.cv_stdout
+            threading.Thread.start = l_threadStart
+            l_pool.terminate()
+        self.cv_wallTime = round(time.time() - l_start, 3)
+
+        self.write_results(os.path.join(self.cv_ffdcDir, 'fleet_results.json'))
+        print self.report()
+        for l_results in self.cv_results.values():
+            if [x for x in l_results if x['status'] != 'PASS']:
+                return BMC_CONST.FW_FAILED
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Formats the results as a table, one row per step and one column
+    #        per system
+    #
+    # @return string
+    #
+    def report(self):
+        l_names = [x[0] for x in self.cv_systems]
+        l_steps = []
+        for l_name in l_names:
+            for l_result in self.cv_results.get(l_name, []):
+                if l_result['step'] not in l_steps:
+                    l_steps.append(l_result['step'])
+        l_width = max([len(x) for x in l_steps] + [len('Step')])
+        l_col = max([len(x) for x in l_names] + [12])
+
+        l_lines = ['%-*s' % (l_width, 'Step') +
+                   ''.join('  %-*s' % (l_col, x) for x in l_names)]
+        for l_step in l_steps:
+            l_line = '%-*s' % (l_width, l_step)
+            for l_name in l_names:
+                l_cell = ''
+                for l_result in self.cv_results.get(l_name, []):
+                    if l_result['step'] == l_step:
+                        l_cell = l_result['status']
+                        if l_result['status'] != 'SKIP':
+                            l_cell += ' %.1fs' % l_result['time']
+                l_line += '  %-*s' % (l_col, l_cell)
+            l_lines.append(l_line)
+
+        l_line = '%-*s' % (l_width, 'Total')
+        l_serial = 0
+        for l_name in l_names:
+            l_time = sum(x['time'] for x in self.cv_results.get(l_name, []))
+            l_serial += l_time
+            l_line += '  %-*s' % (l_col, '%.1fs' % l_time)
+        l_lines.append(l_line)
+        l_lines.append('Fleet wall time %.1fs (%.1fs one system after the '
+                       'other)' % (self.cv_wallTime, l_serial))
+        for l_name in l_names:
+            for l_result in self.cv_results.get(l_name, []):
+                if l_result['status'] == 'FAIL':
+                    l_lines.append('%s: %s failed: %s' % (
+                        l_name, l_result['step'], l_result['error']))
+        return '\n'.join(l_lines)
+
+    ##
+    # @brief Writes the results as JSON
+    #
+    def write_results(self, i_path):
+        with open(i_path, 'w') as f:
+            json.dump({'wall_time': self.cv_wallTime,
+                       'systems': self.cv_results}, f, indent=2,
+                      sort_keys=True)
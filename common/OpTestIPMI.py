@@ -33,12 +33,28 @@
 import time
 import subprocess
 import os
+import re
+import pipes
+import shlex
+import string
+import binascii
+import hashlib
+import tempfile
+import threading
 import pexpect
 #from subprocess import check_output
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestLpar import OpTestLpar
 from OpTestUtil import OpTestUtil
+from OpTestIPMILan import OpTestIPMILan
+from OpTestIPMIShell import OpTestIPMIShellPool
+from OpTestSOL import OpTestSOL
+from OpTestBootProfile import OpTestBootProfile
+from OpTestReachability import OpTestReachability
+from OpTestSEL import OpTestSEL
+from OpTestIPMIParser import OpTestIPMIParser
+from OpTestTempDir import private_dir
 
 class OpTestIPMI():
 
@@ -49,8 +65,13 @@ class OpTestIPMI():
     # @param i_bmcUser @type string: Userid to log into the BMC
     # @param i_bmcPwd @type string: Password of the userid to log into the BMC
     # @param i_ffdcDir @type string: Optional param to indicate where to write FFDC
+    # @param i_backend @type string: BMC_CONST.IPMI_BACKEND_IPMITOOL to spawn
+    #        ipmitool for every command, BMC_CONST.IPMI_BACKEND_NATIVE to send
+    #        the commands it supports over a persistent RMCP+ session or
+    #        BMC_CONST.IPMI_BACKEND_SHELL to use persistent ipmitool shells
     #
-    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd, i_ffdcDir):
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd, i_ffdcDir,
+                 i_backend=BMC_CONST.IPMI_BACKEND_IPMITOOL):
 
         self.cv_bmcIP = i_bmcIP
         self.cv_bmcUser = i_bmcUser
@@ -59,6 +80,23 @@ class OpTestIPMI():
         self.cv_cmd = 'ipmitool -H %s -I lanplus -U %s -P %s ' \
                       % (self.cv_bmcIP, self.cv_bmcUser, self.cv_bmcPwd)
         self.util = OpTestUtil()
+        self.cv_backend = i_backend
+        self.cv_lan = None
+        self.cv_shell = None
+        self.cv_apssData = None
+        self.cv_sensorNums = None
+        self.cv_sensorFactors = None
+        self.cv_sdrCache = None
+        self.cv_sol = None
+        self.cv_resetTime = None
+        if i_backend == BMC_CONST.IPMI_BACKEND_NATIVE:
+            self.cv_lan = OpTestIPMILan.get_session(i_bmcIP, i_bmcUser, i_bmcPwd)
+        elif i_backend == BMC_CONST.IPMI_BACKEND_SHELL:
+            self.cv_shell = OpTestIPMIShellPool.get_pool(i_bmcIP, i_bmcUser,
+                                                         i_bmcPwd)
+        self.cv_sel = OpTestSEL(lambda x: self._ipmitool_cmd_run(self.cv_cmd + x),
+                                self.cv_lan.get_sel_entries if self.cv_lan
+                                else None)
         # apss response data address list
         self.ResponseDict = {
                             '0x00' : 'NO_CHANGE' ,       
@@ -131,20 +169,35 @@ class OpTestIPMI():
     #    Use backround=1, to spawn the child process and return the popen object,
     #    rather than waiting for the command completion and returning only the
     #    output.
+    #    With the native or shell backend, commands they can handle are not
+    #    spawned: the native backend sends raw, chassis power, mc reset/info and
+    #    sel clear over the RMCP+ session, the shell backend writes any command
+    #    to a persistent 'ipmitool shell' process. Pipelines made of grep and
+    #    'xxd -r -p' are then applied in Python. Everything else, or any backend
+    #    failure, falls back to spawning ipmitool.
     #
     # @param cmd @type string: The ipmitool command, for example: chassis power on
     # @param background @type bool: Spawn the command in as a background process.
     #        This is useful to monitor sensors or other runtime info. With
     #        background=False the function will block until the command finishes.
+    # @param echo @type bool: print the command first. Pollers turn it off,
+    #        the command line holds the password.
     #
     # @returns When background=1 it returns the subprocess child object. When
     #        background==False,it returns the output of the command.
     #
     #        raises: OpTestError when fails
     #
-    def _ipmitool_cmd_run(self, cmd, background=False):
+    def _ipmitool_cmd_run(self, cmd, background=False, echo=True):
+
+        if echo:
+            print cmd
+        if not background and self.cv_backend != BMC_CONST.IPMI_BACKEND_IPMITOOL \
+           and cmd.startswith(self.cv_cmd):
+            output = self._ipmitool_backend_run(cmd[len(self.cv_cmd):])
+            if output is not None:
+                return output
 
-        print cmd
         if background:
             try:
                 child = subprocess.Popen(cmd, shell=True)
@@ -167,6 +220,167 @@ class OpTestIPMI():
             return output
 
 
+    ##
+    # @brief Runs a list of ipmitool commands over as few sessions as possible.
+    #    With the native or shell backend the commands go to the persistent
+    #    session(s). Otherwise they are written to batch files, each run by one
+    #    'ipmitool exec' process, with an 'echo <sentinel>' line after every
+    #    command to split the output.
+    #
+    # @param i_cmds @type list: ipmitool commands without the ipmitool
+    #        options, e.g. ' raw 6 0x52 0x05 0x70 1 0x14'. No pipelines.
+    # @param i_workers @type int: number of commands in flight at once
+    #
+    # @return list with the output of every command or raise OpTestError
+    #
+    def _ipmitool_batch_run(self, i_cmds, i_workers=BMC_CONST.IPMI_BATCH_WORKERS):
+
+        l_outputs = [None] * len(i_cmds)
+        l_workers = max(1, min(i_workers, len(i_cmds)))
+
+        if self.cv_backend != BMC_CONST.IPMI_BACKEND_IPMITOOL:
+            l_next = iter(range(len(i_cmds)))
+            l_lock = threading.Lock()
+            def worker():
+                while True:
+                    with l_lock:
+                        l_index = next(l_next, None)
+                    if l_index is None:
+                        return
+                    l_outputs[l_index] = self._ipmitool_cmd_run(
+                        self.cv_cmd + i_cmds[l_index])
+            l_threads = [threading.Thread(target=worker)
+                         for x in range(l_workers)]
+            for l_thread in l_threads:
+                l_thread.start()
+            for l_thread in l_threads:
+                l_thread.join()
+        else:
+            l_jobs = []
+            for l_worker in range(l_workers):
+                l_indexes = range(l_worker, len(i_cmds), l_workers)
+                l_fd, l_path = tempfile.mkstemp(prefix='optest-ipmi-', suffix='.batch')
+                with os.fdopen(l_fd, 'w') as f:
+                    for l_index in l_indexes:
+                        f.write('%s\necho __OPTEST_BATCH_%d__\n'
+                                % (i_cmds[l_index].strip(), l_index))
+                l_cmd = self.cv_cmd + 'exec ' + l_path
+                print l_cmd
+                try:
+                    l_child = subprocess.Popen(l_cmd, stderr=subprocess.STDOUT,
+                                               stdout=subprocess.PIPE, shell=True)
+                except OSError:
+                    os.remove(l_path)
+                    l_msg = "Ipmitool Command Failed"
+                    print l_msg
+                    raise OpTestError(l_msg)
+                l_jobs.append((l_child, l_path))
+
+            for l_child, l_path in l_jobs:
+                l_text = ''
+                for l_line in l_child.communicate()[0].splitlines(True):
+                    l_match = re.match(r'__OPTEST_BATCH_(\d+)__$', l_line.strip())
+                    if l_match:
+                        l_outputs[int(l_match.group(1))] = l_text
+                        l_text = ''
+                    else:
+                        l_text += l_line
+                os.remove(l_path)
+                if l_text.strip():
+                    print l_text
+
+        l_missing = [i_cmds[i] for i in range(len(i_cmds)) if l_outputs[i] is None]
+        if l_missing:
+            l_msg = "Ipmitool batch failed for: %s" % ', '.join(l_missing)
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_outputs
+
+    ##
+    # @brief Runs an ipmitool command on the configured native or shell backend
+    #
+    # @param i_args @type string: ipmitool arguments, optionally followed by a
+    #        pipeline, e.g. "sdr elist |grep 'Host Status'"
+    #
+    # @return the command output, or None when the caller should spawn ipmitool
+    #
+    def _ipmitool_backend_run(self, i_args):
+
+        l_split = self._ipmitool_cmd_split(i_args)
+        if l_split is None:
+            return None
+        l_args, l_filters = l_split
+        output = None
+        try:
+            if self.cv_lan is not None:
+                output = self.cv_lan.run_command(l_args)
+            elif self.cv_shell is not None and \
+                 l_args.split()[:2] != ['sol', 'activate']:
+                output = self.cv_shell.run(l_args)
+        except OpTestError as e:
+            print "IPMI %s backend failed (%s), falling back to ipmitool" \
+                  % (self.cv_backend, e)
+            return None
+        if output is None:
+            return None
+        for l_filter in l_filters:
+            output = self._ipmitool_filter(output, l_filter)
+        return output
+
+    ##
+    # @brief Splits an ipmitool command line into the ipmitool arguments and
+    #        the shell pipeline that follows them
+    #
+    # @return tuple (arguments, list of filter argv lists), or None when the
+    #         pipeline contains something that can not be done in Python
+    #
+    def _ipmitool_cmd_split(self, i_args):
+
+        l_parts = i_args.split('|')
+        l_filters = []
+        for l_part in l_parts[1:]:
+            try:
+                l_argv = shlex.split(l_part)
+            except ValueError:
+                return None
+            if not l_argv:
+                return None
+            if l_argv[0] == 'grep' and len(l_argv) >= 2 and \
+               all(x in ('-i', '-v') for x in l_argv[1:-1]):
+                l_filters.append(l_argv)
+            elif l_argv == ['xxd', '-r', '-p']:
+                l_filters.append(l_argv)
+            else:
+                return None
+        l_args = l_parts[0].strip()
+        if not l_args or set('<>;&`$').intersection(l_args):
+            return None
+        # ipmitool options, e.g. -S <SDR cache>
+        if l_args.startswith('-'):
+            return None
+        return (l_args, l_filters)
+
+    ##
+    # @brief Applies one 'grep [-i] [-v] pattern' or 'xxd -r -p' stage
+    #
+    # @return the filtered output
+    #
+    def _ipmitool_filter(self, i_output, i_filter):
+
+        if i_filter[0] == 'xxd':
+            l_hex = ''.join(c for c in i_output if c in string.hexdigits)
+            return binascii.unhexlify(l_hex[:len(l_hex) & ~1])
+
+        l_flags = re.I if '-i' in i_filter[1:-1] else 0
+        l_invert = '-v' in i_filter[1:-1]
+        l_regex = re.compile(i_filter[-1], l_flags)
+        l_lines = [l for l in i_output.splitlines()
+                   if bool(l_regex.search(l)) != l_invert]
+        if not l_lines:
+            return ''
+        return '\n'.join(l_lines) + '\n'
+
+
     ##
     # @brief This function clears the system event log
     #
@@ -175,10 +389,11 @@ class OpTestIPMI():
     def ipmi_sel_clear(self):
 
         output = self._ipmitool_cmd_run(self.cv_cmd + 'sel clear')
-        if 'Clearing SEL' in output:
+        if OpTestIPMIParser.sel_clearing(output):
             time.sleep(3)
             output = self._ipmitool_cmd_run(self.cv_cmd + 'sel elist')
-            if 'no entries' in output:
+            if OpTestIPMIParser.sel_empty(output):
+                self.cv_sel.reset()
                 return BMC_CONST.FW_SUCCESS
             else:
                 l_msg = "Sensor event log still has entries!"
@@ -197,7 +412,7 @@ class OpTestIPMI():
     #
     def ipmi_power_off(self):
         output = self._ipmitool_cmd_run(self.cv_cmd + 'chassis power off')
-        if 'Down/Off' in output:
+        if OpTestIPMIParser.power_control(output) == 'Down/Off':
             return BMC_CONST.FW_SUCCESS
         else:
             l_msg = "Power OFF Failed"
@@ -205,14 +420,29 @@ class OpTestIPMI():
             raise OpTestError(l_msg)
 
 
+    ##
+    # @brief Drops the local token of the flash manifest of this BMC (see
+    #        OpTestBMC.pnor_img_flash_diff), so that the next differential
+    #        flash reads the partitions back. Called when the host powers on,
+    #        as its firmware writes partitions at runtime, and when PNOR is
+    #        updated without pflash.
+    #
+    def ipmi_flash_manifest_invalidate(self):
+        try:
+            os.unlink(os.path.join(private_dir(BMC_CONST.FLASH_TOKEN_DIR),
+                                   self.cv_bmcIP + '.token'))
+        except OSError:
+            pass
+
     ##
     # @brief This function sends the chassis power on ipmitool command
     #
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
     def ipmi_power_on(self):
+        self.ipmi_flash_manifest_invalidate()
         output = self._ipmitool_cmd_run(self.cv_cmd + 'chassis power on')
-        if 'Up/On' in output:
+        if OpTestIPMIParser.power_control(output) == 'Up/On':
             return BMC_CONST.FW_SUCCESS
         else:
             l_msg = "Power ON Failed"
@@ -227,7 +457,7 @@ class OpTestIPMI():
     #
     def ipmi_power_soft(self):
         output = self._ipmitool_cmd_run(self.cv_cmd + 'chassis power soft')
-        if "Chassis Power Control: Soft" in output:
+        if OpTestIPMIParser.power_control(output) == 'Soft':
             return BMC_CONST.FW_SUCCESS
         else:
             l_msg = "Power Soft Failed"
@@ -236,32 +466,31 @@ class OpTestIPMI():
 
 
     ##
-    # @brief Spawns the sol logger expect script as a background process. In order to
-    #        properly kill the process the caller should call the ipmitool sol
-    #        deactivate command, i.e.: ipmitool_cmd_run('sol deactivate'). The sol.log
-    #        file is placed in the FFDC directory
+    # @brief Starts capturing the SOL console in this process (see OpTestSOL).
+    #        In order to end the capture the caller should call the ipmitool sol
+    #        deactivate command, i.e.: ipmitool_cmd_run('sol deactivate'), or
+    #        stop() the returned object. The host_sol.log file is placed in the
+    #        FFDC directory, with the host_sol.idx arrival time index next to
+    #        it. The capture is also kept in self.cv_sol so that
+    #        callers can watch() the console stream.
     #
-    # @return OpTestError
+    # @return OpTestSOL object or raise OpTestError
     #
     def _ipmi_sol_capture(self):
 
+        if self.cv_sol is not None:
+            self.cv_sol.stop()
         try:
             self._ipmitool_cmd_run(self.cv_cmd + 'sol deactivate')
         except OpTestError:
             print 'SOL already deactivated'
         time.sleep(2)
         logFile = self.cv_ffdcDir + '/' + 'host_sol.log'
-        cmd = os.getcwd() + '/../common/sol_logger.exp %s %s %s %s' % (
-            self.cv_bmcIP,
-            self.cv_bmcUser,
-            self.cv_bmcPwd,
-            logFile)
-        print cmd
-        try:
-            solChild = subprocess.Popen(cmd, shell=True)
-        except:
-            raise OpTestError("sol capture Failed")
-        return solChild
+        indexFile = self.cv_ffdcDir + '/' + 'host_sol.idx'
+        self.cv_sol = OpTestSOL(self.cv_bmcIP, self.cv_bmcUser, self.cv_bmcPwd,
+                                logFile, i_indexFile=indexFile)
+        self.cv_sol.start()
+        return self.cv_sol
 
 
     ##
@@ -271,6 +500,12 @@ class OpTestIPMI():
     #        petitboot is has began loading.  The overall timeout for the IPL is defined
     #        in the test configuration options.'''
     #
+    #        Only the Host Status sensor is read (by its cached sensor number),
+    #        with a poll interval that backs off from BMC_CONST.IPL_POLL_MIN to
+    #        BMC_CONST.IPL_POLL_MAX. The SOL console is watched for the
+    #        petitboot banner in between, and the wait ends on whichever signal
+    #        comes first.
+    #
     # @param timeout @type int: The number of minutes to wait for IPL to complete,
     #       i.e. How long to poll the ACPI sensor for working state before giving up.
     #
@@ -278,28 +513,56 @@ class OpTestIPMI():
     #
     def ipl_wait_for_working_state(self, timeout=10):
 
-        ''' WORKAROUND FOR AMI BUG
-         A sleep is required here because Host status sensor is set incorrectly
-         to working state right after power on '''
         sol = self._ipmi_sol_capture()
-        time.sleep(60)
+        l_start = time.time()
+        timeout = l_start + BMC_CONST.IPL_SETTLE_TIME + 60*timeout
+        l_banner = sol.watch(BMC_CONST.IPL_SOL_BANNER)
+        # a fatal SEL entry ends the wait on the banner below
+        l_selWatch = self.cv_sel.watch(i_callback=lambda r: l_banner.cancel())
 
-        timeout = time.time() + 60*timeout
+        ''' WORKAROUND FOR AMI BUG
+         The Host status sensor can read working state right after power on,
+         so a working state only counts once a non working state was seen or
+         once BMC_CONST.IPL_SETTLE_TIME has passed. '''
+        l_seenOff = False
+        l_interval = BMC_CONST.IPL_POLL_MIN
+        l_nextPoll = l_start
+        try:
+            while True:
+                l_selWatch.check()
+                l_now = time.time()
+                if l_now >= l_nextPoll:
+                    l_working = self.ipmi_host_status_working()
+                    if l_working:
+                        if l_seenOff or \
+                           l_now - l_start >= BMC_CONST.IPL_SETTLE_TIME:
+                            print "Host Status is S0/G0: working, IPL finished"
+                            break
+                    elif l_working is not None:
+                        l_seenOff = True
+                    l_nextPoll = time.time() + l_interval
+                    l_interval = min(l_interval * BMC_CONST.IPL_POLL_BACKOFF,
+                                     BMC_CONST.IPL_POLL_MAX)
 
-        ''' AMI BUG is fixed now
-         After updating the AMI level the Host Status sensor works as expected.
-        '''
-        cmd = 'sdr elist |grep \'Host Status\''
-        while True:
-            output = self._ipmitool_cmd_run(self.cv_cmd + cmd)
-            if 'S0/G0: working' in output:
-                print "Host Status is S0/G0: working, IPL finished"
-                break
-            if time.time() > timeout:
-                l_msg = "IPL timeout"
-                print l_msg
-                raise OpTestError(l_msg)
-            time.sleep(5)
+                if time.time() > timeout:
+                    l_msg = "IPL timeout"
+                    print l_msg
+                    raise OpTestError(l_msg)
+
+                # wakes up as soon as the banner shows up on the console
+                l_wait = max(0, l_nextPoll - time.time())
+                if l_banner.done() and l_banner.cv_match is None:
+                    # the SOL capture ended or a fatal SEL entry was logged,
+                    # only the sensor is left
+                    time.sleep(l_wait)
+                elif l_banner.wait(l_wait) is not None:
+                    # the banner may have matched just before a fatal entry
+                    l_selWatch.check()
+                    print "Petitboot banner seen on SOL, IPL finished"
+                    break
+        finally:
+            l_banner.cancel()
+            l_selWatch.stop()
 
         try:
             self._ipmitool_cmd_run(self.cv_cmd + 'sol deactivate')
@@ -310,24 +573,320 @@ class OpTestIPMI():
 
         return BMC_CONST.FW_SUCCESS
 
+    ##
+    # @brief Returns the local copy of the SDR repository, dumping it with
+    #        'sdr dump' when there is none for this BMC firmware level yet.
+    #        The file is named after the BMC and a hash of the 'mc info'
+    #        firmware fields and of the 'sdr info' addition and erase times,
+    #        so a new BMC firmware or a changed SDR repository gets a new dump.
+    #        ipmitool reads it with -S instead of walking the repository.
+    #
+    # @return path of the SDR dump, or None when it can not be made
+    #
+    def ipmi_sdr_cache(self):
+
+        if self.cv_sdrCache is not None:
+            return self.cv_sdrCache
+        l_key = self._ipmi_sdr_key()
+        if l_key is None:
+            return None
+        try:
+            l_dir = private_dir(BMC_CONST.SDR_CACHE_DIR)
+        except (OSError, OpTestError) as e:
+            print "Can not use the SDR cache: %s" % e
+            return None
+        l_path = os.path.join(l_dir, '%s-%s.sdr' % (self.cv_bmcIP, l_key))
+        if not os.path.exists(l_path):
+            try:
+                l_fd, l_tmp = tempfile.mkstemp(dir=l_dir, suffix='.part')
+            except OSError as e:
+                print "Can not write the SDR cache: %s" % e
+                return None
+            os.close(l_fd)
+            try:
+                if self.cv_lan is not None:
+                    with open(l_tmp, 'wb') as f:
+                        for l_id, l_rec in self.cv_lan.get_sdr_records():
+                            f.write(l_rec)
+                else:
+                    self._ipmitool_cmd_run(self.cv_cmd + 'sdr dump ' + l_tmp)
+                if os.path.getsize(l_tmp) == 0:
+                    print "SDR dump of %s is empty" % self.cv_bmcIP
+                    return None
+                os.rename(l_tmp, l_path)
+            except (OSError, OpTestError) as e:
+                print "SDR dump of %s failed: %s" % (self.cv_bmcIP, e)
+                return None
+            finally:
+                if os.path.exists(l_tmp):
+                    os.remove(l_tmp)
+            print "SDR repository of %s cached in %s" % (self.cv_bmcIP, l_path)
+        self.cv_sdrCache = l_path
+        return l_path
+
+    ##
+    # @brief Identifies the BMC firmware level and the SDR repository version
+    #
+    # @return hex string, or None when 'mc info' can not be read
+    #
+    def _ipmi_sdr_key(self):
+
+        l_fields = []
+        for l_cmd, l_names in (('mc info', BMC_CONST.SDR_KEY_MC_FIELDS),
+                               ('sdr info', BMC_CONST.SDR_KEY_SDR_FIELDS)):
+            l_output = self._ipmitool_cmd_run(self.cv_cmd + l_cmd)
+            l_field = None
+            for l_line in l_output.splitlines():
+                l_name, l_sep, l_value = l_line.partition(':')
+                if l_sep and l_name[:1] != ' ':
+                    l_field = l_name.strip()
+                if l_field in l_names:
+                    # 'Aux Firmware Rev Info' continues on the next lines
+                    l_fields.append(l_line.strip())
+            if l_cmd == 'mc info' and not l_fields:
+                print "Can not read the firmware level of %s" % self.cv_bmcIP
+                return None
+        return hashlib.md5('\n'.join(l_fields)).hexdigest()[:16]
+
+    ##
+    # @brief Returns the sensor numbers by name, read from the SDR cache
+    #        (see ipmi_sdr_cache) or, without one, from 'sdr elist'
+    #
+    # @return dict {sensor name: sensor number} or None if no sensor was found
+    #
+    def ipmi_sensor_numbers(self):
+
+        if self.cv_sensorNums is None:
+            l_path = self.ipmi_sdr_cache()
+            if l_path is not None:
+                with open(l_path, 'rb') as f:
+                    l_nums = OpTestIPMILan.sensor_numbers(
+                        OpTestIPMILan.sdr_records_split(f.read()))
+                if l_nums:
+                    self.cv_sensorNums = l_nums
+        if self.cv_sensorNums is None:
+            output = self._ipmitool_cmd_run(self.cv_cmd + 'sdr elist')
+            self.ipmi_sensor_numbers_set(output)
+        return self.cv_sensorNums
+
+    ##
+    # @brief Returns the sensor number of a sensor, reading the SDR repository
+    #        only the first time
+    #
+    # @param i_name @type string: sensor name, e.g. 'Host Status'
+    #
+    # @return sensor number (int) or None if the BMC has no such sensor
+    #
+    def ipmi_get_sensor_number(self, i_name):
+
+        l_nums = self.ipmi_sensor_numbers()
+        if l_nums is None:
+            return None
+        return l_nums.get(i_name)
+
+    ##
+    # @brief Forgets the sensor numbers and the SDR cache file in use, e.g.
+    #        after an MC reset or a BMC code update. The next lookup checks
+    #        the firmware level again.
+    #
+    def ipmi_sdr_cache_reset(self):
+
+        self.cv_sdrCache = None
+        self.cv_sensorNums = None
+        self.cv_sensorFactors = None
+
+    ##
+    # @brief Reads sensors by name, without printing the command: it is meant
+    #        for pollers. The native backend sends one Get Sensor Reading per
+    #        sensor and converts the readings with the SDR cache, the shell
+    #        backend runs 'sensor reading' in its persistent ipmitool, else
+    #        ipmitool is spawned with the SDR cache (-S).
+    #
+    # @param i_sensors @type list: sensor names, as in 'sdr list'
+    #
+    # @return dict {sensor name: value}, see OpTestIPMIParser.sensor_reading,
+    #         or raise OpTestError
+    #
+    def ipmi_sensor_values(self, i_sensors):
+
+        l_args = 'sensor reading ' + ' '.join(pipes.quote(x) for x in i_sensors)
+        l_path = self.ipmi_sdr_cache()
+        if self.cv_lan is not None and l_path is not None:
+            l_values = self._ipmi_sensor_values_native(i_sensors, l_path)
+            if l_values is not None:
+                return l_values
+        elif self.cv_shell is not None:
+            try:
+                return OpTestIPMIParser.sensor_reading(self.cv_shell.run(l_args))
+            except OpTestError as e:
+                print "IPMI shell backend failed (%s), falling back to " \
+                      "ipmitool" % e
+
+        l_cmd = self.cv_cmd
+        if l_path is not None:
+            l_cmd += '-S %s ' % l_path
+        output = self._ipmitool_cmd_run(l_cmd + l_args, echo=False)
+        return OpTestIPMIParser.sensor_reading(output)
+
+    ##
+    # @brief Reads sensors over the native session, see ipmi_sensor_values
+    #
+    # @return dict {sensor name: value}, or None when ipmitool has to read them
+    #
+    def _ipmi_sensor_values_native(self, i_sensors, i_path):
+
+        if self.cv_sensorFactors is None:
+            with open(i_path, 'rb') as f:
+                self.cv_sensorFactors = OpTestIPMILan.sensor_factors(
+                    OpTestIPMILan.sdr_records_split(f.read()))
+        l_values = {}
+        for l_name in i_sensors:
+            l_sensor = self.cv_sensorFactors.get(l_name)
+            if l_sensor is None:
+                # like ipmitool, no value for a sensor it does not know
+                continue
+            l_num, l_factors = l_sensor
+            try:
+                l_cc, l_data = self.cv_lan.raw(OpTestIPMILan.NETFN_SENSOR, 0x2d,
+                                               [l_num])
+            except OpTestError as e:
+                print "IPMI native backend failed (%s), falling back to " \
+                      "ipmitool" % e
+                return None
+            # flags bit 5: reading unavailable
+            if l_cc != 0 or len(l_data) < 2 or l_data[1] & 0x20:
+                l_values[l_name] = None
+            else:
+                l_values[l_name] = OpTestIPMILan.sensor_value(l_factors,
+                                                              l_data[0])
+        return l_values
+
+    ##
+    # @brief Reads one sensor with Get Sensor Reading
+    #
+    # @param i_num @type int: sensor number
+    #
+    # @return list of the response bytes (reading, flags, state bytes), or None
+    #         when the reading is not available
+    #
+    def ipmi_sensor_reading(self, i_num):
+
+        output = self._ipmitool_cmd_run(self.cv_cmd +
+                                        ' raw 0x04 0x2d 0x%02x' % i_num)
+        try:
+            l_data = [int(x, 16) for x in output.split()]
+        except ValueError:
+            return None
+        # flags bit 5: reading unavailable
+        if len(l_data) < 2 or l_data[1] & 0x20:
+            return None
+        return l_data
 
     ##
-    # @brief This function dumps the sel log and looks for specific hostboot error
-    #        log string
+    # @brief Fills the sensor number cache from 'sdr elist' output
+    #
+    # @return True if sensors were found. The cache is left empty otherwise,
+    #         so that the next lookup reads the SDR repository again.
+    #
+    def ipmi_sensor_numbers_set(self, i_output):
+
+        l_nums = dict((x.name, x.number) for x in OpTestIPMIParser.sdr(i_output)
+                      if x.number is not None)
+        if not l_nums:
+            return False
+        self.cv_sensorNums = l_nums
+        return True
+
+    ##
+    # @brief Reads the Host Status (ACPI power state) sensor
+    #
+    # @return True when it reads S0/G0: working, False when it reads another
+    #         state, None when the reading is not available
+    #
+    def ipmi_host_status_working(self):
+
+        l_num = self.ipmi_get_sensor_number(BMC_CONST.HOST_STATUS_SENSOR)
+        if l_num is None:
+            output = self._ipmitool_cmd_run(self.cv_cmd +
+                                            'sdr elist |grep \'Host Status\'')
+            l_records = OpTestIPMIParser.sdr(output)
+            if not l_records:
+                return None
+            return BMC_CONST.HOST_STATUS_WORKING_STATE in \
+                   OpTestIPMIParser.states(l_records[0].reading)
+
+        output = self._ipmitool_cmd_run(self.cv_cmd +
+                                        ' raw 0x04 0x2d 0x%02x' % l_num)
+        return self.ipmi_host_status_parse(output)
+
+    ##
+    # @brief Decodes a Get Sensor Reading (raw 0x04 0x2d) response of the
+    #        Host Status sensor
+    #
+    # @return True for S0/G0: working, False for another state, None when
+    #         the reading is not available
+    #
+    def ipmi_host_status_parse(self, i_output):
+
+        try:
+            l_data = [int(x, 16) for x in i_output.split()]
+        except ValueError:
+            return None
+        # reading, flags (bit 5: reading unavailable), state bits 0-7
+        if len(l_data) < 3 or l_data[1] & 0x20:
+            return None
+        return bool(l_data[2] & BMC_CONST.HOST_STATUS_S0_WORKING)
+
+
+    ##
+    # @brief Builds the boot milestone profile of the last SOL capture and
+    #        writes it to boot_profile.json and boot_profile_trace.json (Chrome
+    #        trace format) in the FFDC directory
+    #
+    # @return the profile dict (see OpTestBootProfile.profile)
+    #         or raise OpTestError
+    #
+    def ipmi_boot_profile(self):
+
+        l_profiler = OpTestBootProfile()
+        l_profiler.load(self.cv_ffdcDir + '/' + 'host_sol.log',
+                        self.cv_ffdcDir + '/' + 'host_sol.idx')
+        l_profile = l_profiler.write_json(self.cv_ffdcDir + '/' +
+                                          'boot_profile.json')
+        l_profiler.write_trace(self.cv_ffdcDir + '/' + 'boot_profile_trace.json',
+                               l_profile)
+        if not l_profile['phases']:
+            l_msg = "No boot milestones found in the SOL log"
+            print l_msg
+            raise OpTestError(l_msg)
+        for l_phase in l_profile['phases']:
+            print "%-20s start %9.3fs  duration %9.3fs" % (
+                l_phase['name'], l_phase['start'], l_phase['duration'])
+        return l_profile
+
+
+    ##
+    # @brief This function reads the entries added to the sel log since the
+    #        last read (see OpTestSEL), writes the whole log to host_sel.log in
+    #        the FFDC directory and looks for specific hostboot error log
+    #        events
+    #
+    # @param i_string @type string: event description to look for
     #
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
     def ipmi_sel_check(self,i_string):
 
-        selDesc = 'Transition to Non-recoverable'
-        logFile = self.cv_ffdcDir + '/' + 'host_sol.log'
-        output = self._ipmitool_cmd_run(self.cv_cmd + 'sel elist')
+        logFile = self.cv_ffdcDir + '/' + 'host_sel.log'
+        self.cv_sel.update()
 
-        with open('%s' % logFile, 'w') as f:
-            for line in output:
-                f.write(line)
+        with open(logFile, 'w') as f:
+            f.write(self.cv_sel.dump())
 
-        if i_string in output:
+        l_found = self.cv_sel.find(i_string)
+        if l_found:
+            for l_record in l_found:
+                print l_record.line
             l_msg = 'Error log(s) detected during IPL. Please see %s' % logFile
             print l_msg
             raise OpTestError(l_msg)
@@ -402,29 +961,54 @@ class OpTestIPMI():
     #     /*  [3a]: INVALID_CMD         */ &G_i2cInvalid,
     # };
     #
+    # The registers are read in one batch, see ipmi_apss_read().
+    #
+    # @param i_workers @type int: number of concurrent ipmitool sessions
+    #
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
-    def ipmi_apss_get(self):
+    def ipmi_apss_get(self, i_workers=BMC_CONST.IPMI_BATCH_WORKERS):
 
-        selDesc = 'Transition to Non-recoverable'
-        l_cmd = BMC_CONST.BMC_APSS_DATA
         logFile = self.cv_ffdcDir + '/' + 'host_apss.log'
+        l_values = self.ipmi_apss_read(i_workers)
         apssdata = ''
-        apssdatalen = len(self.ResponseDict)
-        for key in range(apssdatalen):
+        for key in sorted(l_values):
             addr = '0x%02x'%(key)
-            output = self._ipmitool_cmd_run(self.cv_cmd + l_cmd + addr)
-            if "nable to send" in output:
-                print output
-                raise OpTestError(output)
-            apssdata = apssdata + '|%10s\t|%10s\t|\t0x%02x\t|\r\n'%(addr,self.ResponseDict[addr],int(output,16))
+            apssdata = apssdata + '|%10s\t|%10s\t|\t0x%02x\t|\r\n'%(addr,self.ResponseDict[addr],l_values[key])
 
         apssdata = '|%10s\t|%10s\t|%10s\t|\r\n'%('Address', 'Description', 'Value') + '-'*50 + '\r\n' + apssdata
 
         with open('%s' % logFile, 'w') as f:
-            for line in apssdata:
-                f.write(line)
+            f.write(apssdata)
 
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Reads every APSS register listed in ResponseDict in one batch
+    #        instead of one ipmitool process per register
+    #
+    # @param i_workers @type int: number of concurrent ipmitool sessions
+    #
+    # @return dict {register address (int): value (int)} or raise OpTestError
+    #
+    def ipmi_apss_read(self, i_workers=BMC_CONST.IPMI_BATCH_WORKERS):
+
+        l_addrs = range(len(self.ResponseDict))
+        l_cmds = [BMC_CONST.BMC_APSS_DATA + '0x%02x' % (x) for x in l_addrs]
+        l_outputs = self._ipmitool_batch_run(l_cmds, i_workers)
+        l_values = {}
+        for l_addr, output in zip(l_addrs, l_outputs):
+            if "nable to send" in output:
+                print output
+                raise OpTestError(output)
+            try:
+                l_values[l_addr] = int(output, 16)
+            except ValueError:
+                l_msg = "Bad APSS register 0x%02x data: %s" % (l_addr, output)
+                print l_msg
+                raise OpTestError(l_msg)
+        self.cv_apssData = l_values
+        return l_values
 
     ##
     # @brief This function used to get the sensor data and store the result to sdr log
@@ -433,7 +1017,12 @@ class OpTestIPMI():
     #
     def ipmi_sdr_get(self):
 
-        output = self._ipmitool_cmd_run(self.cv_cmd + 'sdr list')
+        l_path = self.ipmi_sdr_cache()
+        if l_path is not None:
+            output = self._ipmitool_cmd_run(self.cv_cmd + '-S %s sdr list'
+                                            % l_path)
+        else:
+            output = self._ipmitool_cmd_run(self.cv_cmd + 'sdr list')
         logFile = self.cv_ffdcDir + '/' + 'host_sdr.log'
         if "Unable to" in output:
             l_msg = "Getting sensor data record Failed"
@@ -447,45 +1036,99 @@ class OpTestIPMI():
 
 
     ##
-    # @brief Performs a cold reset onto the bmc
+    # @brief Resets the MC and waits for it to come back: first for its IPMI
+    #        stack to stop answering (session-less Get Channel Authentication
+    #        Capabilities), then for it to answer again and for 'mc info' to
+    #        work in a session.
     #
-    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    # @param i_type @type string: 'cold' or 'warm'
+    # @param i_timeout @type int: seconds to wait for the MC to come back
     #
-    def ipmi_cold_reset(self):
+    # @return seconds from the reset command until 'mc info' worked again,
+    #         None if the MC was not seen going down (it is then given
+    #         BMC_CONST.BMC_*_RESET_DELAY seconds first), or raise OpTestError
+    #
+    def ipmi_mc_reset(self, i_type='cold', i_timeout=BMC_CONST.BMC_RESET_TIMEOUT):
 
-        l_cmd = BMC_CONST.BMC_COLD_RESET
-        print ("Applying Cold reset. Wait for "
-                            + str(BMC_CONST.BMC_COLD_RESET_DELAY) + "sec")
-        rc = self._ipmitool_cmd_run(self.cv_cmd + l_cmd)
-        if BMC_CONST.BMC_PASS_COLD_RESET in rc:
-            print rc
-            time.sleep(BMC_CONST.BMC_COLD_RESET_DELAY)
-            return BMC_CONST.FW_SUCCESS
+        if i_type == 'cold':
+            l_cmd = BMC_CONST.BMC_COLD_RESET
+            l_pass = BMC_CONST.BMC_PASS_COLD_RESET
+            l_delay = BMC_CONST.BMC_COLD_RESET_DELAY
+        elif i_type == 'warm':
+            l_cmd = BMC_CONST.BMC_WARM_RESET
+            l_pass = BMC_CONST.BMC_PASS_WARM_RESET
+            l_delay = BMC_CONST.BMC_WARM_RESET_DELAY
         else:
-            l_msg = "Cold reset Failed"
+            raise OpTestError("Unknown MC reset type '%s'" % i_type)
+
+        print "Applying %s reset. Wait for the MC to come back" % i_type.capitalize()
+        l_start = time.time()
+        rc = self._ipmitool_cmd_run(self.cv_cmd + l_cmd)
+        if l_pass not in rc:
+            l_msg = "%s reset Failed" % i_type.capitalize()
             print l_msg
             raise OpTestError(l_msg)
+        print rc
+
+        l_reach = OpTestReachability(self.cv_bmcIP)
+        l_down = l_reach.wait_down('ipmi', BMC_CONST.BMC_RESET_DOWN_TIMEOUT)
+        if l_down is None:
+            # the reset may not have started yet: an answer now would come
+            # from the MC before the reset, so wait as long as before polling
+            print "MC kept answering IPMI after the %s reset, waiting %ds" \
+                  % (i_type, l_delay)
+            time.sleep(max(l_start + l_delay - time.time(), 0))
+        l_left = l_start + i_timeout - time.time()
+        l_reach.wait(['ipmi'], max(l_left, 0))
+
+        l_interval = BMC_CONST.REACH_POLL_MIN
+        while True:
+            output = self._ipmitool_cmd_run(self.cv_cmd + 'mc info')
+            if OpTestIPMIParser.mc_info(output) is not None:
+                break
+            if time.time() - l_start > i_timeout:
+                l_msg = "MC did not come back %ds after the %s reset" \
+                        % (i_timeout, i_type)
+                print l_msg
+                raise OpTestError(l_msg)
+            time.sleep(l_interval)
+            l_interval = min(l_interval * BMC_CONST.REACH_POLL_BACKOFF,
+                             BMC_CONST.REACH_POLL_MAX)
+
+        # the time is only measured when the MC was seen going down
+        if l_down is None:
+            self.cv_resetTime = None
+            print "MC answering after the %s reset" % i_type
+        else:
+            self.cv_resetTime = round(time.time() - l_start, 3)
+            print "MC back %.1fs after the %s reset" % (self.cv_resetTime,
+                                                      i_type)
+        # the firmware may have changed, e.g. after a code update
+        self.ipmi_sdr_cache_reset()
+        return self.cv_resetTime
+
+    ##
+    # @brief Performs a cold reset onto the bmc and waits for it to come back,
+    #        the time it took is kept in cv_resetTime
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def ipmi_cold_reset(self):
+
+        self.ipmi_mc_reset('cold')
+        return BMC_CONST.FW_SUCCESS
 
 
     ##
-    # @brief Performs a warm reset onto the bmc
+    # @brief Performs a warm reset onto the bmc and waits for it to come back,
+    #        the time it took is kept in cv_resetTime
     #
     # @return BMC_CONST.FW_SUCCESS or raise OpTestError
     #
     def ipmi_warm_reset(self):
 
-        l_cmd = BMC_CONST.BMC_WARM_RESET
-        print ("Applying Warm reset. Wait for "
-                            + str(BMC_CONST.BMC_WARM_RESET_DELAY) + "sec")
-        rc = self._ipmitool_cmd_run(self.cv_cmd + l_cmd)
-        if BMC_CONST.BMC_PASS_WARM_RESET in rc:
-            print rc
-            time.sleep(BMC_CONST.BMC_WARM_RESET_DELAY)
-            return BMC_CONST.FW_SUCCESS
-        else:
-            l_msg = "Warm reset Failed"
-            print l_msg
-            raise OpTestError(l_msg)
+        self.ipmi_mc_reset('warm')
+        return BMC_CONST.FW_SUCCESS
 
 
     ##
@@ -519,6 +1162,7 @@ class OpTestIPMI():
     #
     def ipmi_code_update(self, i_image, i_imagecomponent):
 
+        self.ipmi_flash_manifest_invalidate()
         self.ipmi_cold_reset()
         l_cmd = BMC_CONST.BMC_HPM_UPDATE + i_image + " " + i_imagecomponent
         self.ipmi_preserve_network_setting()
@@ -532,7 +1176,7 @@ class OpTestIPMI():
             print l_msg
             raise OpTestError(l_msg)
 
-        if(rc.__contains__("Firmware upgrade procedure successful")):
+        if OpTestIPMIParser.hpm_upgrade_ok(rc):
             return BMC_CONST.FW_SUCCESS
         else:
             l_msg = "Code Update Failed"
@@ -549,11 +1193,24 @@ class OpTestIPMI():
     #
     def ipmi_get_side_activated(self):
 
-        rc = self._ipmitool_cmd_run(self.cv_cmd + BMC_CONST.BMC_ACTIVE_SIDE)
-        if(rc.__contains__(BMC_CONST.PRIMARY_SIDE)):
+        rc = None
+        l_nums = self.ipmi_sensor_numbers() or {}
+        l_names = [x for x in l_nums
+                   if BMC_CONST.GOLDEN_SIDE_SENSOR in x.lower()]
+        if l_names:
+            l_data = self.ipmi_sensor_reading(l_nums[l_names[0]])
+            if l_data is not None and len(l_data) >= 4:
+                # the state bytes, the way 'sensor list' prints them
+                rc = "0x%02x%02x" % (l_data[2], l_data[3])
+        if rc is None:
+            l_records = OpTestIPMIParser.sensor(self._ipmitool_cmd_run(
+                self.cv_cmd + BMC_CONST.BMC_ACTIVE_SIDE))
+            if l_records:
+                rc = l_records[0].status
+        if rc == BMC_CONST.PRIMARY_SIDE:
             print("Primary side is active")
             return BMC_CONST.PRIMARY_SIDE
-        elif(BMC_CONST.GOLDEN_SIDE in rc):
+        elif rc == BMC_CONST.GOLDEN_SIDE:
             print ("Golden side is active")
             return BMC_CONST.GOLDEN_SIDE
         else:
@@ -0,0 +1,844 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestIPMILan.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestIPMILan
+#  Native IPMI over LAN (RMCP+) session engine
+#
+#  This class keeps one authenticated IPMI v2.0 / RMCP+ session open to a BMC
+#  and sends IPMI requests to it as UDP packets, instead of spawning a new
+#  'ipmitool -I lanplus' process (and RAKP handshake) for every command.
+#  Cipher suite 3 (RAKP-HMAC-SHA1, HMAC-SHA1-96, AES-CBC-128) needs pycrypto,
+#  cipher suite 1 (no confidentiality) works with the standard library only.
+
+import os
+import math
+import time
+import struct
+import socket
+import select
+import hmac
+import hashlib
+import threading
+
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+# Open sessions, one per (bmc ip, ipmi user)
+_sessions = {}
+_sessionsLock = threading.Lock()
+
+class OpTestIPMILan():
+
+    RMCP_HEADER = '\x06\x00\xff\x07'
+
+    # RMCP+ payload types
+    PAYLOAD_IPMI = 0x00
+    PAYLOAD_OPEN_SESSION_REQ = 0x10
+    PAYLOAD_OPEN_SESSION_RSP = 0x11
+    PAYLOAD_RAKP1 = 0x12
+    PAYLOAD_RAKP2 = 0x13
+    PAYLOAD_RAKP3 = 0x14
+    PAYLOAD_RAKP4 = 0x15
+
+    # Network functions
+    NETFN_CHASSIS = 0x00
+    NETFN_SENSOR = 0x04
+    NETFN_APP = 0x06
+    NETFN_STORAGE = 0x0a
+
+    # cipher suite id: (authentication, integrity, confidentiality) algorithms
+    CIPHER_SUITES = {
+        1: (1, 1, 0),
+        3: (1, 1, 1),
+    }
+
+    PRIV_ADMIN = 0x04
+    # Role used in RAKP1: administrator with name-only user lookup
+    ROLE_ADMIN_NAME_ONLY = 0x14
+
+    CHASSIS_CONTROL = {
+        'off': (0x00, 'Down/Off'),
+        'on': (0x01, 'Up/On'),
+        'cycle': (0x02, 'Cycle'),
+        'reset': (0x03, 'Reset'),
+        'soft': (0x05, 'Soft'),
+    }
+
+    COMPLETION_CODES = {
+        0xc0: 'Node busy',
+        0xc1: 'Invalid command',
+        0xc3: 'Timeout',
+        0xc7: 'Request data length invalid',
+        0xc9: 'Parameter out of range',
+        0xcc: 'Invalid data field in request',
+        0xd4: 'Insufficient privilege level',
+        0xd5: 'Command not supported in present state',
+        0xff: 'Unspecified error',
+    }
+
+    ##
+    # @brief Initialize this object. No packet is sent until the first request,
+    #        use get_session() to share one session per BMC.
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: IPMI userid
+    # @param i_bmcPwd @type string: IPMI password
+    # @param i_cipherSuite @type int: RMCP+ cipher suite id (1 or 3)
+    # @param i_port @type int: RMCP port of the BMC
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd,
+                 i_cipherSuite=BMC_CONST.IPMI_LAN_CIPHER_SUITE,
+                 i_port=BMC_CONST.IPMI_LAN_PORT):
+
+        if i_cipherSuite not in self.CIPHER_SUITES:
+            raise OpTestError("Unsupported cipher suite %s" % i_cipherSuite)
+        self.cv_bmcIP = i_bmcIP
+        self.cv_bmcUser = i_bmcUser or ''
+        self.cv_bmcPwd = i_bmcPwd or ''
+        self.cv_port = i_port
+        self.cv_cipherSuite = i_cipherSuite
+        self.cv_lock = threading.RLock()
+        self.cv_sock = None
+        self.cv_active = False
+        self.cv_sessionId = 0
+        self.cv_consoleId = 0
+        self.cv_seq = 0
+        self.cv_rqSeq = 0
+        self.cv_k1 = None
+        self.cv_aesKey = None
+        self.cv_lastActivity = 0
+        self.cv_keepaliveStop = threading.Event()
+        self.cv_keepalive = None
+
+    ##
+    # @brief Returns the shared session object for a BMC, creating it if needed
+    #
+    # @return OpTestIPMILan object
+    #
+    @classmethod
+    def get_session(cls, i_bmcIP, i_bmcUser, i_bmcPwd,
+                    i_cipherSuite=BMC_CONST.IPMI_LAN_CIPHER_SUITE):
+        l_key = (i_bmcIP, i_bmcUser)
+        with _sessionsLock:
+            if l_key not in _sessions:
+                _sessions[l_key] = cls(i_bmcIP, i_bmcUser, i_bmcPwd,
+                                       i_cipherSuite)
+            return _sessions[l_key]
+
+    ############################################################################
+    # Packet helpers
+    ############################################################################
+
+    def _checksum(self, i_data):
+        return (-sum(bytearray(i_data))) & 0xff
+
+    def _hmac(self, i_key, i_msg):
+        return hmac.new(i_key, i_msg, hashlib.sha1).digest()
+
+    ##
+    # @brief Builds an IPMI request message (LAN format)
+    #
+    def _ipmi_msg(self, i_netfn, i_cmd, i_data):
+        self.cv_rqSeq = (self.cv_rqSeq + 1) & 0x3f
+        l_hdr = bytearray([BMC_CONST.IPMI_BMC_SLAVE_ADDR, (i_netfn << 2) & 0xff])
+        l_body = bytearray([BMC_CONST.IPMI_REMOTE_SWID, self.cv_rqSeq << 2,
+                            i_cmd]) + bytearray(i_data)
+        return str(l_hdr + bytearray([self._checksum(l_hdr)]) +
+                   l_body + bytearray([self._checksum(l_body)]))
+
+    def _encrypt(self, i_payload):
+        l_pad = (16 - (len(i_payload) + 1) % 16) % 16
+        l_plain = i_payload + ''.join(chr(i) for i in range(1, l_pad + 1)) \
+                  + chr(l_pad)
+        l_iv = os.urandom(16)
+        return l_iv + AES.new(self.cv_aesKey, AES.MODE_CBC, l_iv).encrypt(l_plain)
+
+    def _decrypt(self, i_payload):
+        l_plain = AES.new(self.cv_aesKey, AES.MODE_CBC,
+                          i_payload[:16]).decrypt(i_payload[16:])
+        l_pad = ord(l_plain[-1])
+        return l_plain[:-(l_pad + 1)]
+
+    ##
+    # @brief Wraps a payload in an RMCP + IPMI v2.0 session header. Once the
+    #        session is active the packet is encrypted (if the cipher suite
+    #        has confidentiality) and signed with HMAC-SHA1-96.
+    #
+    def _v2_packet(self, i_payloadType, i_payload):
+        l_type = i_payloadType
+        if self.cv_active:
+            l_type |= 0x40
+            if self.cv_aesKey is not None:
+                l_type |= 0x80
+                i_payload = self._encrypt(i_payload)
+            self.cv_seq = (self.cv_seq + 1) & 0xffffffff or 1
+            l_sid, l_seq = self.cv_sessionId, self.cv_seq
+        else:
+            l_sid, l_seq = 0, 0
+        l_sess = chr(0x06) + chr(l_type) + \
+                 struct.pack('<IIH', l_sid, l_seq, len(i_payload)) + i_payload
+        if self.cv_active:
+            l_pad = (4 - (len(l_sess) + 2) % 4) % 4
+            l_sess += '\xff' * l_pad + chr(l_pad) + '\x07'
+            l_sess += self._hmac(self.cv_k1, l_sess)[:12]
+        return self.RMCP_HEADER + l_sess
+
+    ##
+    # @brief Builds a session-less IPMI v1.5 packet (used before a session
+    #        exists, e.g. Get Channel Authentication Capabilities)
+    #
+    def _v15_packet(self, i_msg):
+        return self.RMCP_HEADER + '\x00' + struct.pack('<IIB', 0, 0, len(i_msg)) \
+               + i_msg
+
+    ##
+    # @brief Decodes a received packet
+    #
+    # @return tuple (payload type, payload) or None if the packet is not ours
+    #
+    def _parse_packet(self, i_pkt):
+        if len(i_pkt) < 14 or i_pkt[:4] != self.RMCP_HEADER:
+            return None
+        l_auth = ord(i_pkt[4])
+        if l_auth == 0x00:
+            l_len = ord(i_pkt[13])
+            return (self.PAYLOAD_IPMI, i_pkt[14:14 + l_len])
+        if l_auth != 0x06 or len(i_pkt) < 16:
+            return None
+        l_type = ord(i_pkt[5])
+        l_sid, l_seq, l_len = struct.unpack('<IIH', i_pkt[6:16])
+        l_payload = i_pkt[16:16 + l_len]
+        if l_type & 0x40:
+            if self.cv_k1 is None or l_sid != self.cv_consoleId:
+                return None
+            if self._hmac(self.cv_k1, i_pkt[4:-12])[:12] != i_pkt[-12:]:
+                print "IPMI LAN: dropping packet with bad integrity data"
+                return None
+        if l_type & 0x80:
+            if self.cv_aesKey is None:
+                return None
+            l_payload = self._decrypt(l_payload)
+        return (l_type & 0x3f, l_payload)
+
+    ##
+    # @brief Sends a packet and waits for a reply accepted by i_match. The
+    #        packet is rebuilt by i_build on every retry so that session
+    #        sequence numbers keep increasing.
+    #
+    # @return the payload accepted by i_match or raise OpTestError
+    #
+    def _exchange(self, i_build, i_match, i_retries=BMC_CONST.IPMI_LAN_RETRIES):
+        if self.cv_sock is None:
+            self.cv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.cv_sock.connect((self.cv_bmcIP, self.cv_port))
+
+        for l_try in range(i_retries):
+            try:
+                self.cv_sock.send(i_build())
+            except socket.error as e:
+                raise OpTestError("IPMI LAN send to %s failed: %s"
+                                  % (self.cv_bmcIP, e))
+            l_end = time.time() + BMC_CONST.IPMI_LAN_TIMEOUT
+            while True:
+                l_left = l_end - time.time()
+                if l_left <= 0:
+                    break
+                l_ready = select.select([self.cv_sock], [], [], l_left)[0]
+                if not l_ready:
+                    break
+                try:
+                    l_pkt = self.cv_sock.recv(1024)
+                except socket.error:
+                    break
+                l_parsed = self._parse_packet(l_pkt)
+                if l_parsed is None:
+                    continue
+                l_rsp = i_match(*l_parsed)
+                if l_rsp is not None:
+                    self.cv_lastActivity = time.time()
+                    return l_rsp
+
+        raise OpTestError("No response from BMC %s over IPMI LAN"
+                          % self.cv_bmcIP)
+
+    ##
+    # @brief Returns a matcher for the IPMI response to the last built request
+    #
+    def _ipmi_match(self, i_netfn, i_cmd):
+        def match(i_type, i_payload):
+            if i_type != self.PAYLOAD_IPMI or len(i_payload) < 8:
+                return None
+            l_msg = bytearray(i_payload)
+            if (l_msg[1] >> 2) != (i_netfn | 1) or l_msg[5] != i_cmd or \
+               (l_msg[4] >> 2) != self.cv_rqSeq:
+                return None
+            return (l_msg[6], l_msg[7:-1])
+        return match
+
+    def _payload_match(self, i_expected):
+        def match(i_type, i_payload):
+            if i_type != i_expected:
+                return None
+            return bytearray(i_payload)
+        return match
+
+    ############################################################################
+    # Session management
+    ############################################################################
+
+    ##
+    # @brief Sends the session-less Get Channel Authentication Capabilities
+    #        request, asking for v2.0 data. This works before any session is
+    #        set up, so it also tells whether the BMC IPMI stack is up.
+    #
+    # @param i_retries @type int: number of times the request is sent
+    #
+    # @return tuple (completion code, response data bytearray)
+    #         or raise OpTestError if the BMC did not answer
+    #
+    def get_channel_auth_caps(self, i_retries=BMC_CONST.IPMI_LAN_RETRIES):
+        l_msg = self._ipmi_msg(self.NETFN_APP, 0x38, [0x8e, self.PRIV_ADMIN])
+        return self._exchange(lambda: self._v15_packet(l_msg),
+                              self._ipmi_match(self.NETFN_APP, 0x38), i_retries)
+
+    ##
+    # @brief Establishes the RMCP+ session: open session request, RAKP 1-4 and
+    #        set session privilege level
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def _open_session(self):
+
+        self.close()
+        l_auth, l_integ, l_conf = self.CIPHER_SUITES[self.cv_cipherSuite]
+        if l_conf and AES is None:
+            raise OpTestError("Cipher suite %d needs pycrypto (Crypto.Cipher.AES)"
+                              % self.cv_cipherSuite)
+
+        l_cc, l_data = self.get_channel_auth_caps()
+        if l_cc != 0 or len(l_data) < 2 or not (l_data[1] & 0x80):
+            raise OpTestError("BMC %s does not support IPMI v2.0 / RMCP+"
+                              % self.cv_bmcIP)
+
+        # Open Session Request
+        self.cv_consoleId = struct.unpack('<I', os.urandom(4))[0] or 1
+        l_req = '\x00\x00\x00\x00' + struct.pack('<I', self.cv_consoleId)
+        for l_type, l_alg in enumerate((l_auth, l_integ, l_conf)):
+            l_req += struct.pack('<BHBB3x', l_type, 0, 8, l_alg)
+        l_rsp = self._exchange(
+            lambda: self._v2_packet(self.PAYLOAD_OPEN_SESSION_REQ, l_req),
+            self._payload_match(self.PAYLOAD_OPEN_SESSION_RSP))
+        if len(l_rsp) < 12 or l_rsp[1] != 0:
+            raise OpTestError("Open session to %s rejected, status 0x%02x"
+                              % (self.cv_bmcIP, l_rsp[1] if l_rsp else 0xff))
+        l_sessionId = struct.unpack('<I', str(l_rsp[8:12]))[0]
+
+        # RAKP 1 / 2
+        l_user = self.cv_bmcUser
+        l_role = self.ROLE_ADMIN_NAME_ONLY
+        l_userInfo = chr(l_role) + chr(len(l_user)) + l_user
+        l_rm = os.urandom(16)
+        l_req = '\x00\x00\x00\x00' + struct.pack('<I', l_sessionId) + l_rm + \
+                chr(l_role) + '\x00\x00' + chr(len(l_user)) + l_user
+        l_rsp = self._exchange(lambda: self._v2_packet(self.PAYLOAD_RAKP1, l_req),
+                               self._payload_match(self.PAYLOAD_RAKP2))
+        if len(l_rsp) < 60 or l_rsp[1] != 0:
+            raise OpTestError("RAKP 2 from %s failed, status 0x%02x"
+                              % (self.cv_bmcIP, l_rsp[1] if l_rsp else 0xff))
+        l_rc = str(l_rsp[8:24])
+        l_guid = str(l_rsp[24:40])
+        l_kuid = self.cv_bmcPwd[:20].ljust(20, '\x00')
+        l_sids = struct.pack('<II', self.cv_consoleId, l_sessionId)
+        l_expect = self._hmac(l_kuid, l_sids + l_rm + l_rc + l_guid + l_userInfo)
+        if str(l_rsp[40:60]) != l_expect:
+            raise OpTestError("RAKP 2 authentication code mismatch from %s, "
+                              "check the IPMI user/password" % self.cv_bmcIP)
+        l_sik = self._hmac(l_kuid, l_rm + l_rc + l_userInfo)
+
+        # RAKP 3 / 4
+        l_req = '\x00\x00\x00\x00' + struct.pack('<I', l_sessionId) + \
+                self._hmac(l_kuid, l_rc + struct.pack('<I', self.cv_consoleId)
+                           + l_userInfo)
+        l_rsp = self._exchange(lambda: self._v2_packet(self.PAYLOAD_RAKP3, l_req),
+                               self._payload_match(self.PAYLOAD_RAKP4))
+        if len(l_rsp) < 20 or l_rsp[1] != 0:
+            raise OpTestError("RAKP 4 from %s failed, status 0x%02x"
+                              % (self.cv_bmcIP, l_rsp[1] if l_rsp else 0xff))
+        l_icv = self._hmac(l_sik, l_rm + struct.pack('<I', l_sessionId) + l_guid)
+        if str(l_rsp[8:20]) != l_icv[:12]:
+            raise OpTestError("RAKP 4 integrity check mismatch from %s"
+                              % self.cv_bmcIP)
+
+        self.cv_sessionId = l_sessionId
+        self.cv_k1 = self._hmac(l_sik, '\x01' * 20)
+        if l_conf:
+            self.cv_aesKey = self._hmac(l_sik, '\x02' * 20)[:16]
+        self.cv_seq = 0
+        self.cv_active = True
+
+        l_cc, l_data = self._request(self.NETFN_APP, 0x3b, [self.PRIV_ADMIN])
+        if l_cc != 0:
+            self.close()
+            raise OpTestError("Set session privilege level failed on %s, "
+                              "completion code 0x%02x" % (self.cv_bmcIP, l_cc))
+
+        print "IPMI LAN session 0x%08x open to %s" % (self.cv_sessionId,
+                                                      self.cv_bmcIP)
+        self._keepalive_start()
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Closes the session (if any) and the socket
+    #
+    # @param i_graceful @type bool: send Close Session to the BMC first
+    #
+    def close(self, i_graceful=True):
+        with self.cv_lock:
+            if self.cv_active and i_graceful:
+                try:
+                    self._request(self.NETFN_APP, 0x3c,
+                                  list(bytearray(struct.pack('<I',
+                                                 self.cv_sessionId))),
+                                  i_retries=1)
+                except OpTestError:
+                    pass
+            self.cv_active = False
+            self.cv_keepaliveStop.set()
+            self.cv_k1 = None
+            self.cv_aesKey = None
+            if self.cv_sock is not None:
+                self.cv_sock.close()
+                self.cv_sock = None
+
+    def _keepalive_start(self):
+        if self.cv_keepalive is not None and self.cv_keepalive.is_alive() \
+           and not self.cv_keepaliveStop.is_set():
+            return
+        # a thread still stopping keeps its own stop event and exits on its
+        # own, the new session gets a new thread
+        self.cv_keepaliveStop = threading.Event()
+        self.cv_keepalive = threading.Thread(target=self._keepalive_loop,
+                                             args=(self.cv_keepaliveStop,))
+        self.cv_keepalive.daemon = True
+        self.cv_keepalive.start()
+
+    ##
+    # @brief Sends Get Device ID when the session has been idle long enough for
+    #        the BMC to consider timing it out
+    #
+    # @param i_stop @type threading.Event: set when the session is closed
+    #
+    def _keepalive_loop(self, i_stop):
+        while not i_stop.wait(1) and self.cv_active:
+            if time.time() - self.cv_lastActivity < BMC_CONST.IPMI_LAN_KEEPALIVE:
+                continue
+            try:
+                with self.cv_lock:
+                    if self.cv_active:
+                        self._request(self.NETFN_APP, 0x01, [])
+            except OpTestError:
+                self.close(i_graceful=False)
+
+    def _request(self, i_netfn, i_cmd, i_data, i_retries=BMC_CONST.IPMI_LAN_RETRIES):
+        def build():
+            return self._v2_packet(self.PAYLOAD_IPMI,
+                                   self._ipmi_msg(i_netfn, i_cmd, i_data))
+        return self._exchange(build, self._ipmi_match(i_netfn, i_cmd), i_retries)
+
+    ############################################################################
+    # Requests
+    ############################################################################
+
+    ##
+    # @brief Sends one IPMI request in the session, opening (or re-opening, if
+    #        the BMC dropped it) the session as needed
+    #
+    # @param i_netfn @type int: network function
+    # @param i_cmd @type int: command
+    # @param i_data @type list: request data bytes
+    # @param i_retry @type bool: re-open the session and retry once on failure
+    #
+    # @return tuple (completion code, bytearray of response data)
+    #         or raise OpTestError
+    #
+    def raw(self, i_netfn, i_cmd, i_data=[], i_retry=True):
+        with self.cv_lock:
+            if not self.cv_active:
+                self._open_session()
+            try:
+                return self._request(i_netfn, i_cmd, i_data)
+            except OpTestError:
+                self.close(i_graceful=False)
+                if not i_retry:
+                    raise
+            self._open_session()
+            return self._request(i_netfn, i_cmd, i_data)
+
+    ##
+    # @brief Get Device ID
+    #
+    # @return dict of the device id fields or raise OpTestError
+    #
+    def get_device_id(self):
+        l_cc, l_data = self.raw(self.NETFN_APP, 0x01)
+        if l_cc != 0 or len(l_data) < 11:
+            raise OpTestError("Get Device ID failed, completion code 0x%02x"
+                              % l_cc)
+        return {'device_id': l_data[0],
+                'device_rev': l_data[1] & 0x0f,
+                'fw_major': l_data[2] & 0x7f,
+                'fw_minor': l_data[3],
+                'ipmi_version': '%d.%d' % (l_data[4] & 0x0f, l_data[4] >> 4),
+                'manufacturer_id': l_data[6] | (l_data[7] << 8) |
+                                   ((l_data[8] & 0x0f) << 16),
+                'product_id': l_data[9] | (l_data[10] << 8),
+                'aux': list(l_data[11:15])}
+
+    ##
+    # @brief Get Sensor Reading for one sensor number
+    #
+    # @return tuple (reading, flags, state bytes) or raise OpTestError
+    #
+    def get_sensor_reading(self, i_sensorNum):
+        l_cc, l_data = self.raw(self.NETFN_SENSOR, 0x2d, [i_sensorNum])
+        if l_cc != 0 or len(l_data) < 2:
+            raise OpTestError("Get Sensor Reading 0x%02x failed, completion "
+                              "code 0x%02x" % (i_sensorNum, l_cc))
+        return (l_data[0], l_data[1], list(l_data[2:4]))
+
+    def _reserve(self, i_cmd):
+        l_cc, l_data = self.raw(self.NETFN_STORAGE, i_cmd)
+        if l_cc != 0 or len(l_data) < 2:
+            raise OpTestError("Reservation (cmd 0x%02x) failed, completion "
+                              "code 0x%02x" % (i_cmd, l_cc))
+        return [l_data[0], l_data[1]]
+
+    ##
+    # @brief Reads all records of the SDR repository
+    #
+    # @return list of tuples (record id, bytearray record) or raise OpTestError
+    #
+    def get_sdr_records(self):
+        l_records = []
+        l_resv = self._reserve(0x22)
+        l_id = 0
+        while l_id != 0xffff:
+            l_rec = bytearray()
+            l_next = None
+            l_len = 5
+            while len(l_rec) < l_len:
+                l_count = min(BMC_CONST.IPMI_LAN_SDR_CHUNK, l_len - len(l_rec))
+                l_cc, l_data = self.raw(self.NETFN_STORAGE, 0x23,
+                                        l_resv + [l_id & 0xff, l_id >> 8,
+                                                  len(l_rec), l_count])
+                if l_cc == 0xc5:
+                    # reservation lost, start the record again
+                    l_resv = self._reserve(0x22)
+                    l_rec = bytearray()
+                    l_len = 5
+                    continue
+                if l_cc != 0 or len(l_data) < 2:
+                    raise OpTestError("Get SDR 0x%04x failed, completion code "
+                                      "0x%02x" % (l_id, l_cc))
+                l_next = l_data[0] | (l_data[1] << 8)
+                l_rec += l_data[2:]
+                if len(l_rec) >= 5:
+                    l_len = 5 + l_rec[4]
+            l_records.append((l_rec[0] | (l_rec[1] << 8), l_rec))
+            l_id = l_next
+        return l_records
+
+    ##
+    # @brief Maps sensor names to sensor numbers using the full (type 1) and
+    #        compact (type 2) SDR records
+    #
+    # @return dict {sensor name: sensor number}
+    #
+    def get_sensor_numbers(self, i_records=None):
+        return self.sensor_numbers(i_records or self.get_sdr_records())
+
+    ##
+    # @brief Maps sensor names to sensor numbers using the full (type 1) and
+    #        compact (type 2) SDR records. Sensors owned by another controller
+    #        than the BMC are left out, a Get Sensor Reading sent to the BMC
+    #        can not read them.
+    #
+    # @param i_records @type list: (record id, bytearray record) tuples
+    #
+    # @return dict {sensor name: sensor number}
+    #
+    @classmethod
+    def sensor_numbers(cls, i_records):
+        l_map = {}
+        for l_id, l_rec in i_records:
+            if len(l_rec) < 8 or l_rec[5] != BMC_CONST.IPMI_BMC_SLAVE_ADDR:
+                continue
+            if l_rec[3] == 0x01 and len(l_rec) > 48:
+                l_name = l_rec[48:48 + (l_rec[47] & 0x1f)]
+            elif l_rec[3] == 0x02 and len(l_rec) > 32:
+                l_name = l_rec[32:32 + (l_rec[31] & 0x1f)]
+            else:
+                continue
+            l_map[str(l_name).rstrip('\x00')] = l_rec[7]
+        return l_map
+
+    # y = f((M * x + B * 10^Bexp) * 10^Rexp), f by the linearization byte
+    LINEARIZATION = [
+        lambda x: x,
+        math.log,
+        math.log10,
+        lambda x: math.log(x, 2),
+        math.exp,
+        lambda x: 10 ** x,
+        lambda x: 2 ** x,
+        lambda x: 1 / x,
+        lambda x: x * x,
+        lambda x: x ** 3,
+        math.sqrt,
+        lambda x: math.copysign(abs(x) ** (1.0 / 3), x),
+    ]
+
+    ##
+    # @brief Reads from the full (type 1) SDR records how to convert the
+    #        readings of the analog sensors owned by the BMC
+    #
+    # @param i_records @type list: (record id, bytearray record) tuples
+    #
+    # @return dict {sensor name: (sensor number, factors)}, factors being
+    #         (M, B, B exponent, R exponent, analog data format, linearization)
+    #         or None for a sensor without an analog reading
+    #
+    @classmethod
+    def sensor_factors(cls, i_records):
+        l_map = {}
+        for l_id, l_rec in i_records:
+            if len(l_rec) < 8 or l_rec[5] != BMC_CONST.IPMI_BMC_SLAVE_ADDR:
+                continue
+            if l_rec[3] == 0x01 and len(l_rec) > 48:
+                l_name = l_rec[48:48 + (l_rec[47] & 0x1f)]
+                l_format = l_rec[20] >> 6
+                l_linear = l_rec[23] & 0x7f
+                if l_format == 3 or l_linear >= len(cls.LINEARIZATION):
+                    l_factors = None
+                else:
+                    # M and B are 10 bit, the top 2 bits in the next byte
+                    l_m = l_rec[24] | (l_rec[25] & 0xc0) << 2
+                    l_b = l_rec[26] | (l_rec[27] & 0xc0) << 2
+                    l_factors = (cls._signed(l_m, 10), cls._signed(l_b, 10),
+                                 cls._signed(l_rec[29] & 0x0f, 4),
+                                 cls._signed(l_rec[29] >> 4, 4),
+                                 l_format, l_linear)
+            elif l_rec[3] == 0x02 and len(l_rec) > 32:
+                l_name = l_rec[32:32 + (l_rec[31] & 0x1f)]
+                l_factors = None
+            else:
+                continue
+            l_map[str(l_name).rstrip('\x00')] = (l_rec[7], l_factors)
+        return l_map
+
+    @classmethod
+    def _signed(cls, i_value, i_bits):
+        if i_value & (1 << (i_bits - 1)):
+            return i_value - (1 << i_bits)
+        return i_value
+
+    ##
+    # @brief Converts the raw reading of a sensor the way ipmitool does
+    #
+    # @param i_factors: factors of the sensor, see sensor_factors
+    # @param i_raw @type int: first byte of the Get Sensor Reading response
+    #
+    # @return float, or the raw reading (int) of a sensor without factors
+    #
+    @classmethod
+    def sensor_value(cls, i_factors, i_raw):
+        if i_factors is None:
+            return i_raw
+        l_m, l_b, l_bExp, l_rExp, l_format, l_linear = i_factors
+        if l_format == 1:
+            l_raw = cls._signed(i_raw, 8)
+            if l_raw < 0:
+                l_raw += 1
+        elif l_format == 2:
+            l_raw = cls._signed(i_raw, 8)
+        else:
+            l_raw = i_raw
+        l_value = (l_m * l_raw + l_b * 10.0 ** l_bExp) * 10.0 ** l_rExp
+        try:
+            return cls.LINEARIZATION[l_linear](l_value)
+        except (ValueError, ZeroDivisionError):
+            return None
+
+    ##
+    # @brief Splits an SDR repository dump, as written by 'ipmitool sdr dump'
+    #        (the records one after the other, header included), into records
+    #
+    # @return list of tuples (record id, bytearray record)
+    #
+    @classmethod
+    def sdr_records_split(cls, i_data):
+        l_data = bytearray(i_data)
+        l_records = []
+        l_pos = 0
+        while l_pos + 5 <= len(l_data):
+            l_end = l_pos + 5 + l_data[l_pos + 4]
+            l_rec = l_data[l_pos:l_end]
+            l_records.append((l_rec[0] | (l_rec[1] << 8), l_rec))
+            l_pos = l_end
+        return l_records
+
+    ##
+    # @brief Reads the SEL entries, starting after i_afterId if given
+    #
+    # @return list of tuples (record id, bytearray 16 byte record)
+    #         or raise OpTestError
+    #
+    def get_sel_entries(self, i_afterId=None):
+        l_entries = []
+        l_id = 0
+        if i_afterId is not None:
+            l_cc, l_data = self.raw(self.NETFN_STORAGE, 0x43,
+                                    [0, 0, i_afterId & 0xff, i_afterId >> 8,
+                                     0, 0xff])
+            if l_cc != 0:
+                return self.get_sel_entries()
+            l_id = l_data[0] | (l_data[1] << 8)
+        while l_id != 0xffff:
+            l_cc, l_data = self.raw(self.NETFN_STORAGE, 0x43,
+                                    [0, 0, l_id & 0xff, l_id >> 8, 0, 0xff])
+            if l_cc == 0xcb:
+                break
+            if l_cc != 0 or len(l_data) < 18:
+                raise OpTestError("Get SEL Entry 0x%04x failed, completion "
+                                  "code 0x%02x" % (l_id, l_cc))
+            l_entries.append((l_data[2] | (l_data[3] << 8), l_data[2:18]))
+            l_id = l_data[0] | (l_data[1] << 8)
+        return l_entries
+
+    ############################################################################
+    # ipmitool command emulation
+    ############################################################################
+
+    def _raw_text(self, i_netfn, i_cmd, i_cc, i_data):
+        if i_cc != 0:
+            return ("Unable to send RAW command (channel=0x0 netfn=0x%x lun=0x0 "
+                    "cmd=0x%x rsp=0x%x): %s\n"
+                    % (i_netfn, i_cmd, i_cc,
+                       self.COMPLETION_CODES.get(i_cc, 'Unknown (0x%02x)' % i_cc)))
+        l_out = ''
+        for l_index, l_byte in enumerate(i_data):
+            if l_index and l_index % 16 == 0:
+                l_out += '\n'
+            l_out += ' %02x' % l_byte
+        return l_out + '\n'
+
+    ##
+    # @brief Runs an ipmitool command line (the arguments after the interface
+    #        options, e.g. 'chassis power on' or 'raw 6 0x52 0x05') in the
+    #        session and formats the result the way ipmitool prints it.
+    #
+    # @param i_args @type string: ipmitool command arguments
+    #
+    # @return the ipmitool style output, None if the command is not handled
+    #         natively, or raise OpTestError if the session fails
+    #
+    def run_command(self, i_args):
+
+        l_argv = i_args.split()
+        if not l_argv:
+            return None
+
+        if l_argv[0] == 'raw' and len(l_argv) >= 3:
+            try:
+                l_bytes = [int(x, 0) & 0xff for x in l_argv[1:]]
+            except ValueError:
+                return None
+            l_cc, l_data = self.raw(l_bytes[0], l_bytes[1], l_bytes[2:])
+            return self._raw_text(l_bytes[0], l_bytes[1], l_cc, l_data)
+
+        if l_argv[:2] == ['chassis', 'power'] and len(l_argv) == 3:
+            if l_argv[2] == 'status':
+                l_cc, l_data = self.raw(self.NETFN_CHASSIS, 0x01)
+                if l_cc != 0 or not l_data:
+                    return None
+                return "Chassis Power is %s\n" % ('on' if l_data[0] & 0x01
+                                                   else 'off')
+            if l_argv[2] in self.CHASSIS_CONTROL:
+                l_ctl, l_text = self.CHASSIS_CONTROL[l_argv[2]]
+                l_cc, l_data = self.raw(self.NETFN_CHASSIS, 0x02, [l_ctl])
+                if l_cc != 0:
+                    return "Set Chassis Power Control to %s failed: %s\n" % (
+                        l_text, self.COMPLETION_CODES.get(l_cc, hex(l_cc)))
+                return "Chassis Power Control: %s\n" % l_text
+            return None
+
+        if l_argv[:2] == ['mc', 'reset'] and len(l_argv) == 3 and \
+           l_argv[2] in ('cold', 'warm'):
+            l_cmd = 0x02 if l_argv[2] == 'cold' else 0x03
+            with self.cv_lock:
+                try:
+                    l_cc, l_data = self.raw(self.NETFN_APP, l_cmd, i_retry=False)
+                except OpTestError:
+                    # the BMC may reset before it answers
+                    l_cc = 0
+                self.close(i_graceful=False)
+            if l_cc != 0:
+                return "MC reset command failed: %s\n" % \
+                       self.COMPLETION_CODES.get(l_cc, hex(l_cc))
+            return "Sent %s reset command to MC\n" % l_argv[2]
+
+        if l_argv[:2] == ['mc', 'info'] and len(l_argv) == 2:
+            l_id = self.get_device_id()
+            l_out = ("Device ID                 : %d\n"
+                     "Device Revision           : %d\n"
+                     "Firmware Revision         : %d.%02x\n"
+                     "IPMI Version              : %s\n"
+                     "Manufacturer ID           : %d\n"
+                     "Product ID                : %d (0x%04x)\n"
+                     % (l_id['device_id'], l_id['device_rev'], l_id['fw_major'],
+                        l_id['fw_minor'], l_id['ipmi_version'],
+                        l_id['manufacturer_id'], l_id['product_id'],
+                        l_id['product_id']))
+            if l_id['aux']:
+                l_out += "Aux Firmware Rev Info     : \n"
+                l_out += ''.join("    0x%02x\n" % x for x in l_id['aux'])
+            return l_out
+
+        if l_argv[:2] == ['sel', 'clear'] and len(l_argv) == 2:
+            l_resv = self._reserve(0x42)
+            l_cc, l_data = self.raw(self.NETFN_STORAGE, 0x47,
+                                    l_resv + [0x43, 0x4c, 0x52, 0xaa])
+            if l_cc != 0:
+                return "Unable to clear SEL: %s\n" % \
+                       self.COMPLETION_CODES.get(l_cc, hex(l_cc))
+            return "Clearing SEL.  Please allow a few seconds to erase.\n"
+
+        return None
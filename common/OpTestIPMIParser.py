@@ -0,0 +1,444 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestIPMIParser.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestIPMIParser
+#  Typed ipmitool output parsing
+#
+#  OpTestIPMIParser turns the text ipmitool prints into records: chassis power
+#  and status, sdr and sensor lists, SEL entries and info, mc info, fru print
+#  and hpm check. The callers test fields of these records instead of looking
+#  for strings in the output. The patterns are compiled once. The table
+#  outputs (sdr, sensor, sel) are split on '|' instead: on entries of a
+#  thousand lines that is several times faster than any regular expression
+#  with a group per column. ci/source/bench_ipmi_parser.py times the parsers.
+
+import re
+import collections
+
+## 'chassis status'
+#  power_on: bool, restore_policy: e.g. 'always-off', last_event: e.g.
+#  'command', fields: dict of all the 'key : value' lines
+OpTestChassisStatus = collections.namedtuple('OpTestChassisStatus', [
+    'power_on', 'power_overload', 'power_interlock', 'power_fault',
+    'power_control_fault', 'restore_policy', 'last_event', 'intrusion',
+    'fields'])
+
+## One 'sdr list' or 'sdr elist' line
+#  number: sensor number (int, elist only, else None), status: e.g. 'ok' or
+#  'ns', entity: e.g. '7.0' (elist only, else ''), reading: the reading text,
+#  value: the reading as a float when it is a number, else None, units: the
+#  units after the number, e.g. 'degrees C'
+OpTestSDRRecord = collections.namedtuple('OpTestSDRRecord', [
+    'name', 'number', 'status', 'entity', 'reading', 'value', 'units'])
+
+## One 'sensor list' line
+#  value: float, the state bits (int) of a discrete sensor, or None,
+#  reading: the value text, units: e.g. 'Volts' or 'discrete', status: e.g.
+#  'ok', or the state bits text (e.g. '0x0080') of a discrete sensor,
+#  thresholds: tuple (lnr, lcr, lnc, unc, ucr, unr) of float or None
+OpTestSensorRecord = collections.namedtuple('OpTestSensorRecord', [
+    'name', 'value', 'reading', 'units', 'status', 'thresholds'])
+
+## One SEL entry, see OpTestSEL
+#  id: record ID (int), date and time: as printed by ipmitool, sensor: sensor
+#  type and name or number, sensor_num: sensor number or None, event: event
+#  description, direction: 'Asserted', 'Deasserted' or '', extra: any further
+#  fields (e.g. threshold readings), line: the elist line
+OpTestSELRecord = collections.namedtuple('OpTestSELRecord', [
+    'id', 'date', 'time', 'sensor', 'sensor_num', 'event', 'direction',
+    'extra', 'line'])
+
+## 'mc info'
+#  firmware_rev: e.g. '2.16', aux: list of the Aux Firmware Rev Info bytes,
+#  fields: dict of all the 'key : value' lines
+OpTestMCInfo = collections.namedtuple('OpTestMCInfo', [
+    'device_id', 'device_rev', 'firmware_rev', 'ipmi_version',
+    'manufacturer_id', 'product_id', 'aux', 'fields'])
+
+## One 'fru print' device
+#  id: FRU ID (int), description: e.g. 'Builtin FRU Device', fields: dict of
+#  its 'key : value' lines, e.g. 'Board Serial'
+OpTestFRURecord = collections.namedtuple('OpTestFRURecord', [
+    'id', 'description', 'fields'])
+
+## One 'hpm check' component
+#  active, backup, deferred: version strings, '' when there is none,
+#  cold_reset: True when the component needs a payload cold reset
+OpTestHPMComponent = collections.namedtuple('OpTestHPMComponent', [
+    'id', 'name', 'active', 'backup', 'deferred', 'cold_reset'])
+
+
+class OpTestIPMIParser():
+
+    POWER_CONTROL = re.compile(r'^Chassis Power Control: (.+?)\s*$', re.M)
+    POWER_STATUS = re.compile(r'^Chassis Power is (on|off)\s*$', re.M)
+    KEY_VALUE = re.compile(r'^(\S[^:\n]*?)\s*:[ \t]*(.*?)\s*$', re.M)
+    # first characters of a reading that may be a number
+    NUMBER_START = '-0123456789'
+
+    # '  2a | 04/21/2015 | 10:00:05 | Processor #0x01 | Transition to ... |
+    #  Asserted', entries logged before the BMC clock was set have 'Pre-Init'
+    #  as date and a counter as time
+    SEL_DIRECTIONS = ('Asserted', 'Deasserted')
+    SEL_ENTRIES = re.compile(r'^\s*Entries\s*:\s*(\d+)', re.M)
+    SEL_EMPTY = re.compile(r'^SEL has no entries', re.M)
+    SEL_CLEARING = re.compile(r'^Clearing SEL', re.M)
+
+    AUX_BYTE = re.compile(r'^\s+0x([0-9a-fA-F]{2})\s*$')
+    FRU_DEVICE = re.compile(
+        r'^FRU Device Description\s*:\s*(.*?)\s*\(ID (\d+)\)\s*$')
+    HPM_COMPONENT = re.compile(
+        r'^\|(\*?)[ \t]*(\d+)[ \t]*\|[ \t]*([^|\n]*?)[ \t]*\|[ \t]*([^|\n]*?)'
+        r'[ \t]*\|[ \t]*([^|\n]*?)[ \t]*\|[ \t]*([^|\n]*?)[ \t]*\|[ \t]*$',
+        re.M)
+    HPM_NO_VERSION = re.compile(r'^-+\.-+')
+    HPM_UPGRADE_OK = re.compile(r'Firmware upgrade procedure successful')
+
+    ############################################################################
+    # chassis
+    ############################################################################
+
+    ##
+    # @brief Parses 'chassis power on|off|soft|cycle|reset'
+    #
+    # @return the action the BMC reports, e.g. 'Up/On', 'Down/Off' or 'Soft',
+    #         or None when the command failed
+    #
+    @classmethod
+    def power_control(cls, i_output):
+        l_match = cls.POWER_CONTROL.search(i_output)
+        return l_match.group(1) if l_match else None
+
+    ##
+    # @brief Parses 'chassis power status'
+    #
+    # @return True for on, False for off, None when the command failed
+    #
+    @classmethod
+    def power_status(cls, i_output):
+        l_match = cls.POWER_STATUS.search(i_output)
+        if l_match is None:
+            return None
+        return l_match.group(1) == 'on'
+
+    ##
+    # @brief Parses 'chassis status'
+    #
+    # @return OpTestChassisStatus or None when there is no System Power line
+    #
+    @classmethod
+    def chassis_status(cls, i_output):
+        l_fields = cls.fields(i_output)
+        if 'System Power' not in l_fields:
+            return None
+        l_bool = lambda x: l_fields.get(x) == 'true'
+        return OpTestChassisStatus(
+            l_fields['System Power'] == 'on', l_bool('Power Overload'),
+            l_bool('Power Interlock'), l_bool('Main Power Fault'),
+            l_bool('Power Control Fault'),
+            l_fields.get('Power Restore Policy', ''),
+            l_fields.get('Last Power Event', ''),
+            l_fields.get('Chassis Intrusion', ''), l_fields)
+
+    ##
+    # @brief Parses 'key : value' lines, e.g. 'chassis status' or 'sdr info'
+    #
+    # @return dict {key: value}
+    #
+    @classmethod
+    def fields(cls, i_output):
+        return dict(cls.KEY_VALUE.findall(i_output))
+
+    ############################################################################
+    # sdr and sensor
+    ############################################################################
+
+    ##
+    # @brief Splits a reading like '45 degrees C' into the number and units
+    #
+    # @return tuple (float or None, units)
+    #
+    @classmethod
+    def _number(cls, i_text):
+        if not i_text or i_text[0] not in cls.NUMBER_START:
+            return (None, '')
+        l_num, l_sep, l_units = i_text.partition(' ')
+        try:
+            return (float(l_num), l_units.strip())
+        except ValueError:
+            return (None, '')
+
+    @classmethod
+    def _state(cls, i_text):
+        try:
+            return int(i_text, 16)
+        except ValueError:
+            return None
+
+    ##
+    # @brief Splits the reading of a discrete sensor into its asserted states:
+    #        ipmitool prints all of them, comma separated, e.g.
+    #        'S0/G0: working, Legacy ON state'
+    #
+    # @return list of strings
+    #
+    @classmethod
+    def states(cls, i_reading):
+        return [x.strip() for x in i_reading.split(', ') if x.strip()]
+
+    ##
+    # @brief Parses 'sdr list' or 'sdr elist' (any sensor type)
+    #
+    # @return list of OpTestSDRRecord
+    #
+    @classmethod
+    def sdr(cls, i_output):
+        l_records = []
+        l_append = l_records.append
+        l_make = OpTestSDRRecord._make
+        for l_line in i_output.split('\n'):
+            l_cols = l_line.split('|')
+            if len(l_cols) == 5:
+                # name | 10h | ok | 7.0 | reading
+                l_cols = [x.strip() for x in l_cols]
+                if l_cols[1][-1:] != 'h':
+                    continue
+                l_num = cls._state(l_cols[1][:-1])
+                if l_num is None:
+                    continue
+                l_value, l_units = cls._number(l_cols[4])
+                l_append(l_make((l_cols[0], l_num, l_cols[2], l_cols[3],
+                                 l_cols[4], l_value, l_units)))
+            elif len(l_cols) == 3:
+                # name | reading | ok
+                l_cols = [x.strip() for x in l_cols]
+                l_value, l_units = cls._number(l_cols[1])
+                l_append(l_make((l_cols[0], None, l_cols[2], '', l_cols[1],
+                                 l_value, l_units)))
+        return l_records
+
+    ##
+    # @brief Parses 'sensor list'
+    #
+    # @return list of OpTestSensorRecord
+    #
+    @classmethod
+    def sensor(cls, i_output):
+        l_records = []
+        l_append = l_records.append
+        l_make = OpTestSensorRecord._make
+        l_number = cls._number
+        for l_line in i_output.split('\n'):
+            l_cols = l_line.split('|')
+            if len(l_cols) != 10:
+                continue
+            # name | value | units | status | lnr | lcr | lnc | unc | ucr | unr
+            l_cols = [x.strip() for x in l_cols]
+            if l_cols[2] == 'discrete':
+                l_value = cls._state(l_cols[3])
+            else:
+                l_value = l_number(l_cols[1])[0]
+            l_append(l_make((l_cols[0], l_value, l_cols[1], l_cols[2],
+                             l_cols[3],
+                             tuple([None if x == 'na' else l_number(x)[0]
+                                    for x in l_cols[4:]]))))
+        return l_records
+
+    ##
+    # @brief Parses 'sensor reading <name>...'
+    #
+    # @return dict {sensor name: float, the state bits (int) of a discrete
+    #         sensor, or None when there is no reading}
+    #
+    @classmethod
+    def sensor_reading(cls, i_output):
+        l_values = {}
+        for l_line in i_output.split('\n'):
+            l_cols = l_line.split('|')
+            if len(l_cols) != 2:
+                continue
+            l_name = l_cols[0].strip()
+            l_reading = l_cols[1].strip()
+            if l_reading.startswith('0x'):
+                l_values[l_name] = cls._state(l_reading)
+            else:
+                l_values[l_name] = cls._number(l_reading)[0]
+        return l_values
+
+    ############################################################################
+    # sel
+    ############################################################################
+
+    ##
+    # @brief Parses 'sel list' or 'sel elist'
+    #
+    # @return list of OpTestSELRecord
+    #
+    @classmethod
+    def sel(cls, i_output):
+        l_records = []
+        l_append = l_records.append
+        l_make = OpTestSELRecord._make
+        for l_line in i_output.split('\n'):
+            l_cols = l_line.split('|')
+            if len(l_cols) < 4:
+                continue
+            try:
+                l_id = int(l_cols[0], 16)
+            except ValueError:
+                continue
+            l_cols = [x.strip() for x in l_cols]
+            if len(l_cols) < 5:
+                l_cols.append('')
+            l_sensor = l_cols[3]
+            l_num = None
+            l_pos = l_sensor.rfind('#0x')
+            if l_pos >= 0:
+                try:
+                    l_num = int(l_sensor[l_pos + 3:], 16)
+                except ValueError:
+                    pass
+            l_direction = ''
+            l_extra = ''
+            if len(l_cols) > 5:
+                l_extra = l_cols[5:]
+                if l_extra[0] in cls.SEL_DIRECTIONS:
+                    l_direction = l_extra.pop(0)
+                l_extra = ' | '.join([x for x in l_extra if x])
+            l_append(l_make((l_id, l_cols[1], l_cols[2], l_sensor, l_num,
+                             l_cols[4], l_direction, l_extra,
+                             l_line.rstrip('\r'))))
+        return l_records
+
+    ##
+    # @brief Parses one 'sel elist' line
+    #
+    # @return OpTestSELRecord or None if the line is not a SEL entry
+    #
+    @classmethod
+    def sel_line(cls, i_line):
+        l_records = cls.sel(i_line.rstrip('\n'))
+        return l_records[0] if l_records else None
+
+    ##
+    # @brief Parses the entry count of 'sel info'
+    #
+    # @return int or None
+    #
+    @classmethod
+    def sel_entries(cls, i_output):
+        l_match = cls.SEL_ENTRIES.search(i_output)
+        return int(l_match.group(1)) if l_match else None
+
+    ##
+    # @brief Tells whether 'sel list' or 'sel elist' reports an empty SEL
+    #
+    @classmethod
+    def sel_empty(cls, i_output):
+        return cls.SEL_EMPTY.search(i_output) is not None
+
+    ##
+    # @brief Tells whether 'sel clear' was accepted
+    #
+    @classmethod
+    def sel_clearing(cls, i_output):
+        return cls.SEL_CLEARING.search(i_output) is not None
+
+    ############################################################################
+    # mc info, fru, hpm
+    ############################################################################
+
+    ##
+    # @brief Parses 'mc info'
+    #
+    # @return OpTestMCInfo or None when there is no Device ID line
+    #
+    @classmethod
+    def mc_info(cls, i_output):
+        l_fields = {}
+        l_aux = []
+        l_key = None
+        for l_line in i_output.splitlines():
+            l_match = cls.KEY_VALUE.match(l_line)
+            if l_match:
+                l_key = l_match.group(1)
+                l_fields[l_key] = l_match.group(2)
+                continue
+            l_match = cls.AUX_BYTE.match(l_line)
+            if l_match and l_key == 'Aux Firmware Rev Info':
+                l_aux.append(int(l_match.group(1), 16))
+        if 'Device ID' not in l_fields:
+            return None
+        l_int = lambda x: int(l_fields.get(x, '0').split()[0] or '0', 0)
+        return OpTestMCInfo(l_int('Device ID'), l_int('Device Revision'),
+                            l_fields.get('Firmware Revision', ''),
+                            l_fields.get('IPMI Version', ''),
+                            l_int('Manufacturer ID'), l_int('Product ID'),
+                            l_aux, l_fields)
+
+    ##
+    # @brief Parses 'fru print'
+    #
+    # @return list of OpTestFRURecord
+    #
+    @classmethod
+    def fru(cls, i_output):
+        l_records = []
+        l_fields = None
+        for l_line in i_output.splitlines():
+            l_match = cls.FRU_DEVICE.match(l_line)
+            if l_match:
+                l_fields = {}
+                l_records.append(OpTestFRURecord(int(l_match.group(2)),
+                                                 l_match.group(1), l_fields))
+                continue
+            l_match = cls.KEY_VALUE.match(l_line.strip())
+            if l_match and l_fields is not None:
+                l_fields[l_match.group(1)] = l_match.group(2)
+        return l_records
+
+    ##
+    # @brief Parses the component table of 'hpm check'
+    #
+    # @return list of OpTestHPMComponent
+    #
+    @classmethod
+    def hpm_check(cls, i_output):
+        l_records = []
+        for l_match in cls.HPM_COMPONENT.findall(i_output):
+            l_versions = ['' if cls.HPM_NO_VERSION.match(x) else x
+                          for x in l_match[3:6]]
+            l_records.append(OpTestHPMComponent(
+                int(l_match[1]), l_match[2], l_versions[0], l_versions[1],
+                l_versions[2], l_match[0] == '*'))
+        return l_records
+
+    ##
+    # @brief Tells whether 'hpm upgrade' completed
+    #
+    @classmethod
+    def hpm_upgrade_ok(cls, i_output):
+        return cls.HPM_UPGRADE_OK.search(i_output) is not None
@@ -0,0 +1,234 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestIPMIShell.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestIPMIShell
+#  Persistent 'ipmitool shell' workers
+#
+#  An OpTestIPMIShell drives one long lived 'ipmitool -I lanplus ... shell'
+#  process, so the lanplus session is set up once and reused by every command
+#  written to it. Each response is framed by an 'echo <sentinel>' command.
+#  OpTestIPMIShellPool hands out a bounded number of workers per BMC.
+
+import os
+import threading
+import pexpect
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+# Worker pools, one per (bmc ip, ipmi user)
+_pools = {}
+_poolsLock = threading.Lock()
+
+class OpTestIPMIShell():
+
+    PROMPT = 'ipmitool> '
+
+    # Output that means the lanplus session of the shell is gone
+    SESSION_ERRORS = ('Unable to establish',
+                      'Error in open session',
+                      'No response from remote controller',
+                      'Insufficient privilege level',
+                      'Invalid session ID')
+
+    ##
+    # @brief Initialize this object. The ipmitool process is started on the
+    #        first command.
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: IPMI userid
+    # @param i_bmcPwd @type string: IPMI password
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd):
+        self.cv_bmcIP = i_bmcIP
+        self.cv_cmd = 'ipmitool -H %s -I lanplus -U %s -P %s shell' \
+                      % (i_bmcIP, i_bmcUser, i_bmcPwd)
+        self.cv_child = None
+        self.cv_count = 0
+
+    def _start(self):
+        self.close()
+        try:
+            self.cv_child = pexpect.spawn(self.cv_cmd)
+            self.cv_child.expect_exact(self.PROMPT,
+                                       timeout=BMC_CONST.IPMI_SHELL_START_TIMEOUT)
+        except (pexpect.ExceptionPexpect, OSError) as e:
+            self.close()
+            raise OpTestError("Could not start ipmitool shell for %s: %s"
+                              % (self.cv_bmcIP, e))
+
+    ##
+    # @brief Stops the ipmitool process
+    #
+    def close(self):
+        if self.cv_child is not None:
+            try:
+                if self.cv_child.isalive():
+                    self.cv_child.sendline('exit')
+                self.cv_child.close(force=True)
+            except (pexpect.ExceptionPexpect, OSError):
+                pass
+            self.cv_child = None
+
+    def alive(self):
+        return self.cv_child is not None and self.cv_child.isalive()
+
+    ##
+    # @brief Removes the prompts and echoed input from the text read before
+    #        the sentinel
+    #
+    def _clean(self, i_text, i_args):
+        l_lines = []
+        for l_line in i_text.replace('\r', '').split('\n'):
+            while l_line.startswith(self.PROMPT):
+                l_line = l_line[len(self.PROMPT):]
+            if l_line.strip() == i_args.strip() or l_line.startswith('echo __OPTEST_'):
+                continue
+            l_lines.append(l_line)
+        while l_lines and not l_lines[-1].strip():
+            l_lines.pop()
+        while l_lines and not l_lines[0].strip():
+            l_lines.pop(0)
+        if not l_lines:
+            return ''
+        return '\n'.join(l_lines) + '\n'
+
+    ##
+    # @brief Runs one ipmitool command in the shell. A worker that hangs is
+    #        killed, and one whose session dropped is restarted and the
+    #        command retried once.
+    #
+    # @param i_args @type string: ipmitool command arguments, e.g. 'sdr elist'
+    # @param i_timeout @type int: seconds to wait for the command to finish
+    #
+    # @return the command output or raise OpTestError
+    #
+    def run(self, i_args, i_timeout=BMC_CONST.IPMI_SHELL_TIMEOUT):
+        for l_try in range(2):
+            if not self.alive():
+                self._start()
+            self.cv_count += 1
+            l_sentinel = '__OPTEST_%d_%d__' % (os.getpid(), self.cv_count)
+            try:
+                self.cv_child.sendline(i_args)
+                self.cv_child.sendline('echo ' + l_sentinel)
+                # the echoed input line is 'ipmitool> echo <sentinel>', the
+                # output of the echo command is the sentinel on its own line
+                self.cv_child.expect_exact('\n' + l_sentinel, timeout=i_timeout)
+                l_output = self.cv_child.before
+            except pexpect.TIMEOUT:
+                self.close()
+                raise OpTestError("ipmitool shell on %s hung running '%s'"
+                                  % (self.cv_bmcIP, i_args))
+            except (pexpect.EOF, OSError):
+                self.close()
+                continue
+
+            l_output = self._clean(l_output, i_args)
+            if l_try == 0 and \
+               any(l_err in l_output for l_err in self.SESSION_ERRORS):
+                print "ipmitool shell session to %s dropped, restarting" \
+                      % self.cv_bmcIP
+                self.close()
+                continue
+            if i_args.split()[:2] == ['mc', 'reset']:
+                # the session does not survive the BMC reset
+                self.close()
+            return l_output
+
+        raise OpTestError("ipmitool shell on %s failed running '%s'"
+                          % (self.cv_bmcIP, i_args))
+
+
+class OpTestIPMIShellPool():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: IPMI userid
+    # @param i_bmcPwd @type string: IPMI password
+    # @param i_workers @type int: maximum number of concurrent shell processes
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd,
+                 i_workers=BMC_CONST.IPMI_SHELL_WORKERS):
+        self.cv_bmcIP = i_bmcIP
+        self.cv_bmcUser = i_bmcUser
+        self.cv_bmcPwd = i_bmcPwd
+        self.cv_max = i_workers
+        self.cv_idle = []
+        self.cv_count = 0
+        self.cv_cond = threading.Condition()
+
+    ##
+    # @brief Returns the shared pool for a BMC, creating it if needed
+    #
+    # @return OpTestIPMIShellPool object
+    #
+    @classmethod
+    def get_pool(cls, i_bmcIP, i_bmcUser, i_bmcPwd):
+        l_key = (i_bmcIP, i_bmcUser)
+        with _poolsLock:
+            if l_key not in _pools:
+                _pools[l_key] = cls(i_bmcIP, i_bmcUser, i_bmcPwd)
+            return _pools[l_key]
+
+    def _acquire(self):
+        with self.cv_cond:
+            while not self.cv_idle and self.cv_count >= self.cv_max:
+                self.cv_cond.wait()
+            if self.cv_idle:
+                return self.cv_idle.pop()
+            self.cv_count += 1
+        return OpTestIPMIShell(self.cv_bmcIP, self.cv_bmcUser, self.cv_bmcPwd)
+
+    def _release(self, i_worker):
+        with self.cv_cond:
+            self.cv_idle.append(i_worker)
+            self.cv_cond.notify()
+
+    ##
+    # @brief Runs one ipmitool command on an idle worker of the pool
+    #
+    # @param i_args @type string: ipmitool command arguments
+    # @param i_timeout @type int: seconds to wait for the command to finish
+    #
+    # @return the command output or raise OpTestError
+    #
+    def run(self, i_args, i_timeout=BMC_CONST.IPMI_SHELL_TIMEOUT):
+        l_worker = self._acquire()
+        try:
+            return l_worker.run(i_args, i_timeout)
+        finally:
+            self._release(l_worker)
+
+    ##
+    # @brief Stops all idle workers of the pool
+    #
+    def close(self):
+        with self.cv_cond:
+            for l_worker in self.cv_idle:
+                l_worker.close()
@@ -30,8 +30,6 @@
 #  This class encapsulates all function which deals with the Lpar
 #  in OpenPower systems
 
-import sys
-import os
 import string
 import time
 import random
@@ -39,13 +37,12 @@ import subprocess
 import re
 import telnetlib
 import socket
-import select
-import pty
 import pexpect
 
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestUtil import OpTestUtil
+from OpTestSSHMaster import OpTestSSHMaster
 
 class OpTestLpar():
 
@@ -63,139 +60,26 @@ class OpTestLpar():
         self.util = OpTestUtil()
 
     ##
-    #   @brief This method executes the command(i_cmd) on the host using a ssh session
+    #   @brief This method executes the command(i_cmd) on the host over the
+    #          persistent ssh connection to the host (see OpTestSSHMaster)
     #
     #   @param i_cmd: @type string: Command to be executed on host through a ssh session
     #   @return command output if command execution is successful else raises OpTestError
     #
     def _ssh_execute(self, i_cmd):
 
-        l_host = self.ip
-        l_user = self.user
-        l_pwd = self.passwd
-
-        l_output = ''
-        ssh_ver = '-2'
-
-        self.util.PingFunc(l_host, BMC_CONST.PING_RETRY_FOR_STABILITY)
-
-        # Flush everything out prior to forking
-        sys.stdout.flush()
-
-        # Connect the child controlling terminal to a pseudo-terminal
-        try:
-            pid, fd = pty.fork()
-        except OSError as e:
-                # Explicit chain of errors
-            l_msg = "Got OSError attempting to fork a pty session for ssh."
-            raise OpTestError(l_msg)
-
-        if pid == 0:
-            # In child process.  Issue attempt ssh connection to remote host
-
-            arglist = ('/usr/bin/ssh -o StrictHostKeyChecking=no',
-                       l_host, ssh_ver, '-k', '-l', l_user, i_cmd)
-
-            try:
-                os.execv('/usr/bin/ssh', arglist)
-            except Exception as e:
-                # Explicit chain of errors
-                l_msg = "Can not spawn os.execv for ssh."
-                print l_msg
-                raise OpTestError(l_msg)
+        l_master = OpTestSSHMaster.get_master(self.ip, self.user, self.passwd)
 
+        if(i_cmd.__contains__('updlic') or i_cmd.__contains__('update_flash')):
+            l_timeout = None
         else:
-            # In parent process
-            # Polling child process for output
-            poll = select.poll()
-            poll.register(fd, select.POLLIN)
-
-            start_time = time.time()
-            # time.sleep(1)
-            while True:
-                try:
-                    evt = poll.poll()
-                    x = os.read(fd, 1024)
-                    #print "ssh x= " + x
-                    end_time = time.time()
-                    if(end_time - start_time > 1500):
-                        if(i_cmd.__contains__('updlic') or i_cmd.__contains__('update_flash')):
-                            continue
-                        else:
-                            l_msg = "Timeout occured/SSH request " \
-                                    "un-responded even after 25 minutes"
-                            print l_msg
-                            raise OpTestError(l_msg)
-
-                    if(x.__contains__('(yes/no)')):
-                        l_res = "yes\r\n"
-                        os.write(fd, l_res)
-                    if(x.__contains__('s password:')):
-                        x = ''
-                        os.write(fd, l_pwd + '\r\n')
-                    if(x.__contains__('Password:')):
-                        x = ''
-                        os.write(fd, l_pwd + '\r\n')
-                    if(x.__contains__('password')):
-                        response = l_pwd + "\r\n"
-                        os.write(fd, response)
-                    if(x.__contains__('yes')):
-                        response = '1' + "\r\n"
-                        os.write(fd, response)
-                    if(x.__contains__('Connection refused')):
-                        print x
-                        raise OpTestError(x)
-                    if(x.__contains__('Received disconnect from')):
-                        self.ssh_ver = '-1'
-                    if(x.__contains__('Connection closed by')):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__("WARNING: POSSIBLE DNS SPOOFING DETECTED")):
-                        print (x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("WARNING: REMOTE HOST IDENTIFICATION HAS CHANGED")):
-                        print (x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("Permission denied")):
-                        l_msg = "Wrong Login or Password(" + l_user + "/" + l_pwd + ") :" + x
-                        print (l_msg)
-                        raise OpTestError(l_msg)
-                    if(x.__contains__("Rebooting") or \
-                       (x.__contains__("rebooting the system"))):
-                        l_output = l_output + x
-                        raise OpTestError(l_output)
-                    if(x.__contains__("Connection timed out")):
-                        l_msg = "Connection timed out/" + \
-                            l_host + " is not pingable"
-                        print (x)
-                        raise OpTestError(l_msg)
-                    if(x.__contains__("could not connect to CLI daemon")):
-                        print(x)
-                        raise OpTestError("Director server is not up/running("
-                                          "Do smstop then smstart to restart)")
-                    if((x.__contains__("Error:")) and (i_cmd.__contains__('rmsys'))):
-                        print(x)
-                        raise OpTestError("Error removing:" + l_host)
-                    if((x.__contains__("Bad owner or permissions on /root/.ssh/config"))):
-                        print(x)
-                        raise OpTestError("Bad owner or permissions on /root/.ssh/config,"
-                                          "Try 'chmod -R 600 /root/.ssh' & retry operation")
+            l_timeout = BMC_CONST.LPAR_SSH_TIMEOUT
+        l_rc, l_output = l_master.run(i_cmd, l_timeout)
 
-                    l_output = l_output + x
-                    # time.sleep(1)
-                except OSError:
-                    break
-        if l_output.__contains__("Name or service not known"):
-            reason = 'SSH Failed for :' + l_host + \
-                "\n Please provide a valid Hostname"
-            print reason
-            raise OpTestError(reason)
+        if(l_output.__contains__("Rebooting") or \
+           (l_output.__contains__("rebooting the system"))):
+            raise OpTestError(l_output)
 
-        # Gather child process status to freeup zombie and
-        # Close child file descriptor before return
-        if (fd):
-            os.waitpid(pid, 0)
-            os.close(fd)
         return l_output
 
     ##
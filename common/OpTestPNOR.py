@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestPNOR.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestPNOR
+#  PNOR image inspector
+#
+#  This class maps a PNOR image with mmap and reads its FFS partition table
+#  in place. It computes per partition md5sums, finds fully erased (0xFF)
+#  partitions and regions and reports partition and data sizes, so that a
+#  transfer or a flash can be limited to what the image actually holds and
+#  what changed. The image is read in BMC_CONST.PNOR_SCAN_CHUNK slices, so
+#  memory use does not grow with the image size.
+
+import os
+import mmap
+import struct
+import hashlib
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+class OpTestPNOR():
+
+    FFS_MAGIC = 0x50415254              # 'PART'
+    # magic, version, size, entry_size, entry_count, block_size,
+    # block_count, resvd[4], checksum
+    HDR_FORMAT = '>7I4II'
+    HDR_SIZE = 48
+    # name, base, size, pid, id, type, flags, actual, resvd[4], user[16],
+    # checksum
+    ENTRY_FORMAT = '>16s7I4I16II'
+    ENTRY_SIZE = 128
+
+    ##
+    # @brief Initialize this object, map the image and read the partition table
+    #
+    # @param i_path @type string: PNOR image file
+    #
+    def __init__(self, i_path):
+        self.cv_path = i_path
+        self.cv_blockSize = 0
+        self.cv_blockCount = 0
+        self.cv_partitions = []
+        self.cv_scanned = False
+        try:
+            with open(i_path, 'rb') as f:
+                self.cv_size = os.fstat(f.fileno()).st_size
+                if self.cv_size < self.HDR_SIZE:
+                    raise OpTestError("%s is too short for a PNOR image"
+                                      % i_path)
+                self.cv_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, mmap.error) as e:
+            l_msg = "Can not read PNOR image %s: %s" % (i_path, e)
+            print l_msg
+            raise OpTestError(l_msg)
+        self._read_toc()
+
+    ##
+    # @brief Unmaps the image
+    #
+    def close(self):
+        if self.cv_map is not None:
+            self.cv_map.close()
+            self.cv_map = None
+
+    ##
+    # @brief The FFS checksum: all 32 bit words of a header or entry, the
+    #        checksum word included, XOR to 0
+    #
+    def _checksum_ok(self, i_offset, i_size):
+        l_sum = 0
+        for l_word in struct.unpack_from('>%dI' % (i_size / 4), self.cv_map,
+                                         i_offset):
+            l_sum ^= l_word
+        return l_sum == 0
+
+    def _read_toc(self):
+        l_fields = struct.unpack_from(self.HDR_FORMAT, self.cv_map, 0)
+        (l_magic, l_version, l_size, l_entrySize, l_count,
+         l_blockSize, l_blockCount) = l_fields[:7]
+        if l_magic != self.FFS_MAGIC or not self._checksum_ok(0, self.HDR_SIZE):
+            raise OpTestError("%s has no valid FFS partition table"
+                              % self.cv_path)
+        if l_entrySize != self.ENTRY_SIZE:
+            raise OpTestError("%s: unsupported FFS entry size %d"
+                              % (self.cv_path, l_entrySize))
+        if self.HDR_SIZE + l_count * l_entrySize > self.cv_size:
+            raise OpTestError("%s: FFS partition table is truncated"
+                              % self.cv_path)
+
+        self.cv_blockSize = l_blockSize
+        self.cv_blockCount = l_blockCount
+        self.cv_partitions = []
+        for l_index in range(l_count):
+            l_offset = self.HDR_SIZE + l_index * self.ENTRY_SIZE
+            if not self._checksum_ok(l_offset, self.ENTRY_SIZE):
+                raise OpTestError("%s: bad FFS entry %d" % (self.cv_path,
+                                                            l_index))
+            l_fields = struct.unpack_from(self.ENTRY_FORMAT, self.cv_map,
+                                          l_offset)
+            self.cv_partitions.append({
+                'name': l_fields[0].split('\0', 1)[0],
+                'base': l_fields[1],
+                'blocks': l_fields[2],
+                'offset': l_fields[1] * l_blockSize,
+                'size': l_fields[2] * l_blockSize,
+                'id': l_fields[4],
+                'type': l_fields[5],
+                'flags': l_fields[6],
+                'actual': l_fields[7],
+            })
+
+    ##
+    # @brief Returns the partitions, in partition table order
+    #
+    # @return list of dicts with 'name', 'base' and 'blocks' (in erase
+    #         blocks), 'offset' and 'size' (in bytes), 'id', 'type', 'flags'
+    #         and 'actual' (bytes of data in the partition). Once scanned
+    #         (hashes(), scan()) they also hold 'md5', 'erased' (all 0xFF) and
+    #         'data' (bytes up to the last non 0xFF byte).
+    #
+    def partitions(self):
+        return self.cv_partitions
+
+    ##
+    # @brief Reads every partition once, computing its md5sum, whether it is
+    #        erased and how much data it holds
+    #
+    # @return list of partition dicts, see partitions()
+    #
+    def scan(self):
+        if self.cv_scanned:
+            return self.cv_partitions
+        l_chunk = BMC_CONST.PNOR_SCAN_CHUNK
+        l_erased = '\xff' * l_chunk
+        for l_part in self.cv_partitions:
+            l_md5 = hashlib.md5()
+            l_data = 0
+            l_pos = l_part['offset']
+            l_end = min(l_part['offset'] + l_part['size'], self.cv_size)
+            while l_pos < l_end:
+                l_slice = self.cv_map[l_pos:min(l_pos + l_chunk, l_end)]
+                l_md5.update(l_slice)
+                if l_slice != l_erased[:len(l_slice)]:
+                    l_data = l_pos + len(l_slice.rstrip('\xff')) - l_part['offset']
+                l_pos += len(l_slice)
+            l_part['md5'] = l_md5.hexdigest()
+            l_part['data'] = l_data
+            l_part['erased'] = l_data == 0
+        self.cv_scanned = True
+        return self.cv_partitions
+
+    ##
+    # @brief Computes the md5sum of every partition
+    #
+    # @return dict of partition name: md5sum hex string
+    #
+    def hashes(self):
+        return dict((p['name'], p['md5']) for p in self.scan())
+
+    ##
+    # @brief Returns the partitions whose md5sum differs from a manifest
+    #
+    # @param i_hashes @type dict: partition name: md5sum, e.g. of the flash
+    #
+    # @return list of partition dicts
+    #
+    def changed(self, i_hashes):
+        return [p for p in self.scan() if i_hashes.get(p['name']) != p['md5']]
+
+    ##
+    # @brief Returns the regions of the image that are not erased
+    #
+    # @param i_granule @type int: region granularity in bytes
+    #
+    # @return list of (offset, length) tuples, adjacent regions merged
+    #
+    def extents(self, i_granule=BMC_CONST.PNOR_SCAN_CHUNK):
+        l_extents = []
+        l_erased = '\xff' * i_granule
+        l_pos = 0
+        while l_pos < self.cv_size:
+            l_len = min(i_granule, self.cv_size - l_pos)
+            if self.cv_map[l_pos:l_pos + l_len] != l_erased[:l_len]:
+                if l_extents and l_extents[-1][0] + l_extents[-1][1] == l_pos:
+                    l_extents[-1] = (l_extents[-1][0], l_extents[-1][1] + l_len)
+                else:
+                    l_extents.append((l_pos, l_len))
+            l_pos += l_len
+        return l_extents
+
+    ##
+    # @brief Prints the partition table with sizes and md5sums
+    #
+    def report(self):
+        print "%-16s %10s %10s %10s %10s  %s" % ('Partition', 'Offset', 'Size',
+                                                 'Actual', 'Data', 'md5sum')
+        for l_part in self.scan():
+            print "%-16s 0x%08x 0x%08x 0x%08x 0x%08x  %s" % (
+                l_part['name'], l_part['offset'], l_part['size'],
+                l_part['actual'], l_part['data'],
+                'erased' if l_part['erased'] else l_part['md5'])
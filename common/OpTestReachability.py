@@ -0,0 +1,237 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestReachability.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestReachability
+#  Host and BMC reachability probes
+#
+#  This class probes a target over ICMP (one 'ping -c 1 -W 1'), TCP (ssh on
+#  port 22, or its banner) and UDP (an RMCP presence ping, or a session-less
+#  IPMI request on port 623), starting with sub second intervals and backing
+#  off exponentially until a deadline. It records how long each service took
+#  to answer, so callers wait for exactly as long as the target needs instead
+#  of sleeping fixed amounts.
+
+import os
+import time
+import socket
+import struct
+import subprocess
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+from OpTestIPMILan import OpTestIPMILan
+
+class OpTestReachability():
+
+    # probe name: (method name, description)
+    PROBES = {
+        'icmp': ('probe_icmp', 'ping'),
+        'ssh': ('probe_ssh', 'ssh port'),
+        'rmcp': ('probe_rmcp', 'RMCP presence ping'),
+        'ipmi': ('probe_ipmi', 'IPMI'),
+        'ssh_banner': ('probe_ssh_banner', 'ssh banner'),
+    }
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_host @type string: IP Address or host name of the target
+    #
+    def __init__(self, i_host):
+        self.cv_host = i_host
+        # probe name: seconds it took to answer, in the last wait()
+        self.cv_times = {}
+
+    ##
+    # @brief Sends one ICMP echo request
+    #
+    # @return True if the target answered within BMC_CONST.REACH_PROBE_TIMEOUT
+    #
+    def probe_icmp(self):
+        l_null = open(os.devnull, 'w')
+        try:
+            l_rc = subprocess.call(['ping', '-c', '1', '-W',
+                                    str(BMC_CONST.REACH_PROBE_TIMEOUT),
+                                    self.cv_host],
+                                   stdout=l_null, stderr=l_null)
+        except OSError:
+            l_msg = "Ping Test Failed."
+            print l_msg
+            raise OpTestError(l_msg)
+        finally:
+            l_null.close()
+        return l_rc == 0
+
+    ##
+    # @brief Opens a TCP connection
+    #
+    # @param i_port @type int: TCP port
+    #
+    # @return True if the connection was accepted
+    #
+    def probe_tcp(self, i_port):
+        try:
+            l_sock = socket.create_connection((self.cv_host, i_port),
+                                              BMC_CONST.REACH_PROBE_TIMEOUT)
+        except (socket.error, socket.timeout):
+            return False
+        l_sock.close()
+        return True
+
+    def probe_ssh(self):
+        return self.probe_tcp(BMC_CONST.REACH_SSH_PORT)
+
+    ##
+    # @brief Sends an RMCP/ASF presence ping to the IPMI LAN port
+    #
+    # @return True if a presence pong came back
+    #
+    def probe_rmcp(self):
+        l_tag = int(time.time() * 1000) & 0xff
+        # RMCP header (version 6, no ack, class ASF), ASF IANA number,
+        # message type presence ping, tag, reserved, data length 0
+        l_ping = struct.pack('>BBBBIBBBB', 0x06, 0x00, 0xff, 0x06,
+                             4542, 0x80, l_tag, 0x00, 0x00)
+        l_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        l_sock.settimeout(BMC_CONST.REACH_PROBE_TIMEOUT)
+        try:
+            l_sock.sendto(l_ping, (self.cv_host, BMC_CONST.IPMI_LAN_PORT))
+            l_end = time.time() + BMC_CONST.REACH_PROBE_TIMEOUT
+            while time.time() < l_end:
+                l_data = l_sock.recv(512)
+                # presence pong with our tag
+                if len(l_data) >= 10 and l_data[3] == '\x06' and \
+                   l_data[8] == '\x40' and ord(l_data[9]) == l_tag:
+                    return True
+        except (socket.error, socket.timeout):
+            pass
+        finally:
+            l_sock.close()
+        return False
+
+    ##
+    # @brief Sends a session-less Get Channel Authentication Capabilities
+    #        request; unlike the presence ping it needs the IPMI stack up
+    #
+    # @return True if the BMC answered it
+    #
+    def probe_ipmi(self):
+        l_lan = OpTestIPMILan(self.cv_host, '', '')
+        try:
+            l_cc, l_data = l_lan.get_channel_auth_caps(1)
+        except OpTestError:
+            return False
+        finally:
+            l_lan.close(False)
+        return l_cc == 0
+
+    ##
+    # @brief Connects to the ssh port and reads the server banner
+    #
+    # @return True if an 'SSH-' identification line came back
+    #
+    def probe_ssh_banner(self):
+        try:
+            l_sock = socket.create_connection((self.cv_host,
+                                               BMC_CONST.REACH_SSH_PORT),
+                                              BMC_CONST.REACH_PROBE_TIMEOUT)
+        except (socket.error, socket.timeout):
+            return False
+        try:
+            l_data = ''
+            while '\n' not in l_data and len(l_data) < 1024:
+                l_chunk = l_sock.recv(256)
+                if not l_chunk:
+                    break
+                l_data += l_chunk
+        except (socket.error, socket.timeout):
+            pass
+        finally:
+            l_sock.close()
+        return 'SSH-' in l_data
+
+    ##
+    # @brief Probes the target until a service stops answering, e.g. once a
+    #        reboot was requested
+    #
+    # @param i_probe @type string: probe name, see PROBES
+    # @param i_deadline @type float: seconds to keep trying
+    #
+    # @return seconds it took the service to go away, or None if it still
+    #         answered at the deadline
+    #
+    def wait_down(self, i_probe='icmp', i_deadline=BMC_CONST.LPAR_BRINGUP_TIME):
+        if i_probe not in self.PROBES:
+            raise OpTestError("Unknown reachability probe '%s'" % i_probe)
+        l_start = time.time()
+        while time.time() - l_start < i_deadline:
+            if not getattr(self, self.PROBES[i_probe][0])():
+                return round(time.time() - l_start, 3)
+            time.sleep(BMC_CONST.REACH_POLL_MIN)
+        return None
+
+    ##
+    # @brief Probes the target until all the services answer
+    #
+    # @param i_probes @type list: probe names, see PROBES
+    # @param i_deadline @type float: seconds to keep trying
+    #
+    # @return dict of probe name: seconds it took to answer,
+    #         or raise OpTestError at the deadline
+    #
+    def wait(self, i_probes=('icmp',), i_deadline=BMC_CONST.LPAR_BRINGUP_TIME):
+        for l_probe in i_probes:
+            if l_probe not in self.PROBES:
+                raise OpTestError("Unknown reachability probe '%s'" % l_probe)
+        l_start = time.time()
+        l_interval = BMC_CONST.REACH_POLL_MIN
+        self.cv_times = {}
+        while True:
+            for l_probe in i_probes:
+                if l_probe in self.cv_times:
+                    continue
+                if getattr(self, self.PROBES[l_probe][0])():
+                    self.cv_times[l_probe] = round(time.time() - l_start, 3)
+                    print "%s: %s answered after %.1fs" % (
+                        self.cv_host, self.PROBES[l_probe][1],
+                        self.cv_times[l_probe])
+                else:
+                    # later services will not be up before this one is
+                    break
+            if len(self.cv_times) == len(i_probes):
+                return dict(self.cv_times)
+
+            l_left = l_start + i_deadline - time.time()
+            if l_left <= 0:
+                l_missing = [self.PROBES[x][1] for x in i_probes
+                             if x not in self.cv_times]
+                l_msg = "%s: no answer to %s after %ds" % (
+                    self.cv_host, ', '.join(l_missing), i_deadline)
+                print l_msg
+                raise OpTestError(l_msg)
+            time.sleep(min(l_interval, l_left))
+            l_interval = min(l_interval * BMC_CONST.REACH_POLL_BACKOFF,
+                             BMC_CONST.REACH_POLL_MAX)
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestSEL.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSEL
+#  Incremental System Event Log reader
+#
+#  OpTestSEL keeps the 'ipmitool sel elist' entries, parsed into records by
+#  OpTestIPMIParser, indexed by sensor and by event. Each update() fetches
+#  the tail of the SEL with 'sel elist last <n>', n being one more than the
+#  number of new entries: the count from 'sel info', or the entries after the
+#  last record read when the native IPMI backend can list them. The tail must
+#  start with the last record read; when it does not (the SEL is full, or was
+#  cleared and refilled), the whole SEL is read again. An
+#  OpTestSELWatch polls in the background and reports the first fatal event
+#  (BMC_CONST.SEL_FATAL_EVENTS) as soon as it is logged, so a failed IPL can
+#  be stopped without waiting for the IPL timeout.
+
+import threading
+import collections
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+from OpTestIPMIParser import OpTestIPMIParser
+
+
+class OpTestSELWatch():
+
+    ##
+    # @brief Initialize this object, use OpTestSEL.watch() to create one
+    #
+    def __init__(self, i_sel, i_events, i_callback, i_interval):
+        self.cv_sel = i_sel
+        self.cv_events = i_events
+        self.cv_callback = i_callback
+        self.cv_interval = i_interval
+        # first fatal record seen
+        self.cv_fatal = None
+        self.cv_stop = threading.Event()
+        self.cv_thread = threading.Thread(target=self._poll)
+        self.cv_thread.daemon = True
+
+    def _poll(self):
+        while not self.cv_stop.wait(self.cv_interval):
+            try:
+                l_new = self.cv_sel.update()
+            except OpTestError:
+                continue
+            for l_record in l_new:
+                if [x for x in self.cv_events if x in l_record.event]:
+                    self.cv_fatal = l_record
+                    print "Fatal SEL entry: %s" % l_record.line
+                    if self.cv_callback is not None:
+                        self.cv_callback(l_record)
+                    return
+
+    ##
+    # @brief Raises if a fatal entry was logged
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def check(self):
+        if self.cv_fatal is not None:
+            l_msg = "Error log detected: %s" % self.cv_fatal.line.strip()
+            print l_msg
+            raise OpTestError(l_msg)
+        return BMC_CONST.FW_SUCCESS
+
+    def stop(self):
+        self.cv_stop.set()
+        if self.cv_thread is not threading.current_thread():
+            self.cv_thread.join()
+
+
+class OpTestSEL():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_run: function running an ipmitool command given its arguments,
+    #        e.g. 'sel info', and returning the output
+    # @param i_after: optional function returning the SEL entries logged after
+    #        a record ID, e.g. OpTestIPMILan.get_sel_entries
+    #
+    def __init__(self, i_run, i_after=None):
+        self.cv_run = i_run
+        self.cv_after = i_after
+        self.cv_lock = threading.Lock()
+        self.reset()
+
+    ##
+    # @brief Forgets all records, e.g. once the SEL was cleared
+    #
+    def reset(self):
+        with self.cv_lock:
+            self.cv_records = []
+            # last record read, the one the next update must start after
+            self.cv_last = None
+            self.cv_bySensor = collections.defaultdict(list)
+            self.cv_byEvent = collections.defaultdict(list)
+
+    ##
+    # @brief Reads the number of entries from 'sel info'
+    #
+    # @return int or raise OpTestError
+    #
+    def entries(self):
+        l_output = self.cv_run('sel info')
+        l_count = OpTestIPMIParser.sel_entries(l_output)
+        if l_count is None:
+            l_msg = "Can not read the SEL entry count: %s" % l_output.strip()
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_count
+
+    ##
+    # @brief Fetches the entries logged since the last update
+    #
+    # @return list of the new OpTestSELRecord, or raise OpTestError
+    #
+    def update(self):
+        with self.cv_lock:
+            l_last = self.cv_last
+            l_known = len(self.cv_records)
+        if l_last is None:
+            return self._reread(None)
+
+        l_window = None
+        if self.cv_after is not None:
+            try:
+                l_window = len(self.cv_after(l_last.id)) + 1
+            except OpTestError as e:
+                print "Native SEL read failed (%s), using sel info" % e
+            else:
+                if l_window == 1:
+                    return []
+        if l_window is None:
+            l_count = self.entries()
+            if l_count == 0:
+                self.reset()
+                return []
+            l_window = min(l_count, max(l_count - l_known, 0) + 1)
+
+        l_records = OpTestIPMIParser.sel(
+            self.cv_run('sel elist last %d' % l_window))
+        if l_records and l_records[0].line == l_last.line:
+            return self._add(l_records[1:])
+        return self._reread(l_last)
+
+    ##
+    # @brief Reads the whole SEL and keeps the records after i_last, or all
+    #        of them when i_last is no longer logged
+    #
+    def _reread(self, i_last):
+        l_records = OpTestIPMIParser.sel(self.cv_run('sel elist'))
+        l_lines = [x.line for x in l_records]
+        if i_last is not None and i_last.line in l_lines:
+            return self._add(l_records[l_lines.index(i_last.line) + 1:])
+        # the SEL was cleared, or wrapped past the last record read
+        self.reset()
+        return self._add(l_records)
+
+    def _add(self, i_records):
+        with self.cv_lock:
+            for l_record in i_records:
+                self.cv_records.append(l_record)
+                self.cv_bySensor[l_record.sensor].append(l_record)
+                self.cv_byEvent[l_record.event].append(l_record)
+            if i_records:
+                self.cv_last = i_records[-1]
+        return i_records
+
+    ##
+    # @brief Returns all the records read so far, oldest first
+    #
+    def records(self):
+        with self.cv_lock:
+            return list(self.cv_records)
+
+    ##
+    # @brief Returns the records of a sensor, e.g. 'Processor #0x01'
+    #
+    def by_sensor(self, i_sensor):
+        with self.cv_lock:
+            return list(self.cv_bySensor.get(i_sensor, []))
+
+    ##
+    # @brief Returns the records of an event, e.g.
+    #        'Transition to Non-recoverable'
+    #
+    def by_event(self, i_event):
+        with self.cv_lock:
+            return list(self.cv_byEvent.get(i_event, []))
+
+    ##
+    # @brief Returns the records whose event description contains a string
+    #
+    def find(self, i_text):
+        with self.cv_lock:
+            l_events = [x for x in self.cv_byEvent if i_text in x]
+            return [x for x in self.cv_records if x.event in l_events]
+
+    ##
+    # @brief Returns the records as 'sel elist' text
+    #
+    def dump(self):
+        with self.cv_lock:
+            return ''.join(x.line + '\n' for x in self.cv_records)
+
+    ##
+    # @brief Starts polling the SEL in the background for fatal events. The
+    #        entries logged so far are read first and do not count.
+    #
+    # @param i_events @type list: event descriptions that are fatal
+    # @param i_callback: optional function called with the fatal record, from
+    #        the watch thread
+    # @param i_interval @type float: seconds between polls
+    #
+    # @return OpTestSELWatch object, stop() it when done
+    #
+    def watch(self, i_events=BMC_CONST.SEL_FATAL_EVENTS, i_callback=None,
+              i_interval=BMC_CONST.SEL_WATCH_INTERVAL):
+        try:
+            self.update()
+        except OpTestError:
+            print "SEL not readable yet, all its entries will be checked"
+        l_watch = OpTestSELWatch(self, i_events, i_callback, i_interval)
+        l_watch.cv_thread.start()
+        return l_watch
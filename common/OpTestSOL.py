@@ -0,0 +1,371 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestSOL.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSOL
+#  In-process serial over LAN console reader
+#
+#  OpTestSOL runs 'ipmitool sol activate' under a pty and reads the console
+#  stream in a background thread. It keeps the most recent output in a bounded
+#  ring buffer, writes the log file in batches, and matches registered regular
+#  expressions (OpTestSOLWatch) against the stream as it arrives, so callers
+#  can wait on console milestones instead of sleeping and polling.
+
+import re
+import sys
+import time
+import threading
+import collections
+import pexpect
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+class OpTestSOLWatch():
+
+    ##
+    # @brief Initialize this object, use OpTestSOL.watch() to create one
+    #
+    # @param i_pattern @type string: regular expression to look for
+    # @param i_callback: optional function called as callback(watch, match)
+    #        from the reader thread, with watch.cv_offset set to the stream
+    #        offset of the match
+    # @param i_once @type bool: stop matching after the first match
+    # @param i_pos @type int: stream offset the matching starts from
+    # @param i_lock @type threading.Lock: lock of the OpTestSOL matching it
+    #
+    def __init__(self, i_pattern, i_callback, i_once, i_pos, i_lock):
+        self.cv_regex = re.compile(i_pattern)
+        self.cv_lock = i_lock
+        self.cv_callback = i_callback
+        self.cv_once = i_once
+        self.cv_pos = i_pos
+        self.cv_match = None
+        self.cv_time = None
+        self.cv_offset = None
+        self.cv_count = 0
+        self.cv_event = threading.Event()
+        self.cv_active = True
+
+    ##
+    # @brief Waits for the pattern to show up on the console
+    #
+    # @param i_timeout @type float: seconds to wait, None waits forever
+    #
+    # @return the re match object or None on timeout (or if the console
+    #         stream ended first)
+    #
+    def wait(self, i_timeout=None):
+        self.cv_event.wait(i_timeout)
+        return self.cv_match
+
+    def done(self):
+        return self.cv_event.is_set()
+
+    ##
+    # @brief Stops matching and wakes up wait(), which returns the match found
+    #        before, if any. It can be called from any thread.
+    #
+    def cancel(self):
+        with self.cv_lock:
+            self.cv_active = False
+            self.cv_event.set()
+
+
+class OpTestSOL():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: IPMI userid
+    # @param i_bmcPwd @type string: IPMI password
+    # @param i_logFile @type string: file the console output is written to
+    # @param i_echo @type bool: also copy the console output to stdout
+    # @param i_indexFile @type string: optional file where the arrival time
+    #        and log offset of every chunk read are written, one
+    #        '<epoch seconds> <offset>' line per chunk (see OpTestBootProfile)
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPwd, i_logFile=None,
+                 i_echo=True, i_indexFile=None):
+        self.cv_bmcIP = i_bmcIP
+        self.cv_cmd = 'ipmitool -H %s -I lanplus -U %s -P %s sol activate' \
+                      % (i_bmcIP, i_bmcUser, i_bmcPwd)
+        self.cv_logFile = i_logFile
+        self.cv_indexFile = i_indexFile
+        self.cv_echo = i_echo
+        self.cv_child = None
+        self.cv_thread = None
+        self.cv_running = False
+        self.cv_lock = threading.Lock()
+        # ring buffer of recent output chunks
+        self.cv_ring = collections.deque()
+        self.cv_ringSize = 0
+        # bytes received since start, and the tail kept for matching
+        self.cv_pos = 0
+        self.cv_window = ''
+        self.cv_windowPos = 0
+        self.cv_watches = []
+        self.cv_pending = []
+        self.cv_pendingIndex = []
+        self.cv_pendingSize = 0
+        self.cv_lastFlush = 0
+        self.cv_log = None
+        self.cv_index = None
+
+    ##
+    # @brief Starts the SOL session and the reader thread. The caller should
+    #        deactivate any SOL session left on the BMC first.
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def start(self):
+        if self.cv_running:
+            return BMC_CONST.FW_SUCCESS
+        try:
+            self._open_logs()
+            self.cv_child = pexpect.spawn(self.cv_cmd)
+        except (pexpect.ExceptionPexpect, IOError, OSError) as e:
+            l_msg = "sol capture Failed: %s" % e
+            print l_msg
+            raise OpTestError(l_msg)
+        self.cv_running = True
+        self.cv_lastFlush = time.time()
+        self.cv_thread = threading.Thread(target=self._reader)
+        self.cv_thread.daemon = True
+        self.cv_thread.start()
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Starts a capture fed by the caller instead of the reader thread,
+    #        e.g. from an event loop reading the ipmitool output itself (see
+    #        OpTestAsync). The console output is passed to feed() and the
+    #        capture ended with detach().
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def attach(self):
+        try:
+            self._open_logs()
+        except (IOError, OSError) as e:
+            l_msg = "sol capture Failed: %s" % e
+            print l_msg
+            raise OpTestError(l_msg)
+        self.cv_running = True
+        self.cv_lastFlush = time.time()
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Handles console output read by the caller, see attach()
+    #
+    def feed(self, i_data):
+        self._feed(i_data)
+
+    ##
+    # @brief Ends a capture started with attach()
+    #
+    def detach(self):
+        self._end()
+
+    ##
+    # @brief Stops the reader and the ipmitool process and flushes the log
+    #
+    def stop(self):
+        self.cv_running = False
+        if self.cv_child is not None:
+            try:
+                self.cv_child.close(force=True)
+            except (pexpect.ExceptionPexpect, OSError):
+                pass
+        if self.cv_thread is not None and \
+           self.cv_thread is not threading.current_thread():
+            self.cv_thread.join(BMC_CONST.SOL_READ_TIMEOUT * 4)
+
+    def alive(self):
+        return self.cv_thread is not None and self.cv_thread.is_alive()
+
+    ##
+    # @brief Registers a regular expression to look for in the console stream.
+    #        Only output received after this call is matched.
+    #
+    # @param i_pattern @type string: regular expression
+    # @param i_callback: optional function called as callback(watch, match)
+    #        from the reader thread on every match
+    # @param i_once @type bool: stop matching after the first match
+    #
+    # @return OpTestSOLWatch object
+    #
+    def watch(self, i_pattern, i_callback=None, i_once=True):
+        with self.cv_lock:
+            l_watch = OpTestSOLWatch(i_pattern, i_callback, i_once, self.cv_pos,
+                                     self.cv_lock)
+            if self.cv_thread is not None and not self.cv_running:
+                # the console stream already ended
+                l_watch.cv_event.set()
+            else:
+                self.cv_watches.append(l_watch)
+        return l_watch
+
+    ##
+    # @brief Waits for a regular expression on the console
+    #
+    # @return the re match object or None on timeout
+    #
+    def wait_for(self, i_pattern, i_timeout=None):
+        l_watch = self.watch(i_pattern)
+        try:
+            return l_watch.wait(i_timeout)
+        finally:
+            l_watch.cancel()
+
+    ##
+    # @brief Returns the most recent console output
+    #
+    # @param i_size @type int: number of bytes wanted, None for all that the
+    #        ring buffer holds
+    #
+    def recent(self, i_size=None):
+        with self.cv_lock:
+            l_data = ''.join(self.cv_ring)
+        if i_size is not None:
+            return l_data[-i_size:]
+        return l_data
+
+    def _reader(self):
+        try:
+            while self.cv_running:
+                try:
+                    l_data = self.cv_child.read_nonblocking(
+                        BMC_CONST.SOL_READ_SIZE, BMC_CONST.SOL_READ_TIMEOUT)
+                except pexpect.TIMEOUT:
+                    self._flush(False)
+                    continue
+                except (pexpect.EOF, OSError, ValueError):
+                    break
+                self._feed(l_data)
+        finally:
+            self._end()
+
+    def _open_logs(self):
+        if self.cv_logFile is not None:
+            self.cv_log = open(self.cv_logFile, 'w')
+        if self.cv_indexFile is not None:
+            self.cv_index = open(self.cv_indexFile, 'w')
+
+    ##
+    # @brief Flushes and closes the logs once the console stream ended
+    #
+    def _end(self):
+        self.cv_running = False
+        self._flush(True)
+        if self.cv_log is not None:
+            self.cv_log.close()
+            self.cv_log = None
+        if self.cv_index is not None:
+            self.cv_index.close()
+            self.cv_index = None
+        # wake up anyone still waiting, their wait() returns None
+        with self.cv_lock:
+            for l_watch in self.cv_watches:
+                l_watch.cv_event.set()
+            self.cv_watches = []
+
+    ##
+    # @brief Handles one chunk of console output
+    #
+    def _feed(self, i_data):
+        l_fire = []
+        with self.cv_lock:
+            self.cv_ring.append(i_data)
+            self.cv_ringSize += len(i_data)
+            while self.cv_ringSize > BMC_CONST.SOL_BUFFER_SIZE and \
+                  len(self.cv_ring) > 1:
+                self.cv_ringSize -= len(self.cv_ring.popleft())
+
+            self.cv_pos += len(i_data)
+            self.cv_window += i_data
+            l_trim = len(self.cv_window) - BMC_CONST.SOL_MATCH_WINDOW
+            if l_trim > 0:
+                self.cv_window = self.cv_window[l_trim:]
+                self.cv_windowPos += l_trim
+
+            for l_watch in self.cv_watches:
+                while l_watch.cv_active:
+                    l_start = max(l_watch.cv_pos - self.cv_windowPos, 0)
+                    l_match = l_watch.cv_regex.search(self.cv_window, l_start)
+                    if l_match is None:
+                        break
+                    l_watch.cv_pos = self.cv_windowPos + max(l_match.end(),
+                                                             l_start + 1)
+                    l_watch.cv_match = l_match
+                    l_watch.cv_time = time.time()
+                    l_watch.cv_count += 1
+                    l_fire.append((l_watch, l_match,
+                                   self.cv_windowPos + l_match.start()))
+                    if l_watch.cv_once:
+                        l_watch.cv_active = False
+            self.cv_watches = [w for w in self.cv_watches if w.cv_active]
+
+        self.cv_pendingIndex.append('%.3f %d\n' % (time.time(),
+                                                   self.cv_pos - len(i_data)))
+        self.cv_pending.append(i_data)
+        self.cv_pendingSize += len(i_data)
+        if self.cv_echo:
+            sys.stdout.write(i_data)
+        self._flush(False)
+
+        for l_watch, l_match, l_offset in l_fire:
+            l_watch.cv_event.set()
+            if l_watch.cv_callback is not None:
+                l_watch.cv_offset = l_offset
+                try:
+                    l_watch.cv_callback(l_watch, l_match)
+                except Exception as e:
+                    print "SOL watch callback for '%s' failed: %s" \
+                          % (l_watch.cv_regex.pattern, e)
+
+    ##
+    # @brief Writes the pending output to the log once enough of it is
+    #        buffered or enough time has passed
+    #
+    def _flush(self, i_force):
+        if not self.cv_pending:
+            return
+        if not i_force and \
+           self.cv_pendingSize < BMC_CONST.SOL_LOG_BATCH and \
+           time.time() - self.cv_lastFlush < BMC_CONST.SOL_LOG_INTERVAL:
+            return
+        if self.cv_log is not None:
+            self.cv_log.write(''.join(self.cv_pending))
+            self.cv_log.flush()
+        if self.cv_index is not None:
+            self.cv_index.write(''.join(self.cv_pendingIndex))
+            self.cv_index.flush()
+        if self.cv_echo:
+            sys.stdout.flush()
+        self.cv_pending = []
+        self.cv_pendingIndex = []
+        self.cv_pendingSize = 0
+        self.cv_lastFlush = time.time()
@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestSSHMaster.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSSHMaster
+#  Persistent multiplexed ssh connections
+#
+#  An OpTestSSHMaster logs into a host once with a password, leaving an
+#  OpenSSH ControlMaster running in the background. Every command is then run
+#  as a new channel over that connection ('ssh -o ControlPath=...'), which
+#  needs no TCP setup, key exchange or password prompt. The host is pinged
+#  once, when the master connection is set up, not once per command. Files
+#  can be copied with scp over the same connection.
+
+import os
+import sys
+import threading
+import subprocess
+import pexpect
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+from OpTestReachability import OpTestReachability
+from OpTestTempDir import private_dir
+
+# Master connections, one per (host, user)
+_masters = {}
+_mastersLock = threading.Lock()
+
+class OpTestSSHMaster():
+
+    SSH = '/usr/bin/ssh'
+    SCP = '/usr/bin/scp'
+
+    # Login output that means retrying will not help
+    LOGIN_ERRORS = [
+        ('Permission denied', "Wrong Login or Password"),
+        ('Connection refused', "Connection refused"),
+        ('Connection timed out', "Connection timed out"),
+        ('Name or service not known', "Please provide a valid Hostname"),
+        ('REMOTE HOST IDENTIFICATION HAS CHANGED', "Its a RSA key problem"),
+        ('POSSIBLE DNS SPOOFING DETECTED', "Its a RSA key problem"),
+        ('Bad owner or permissions on', "Bad owner or permissions on ssh config"),
+    ]
+
+    ##
+    # @brief Initialize this object. The connection is set up on the first
+    #        command.
+    #
+    # @param i_host @type string: IP Address or host name
+    # @param i_user @type string: Userid to log in with
+    # @param i_passwd @type string: Password of the userid
+    #
+    def __init__(self, i_host, i_user, i_passwd):
+        self.cv_host = i_host
+        self.cv_user = i_user
+        self.cv_passwd = i_passwd
+        # a private directory, since whoever owns the socket gets the commands
+        self.cv_controlPath = os.path.join(private_dir('optest-ssh'),
+                                           '%s@%s' % (i_user, i_host))
+        self.cv_lock = threading.Lock()
+        self.cv_up = False
+
+    ##
+    # @brief Returns the shared master connection for a host, creating the
+    #        object if needed
+    #
+    # @return OpTestSSHMaster object
+    #
+    @classmethod
+    def get_master(cls, i_host, i_user, i_passwd):
+        l_key = (i_host, i_user)
+        with _mastersLock:
+            if l_key not in _masters:
+                _masters[l_key] = cls(i_host, i_user, i_passwd)
+            return _masters[l_key]
+
+    ##
+    # @brief Returns the ssh options that route a connection through the master
+    #
+    def ssh_options(self):
+        return ['-o', 'ControlPath=' + self.cv_controlPath,
+                '-o', 'ControlMaster=no',
+                '-o', 'BatchMode=yes',
+                '-o', 'StrictHostKeyChecking=no',
+                '-l', self.cv_user]
+
+    ##
+    # @brief Checks whether the master connection is up
+    #
+    def alive(self):
+        l_null = open(os.devnull, 'w')
+        try:
+            l_rc = subprocess.call([self.SSH, '-O', 'check'] +
+                                   self.ssh_options() + [self.cv_host],
+                                   stdout=l_null, stderr=l_null)
+        finally:
+            l_null.close()
+        return l_rc == 0
+
+    ##
+    # @brief Pings the host and logs in, leaving the master connection running
+    #        in the background for BMC_CONST.LPAR_SSH_PERSIST seconds of
+    #        inactivity
+    #
+    # @return BMC_CONST.FW_SUCCESS or raise OpTestError
+    #
+    def start(self):
+        with self.cv_lock:
+            if self.cv_up or self.alive():
+                self.cv_up = True
+                return BMC_CONST.FW_SUCCESS
+
+            OpTestReachability(self.cv_host).wait(
+                ['icmp'], BMC_CONST.PING_RETRY_FOR_STABILITY *
+                BMC_CONST.LPAR_BRINGUP_TIME)
+
+            l_cmd = [self.SSH, '-2', '-k', '-M', '-N',
+                     '-o', 'ControlPath=' + self.cv_controlPath,
+                     '-o', 'ControlPersist=%d' % BMC_CONST.LPAR_SSH_PERSIST,
+                     '-o', 'StrictHostKeyChecking=no',
+                     '-o', 'NumberOfPasswordPrompts=1',
+                     '-l', self.cv_user, self.cv_host]
+            l_patterns = ['\(yes/no\)', '[Pp]assword:'] + \
+                         [x[0] for x in self.LOGIN_ERRORS] + [pexpect.EOF]
+            try:
+                l_child = pexpect.spawn(l_cmd[0], l_cmd[1:])
+                while True:
+                    l_index = l_child.expect(l_patterns,
+                                             timeout=BMC_CONST.LPAR_SSH_LOGIN_TIMEOUT)
+                    if l_index == 0:
+                        l_child.sendline('yes')
+                    elif l_index == 1:
+                        l_child.sendline(self.cv_passwd)
+                    elif l_index < len(l_patterns) - 1:
+                        l_msg = "SSH to %s failed: %s" \
+                                % (self.cv_host, self.LOGIN_ERRORS[l_index - 2][1])
+                        print l_msg
+                        l_child.close(force=True)
+                        raise OpTestError(l_msg)
+                    else:
+                        # the master went to the background after the login
+                        break
+                l_child.close()
+            except pexpect.ExceptionPexpect as e:
+                l_msg = "SSH to %s failed: %s" % (self.cv_host, e)
+                print l_msg
+                raise OpTestError(l_msg)
+
+            if not self.alive():
+                l_msg = "SSH master connection to %s did not come up" % self.cv_host
+                print l_msg
+                raise OpTestError(l_msg)
+            self.cv_up = True
+        return BMC_CONST.FW_SUCCESS
+
+    ##
+    # @brief Stops the master connection
+    #
+    def stop(self):
+        self.cv_up = False
+        l_null = open(os.devnull, 'w')
+        try:
+            subprocess.call([self.SSH, '-O', 'exit'] + self.ssh_options() +
+                            [self.cv_host], stdout=l_null, stderr=l_null)
+        finally:
+            l_null.close()
+
+    ##
+    # @brief Starts a process on the host over the master connection
+    #
+    # @param i_cmd @type string: command line run by the remote shell
+    #
+    # @return subprocess.Popen object, or raise OpTestError
+    #
+    def popen(self, i_cmd, stdin=None, stdout=subprocess.PIPE,
+              stderr=subprocess.STDOUT):
+        self.start()
+        return subprocess.Popen([self.SSH] + self.ssh_options() +
+                                [self.cv_host, i_cmd],
+                                stdin=stdin, stdout=stdout, stderr=stderr)
+
+    ##
+    # @brief Runs a command on the host over the master connection. If the
+    #        connection dropped it is set up again and the command retried once.
+    #
+    # @param i_cmd @type string: command line run by the remote shell
+    # @param i_timeout @type int: seconds after which the command is killed,
+    #        None to wait forever
+    #
+    # @return (exit code, output) tuple or raise OpTestError
+    #
+    def run(self, i_cmd, i_timeout=None):
+        for l_try in range(2):
+            # Flush everything out prior to forking
+            sys.stdout.flush()
+            l_proc = self.popen(i_cmd)
+            l_killed = []
+            def kill():
+                l_killed.append(True)
+                l_proc.kill()
+            l_timer = None
+            if i_timeout is not None:
+                l_timer = threading.Timer(i_timeout, kill)
+                l_timer.start()
+            try:
+                l_output = l_proc.communicate()[0]
+            finally:
+                if l_timer is not None:
+                    l_timer.cancel()
+            if l_killed:
+                l_msg = "Timeout occured/SSH request un-responded " \
+                        "after %d seconds: %s" % (i_timeout, i_cmd)
+                print l_msg
+                raise OpTestError(l_msg)
+            # 255 is what ssh exits with when the connection failed
+            if l_proc.returncode != 255 or self.alive():
+                return l_proc.returncode, l_output
+            self.cv_up = False
+            if l_try == 0:
+                print "SSH master connection to %s dropped, reconnecting" \
+                      % self.cv_host
+
+        l_msg = "SSH to %s failed running '%s': %s" % (self.cv_host, i_cmd,
+                                                       l_output)
+        print l_msg
+        raise OpTestError(l_msg)
+
+    ##
+    # @brief Copies a local file to the host with scp over the master
+    #        connection
+    #
+    # @param i_local @type string: local file
+    # @param i_remote @type string: destination path on the host
+    # @param i_timeout @type int: seconds after which scp is killed,
+    #        None to wait forever
+    #
+    # @return (exit code, output) tuple or raise OpTestError on a timeout
+    #
+    def scp(self, i_local, i_remote, i_timeout=None):
+        self.start()
+        # scp takes '-l' as a bandwidth limit, the user goes in the target
+        l_cmd = [self.SCP, '-q',
+                 '-o', 'ControlPath=' + self.cv_controlPath,
+                 '-o', 'ControlMaster=no',
+                 '-o', 'BatchMode=yes',
+                 '-o', 'StrictHostKeyChecking=no',
+                 i_local, '%s@%s:%s' % (self.cv_user, self.cv_host, i_remote)]
+        sys.stdout.flush()
+        l_proc = subprocess.Popen(l_cmd, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT)
+        l_killed = []
+        def kill():
+            l_killed.append(True)
+            l_proc.kill()
+        l_timer = None
+        if i_timeout is not None:
+            l_timer = threading.Timer(i_timeout, kill)
+            l_timer.start()
+        try:
+            l_output = l_proc.communicate()[0]
+        finally:
+            if l_timer is not None:
+                l_timer.cancel()
+        if l_killed:
+            l_msg = "scp of %s to %s timed out after %d seconds" % (
+                i_local, self.cv_host, i_timeout)
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_proc.returncode, l_output
@@ -0,0 +1,265 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestSSHPool.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSSHPool
+#  Reusable logged in BMC shells
+#
+#  An OpTestSSHSession keeps one pxssh login to the BMC open and runs commands
+#  in it. Every command is framed by a begin marker and an end marker carrying
+#  its exit code, so the output and the return code are read back reliably
+#  without depending on the busybox prompt. Several commands can be written at
+#  once and their results read back in one round trip. OpTestSSHPool hands out
+#  a bounded number of sessions per BMC, checks idle ones before reuse and
+#  logs in again when a session dropped.
+
+import os
+import re
+import sys
+import time
+import threading
+import pexpect
+try:
+    import pxssh
+except ImportError:
+    from pexpect import pxssh
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+# Session pools, one per (bmc ip, user)
+_pools = {}
+_poolsLock = threading.Lock()
+
+class OpTestSSHSession():
+
+    ##
+    # @brief Initialize this object. The login happens on the first command.
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: Userid to log into the BMC
+    # @param i_bmcPasswd @type string: Password of the userid
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPasswd):
+        self.cv_bmcIP = i_bmcIP
+        self.cv_bmcUser = i_bmcUser
+        self.cv_bmcPasswd = i_bmcPasswd
+        self.cv_child = None
+        self.cv_count = 0
+        self.cv_lastUsed = 0
+
+    def _login(self):
+        self.close()
+
+        ''' Add -k to the SSH options '''
+        hostname = self.cv_bmcIP + " -k"
+        try:
+            p = pxssh.pxssh()
+            p.logfile_read = sys.stdout
+            p.PROMPT = '# '
+
+            ''' login but do not try to change the prompt since the AMI bmc
+                busybox does support it '''
+            p.login(hostname, self.cv_bmcUser, self.cv_bmcPasswd,
+                    auto_prompt_reset=False)
+            p.sendline()
+            p.prompt(timeout=BMC_CONST.BMC_SSH_LOGIN_TIMEOUT)
+        except (pexpect.ExceptionPexpect, OSError) as e:
+            l_msg = "Login to BMC %s failed: %s" % (self.cv_bmcIP, e)
+            print l_msg
+            raise OpTestError(l_msg)
+        print 'At BMC %s prompt...' % self.cv_bmcIP
+        self.cv_child = p
+        self.cv_lastUsed = time.time()
+
+    ##
+    # @brief Logs out and closes the connection
+    #
+    def close(self):
+        if self.cv_child is not None:
+            try:
+                if self.cv_child.isalive():
+                    self.cv_child.sendline('exit')
+                self.cv_child.close(force=True)
+            except (pexpect.ExceptionPexpect, OSError):
+                pass
+            self.cv_child = None
+
+    ##
+    # @brief Checks that the shell still answers
+    #
+    # @return True if the session is usable
+    #
+    def alive(self):
+        if self.cv_child is None or not self.cv_child.isalive():
+            return False
+        try:
+            self._send([':'], BMC_CONST.BMC_SSH_CHECK_TIMEOUT)
+        except (pexpect.ExceptionPexpect, OSError):
+            self.close()
+            return False
+        return True
+
+    ##
+    # @brief Writes the framed commands and reads back their results
+    #
+    # @return list of (rc, output) tuples, raises pexpect exceptions
+    #
+    def _send(self, i_cmds, i_timeout):
+        self.cv_count += 1
+        l_tag = '__OPTEST_%d_%d' % (os.getpid(), self.cv_count)
+        for l_index, l_cmd in enumerate(i_cmds):
+            # the echoed input holds '$?', only the real output holds digits
+            self.cv_child.sendline('echo %s_B%d__; %s\necho %s_E%d__ $?'
+                                   % (l_tag, l_index, l_cmd, l_tag, l_index))
+
+        l_results = []
+        for l_index in range(len(i_cmds)):
+            self.cv_child.expect(r'%s_E%d__ (\d+)' % (l_tag, l_index),
+                                 timeout=i_timeout)
+            l_rc = int(self.cv_child.match.group(1))
+            l_text = self.cv_child.before.replace('\r', '')
+            l_begin = '\n%s_B%d__\n' % (l_tag, l_index)
+            l_pos = l_text.find(l_begin)
+            if l_pos >= 0:
+                l_text = l_text[l_pos + len(l_begin):]
+            # drop the echoed input lines, which all carry the marker tag
+            l_lines = [x for x in l_text.split('\n') if l_tag not in x]
+            # and the prompt printed after the command
+            if l_lines:
+                l_lines[-1] = re.sub(r'# ?$', '', l_lines[-1])
+                if not l_lines[-1].strip():
+                    l_lines.pop()
+            l_text = '\n'.join(l_lines)
+            if l_text:
+                l_text += '\n'
+            l_results.append((l_rc, l_text))
+        self.cv_lastUsed = time.time()
+        return l_results
+
+    ##
+    # @brief Runs commands in the shell, logging in first if needed
+    #
+    # @param i_cmds @type list: shell commands
+    # @param i_timeout @type int: seconds to wait for each command
+    #
+    # @return list of (rc, output) tuples or raise OpTestError
+    #
+    def run(self, i_cmds, i_timeout=30):
+        if self.cv_child is None or not self.cv_child.isalive():
+            self._login()
+        try:
+            return self._send(i_cmds, i_timeout)
+        except pexpect.TIMEOUT:
+            self.close()
+            l_msg = "BMC %s command timed out: %s" % (self.cv_bmcIP, i_cmds)
+            print l_msg
+            raise OpTestError(l_msg)
+        except (pexpect.ExceptionPexpect, OSError) as e:
+            self.close()
+            l_msg = "BMC %s session lost running %s: %s" \
+                    % (self.cv_bmcIP, i_cmds, e)
+            print l_msg
+            raise OpTestError(l_msg)
+
+
+class OpTestSSHPool():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_bmcIP @type string: IP Address of the BMC
+    # @param i_bmcUser @type string: Userid to log into the BMC
+    # @param i_bmcPasswd @type string: Password of the userid
+    # @param i_sessions @type int: maximum number of concurrent sessions
+    #
+    def __init__(self, i_bmcIP, i_bmcUser, i_bmcPasswd,
+                 i_sessions=BMC_CONST.BMC_SSH_SESSIONS):
+        self.cv_bmcIP = i_bmcIP
+        self.cv_bmcUser = i_bmcUser
+        self.cv_bmcPasswd = i_bmcPasswd
+        self.cv_max = i_sessions
+        self.cv_idle = []
+        self.cv_count = 0
+        self.cv_cond = threading.Condition()
+
+    ##
+    # @brief Returns the shared pool for a BMC, creating it if needed
+    #
+    # @return OpTestSSHPool object
+    #
+    @classmethod
+    def get_pool(cls, i_bmcIP, i_bmcUser, i_bmcPasswd):
+        l_key = (i_bmcIP, i_bmcUser)
+        with _poolsLock:
+            if l_key not in _pools:
+                _pools[l_key] = cls(i_bmcIP, i_bmcUser, i_bmcPasswd)
+            return _pools[l_key]
+
+    def _acquire(self):
+        with self.cv_cond:
+            while not self.cv_idle and self.cv_count >= self.cv_max:
+                self.cv_cond.wait()
+            if self.cv_idle:
+                l_session = self.cv_idle.pop()
+            else:
+                self.cv_count += 1
+                l_session = None
+        if l_session is None:
+            return OpTestSSHSession(self.cv_bmcIP, self.cv_bmcUser,
+                                    self.cv_bmcPasswd)
+        # sessions idle for a while may have been dropped by the BMC
+        if time.time() - l_session.cv_lastUsed > BMC_CONST.BMC_SSH_IDLE_CHECK \
+           and not l_session.alive():
+            print "BMC %s session dropped, logging in again" % self.cv_bmcIP
+        return l_session
+
+    def _release(self, i_session):
+        with self.cv_cond:
+            self.cv_idle.append(i_session)
+            self.cv_cond.notify()
+
+    ##
+    # @brief Runs commands on an idle session of the pool, all written at once
+    #
+    # @param i_cmds @type list: shell commands
+    # @param i_timeout @type int: seconds to wait for each command
+    #
+    # @return list of (rc, output) tuples or raise OpTestError
+    #
+    def run(self, i_cmds, i_timeout=30):
+        l_session = self._acquire()
+        try:
+            return l_session.run(i_cmds, i_timeout)
+        finally:
+            self._release(l_session)
+
+    ##
+    # @brief Closes all idle sessions, e.g. once the BMC is rebooting
+    #
+    def close(self):
+        with self.cv_cond:
+            for l_session in self.cv_idle:
+                l_session.close()
@@ -0,0 +1,319 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestSampler.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestSampler
+#  Background sensor time series
+#
+#  An OpTestSampler reads a set of sensors at a fixed rate from a thread, while
+#  the test goes on with any OpTestSystem operation. Each poll reads only the
+#  chosen sensors, with OpTestIPMI.ipmi_sensor_values: over the native or shell
+#  IPMI backend session when one is configured, else with one 'ipmitool sensor
+#  reading' that finds them in the local SDR cache (OpTestIPMI.ipmi_sdr_cache).
+#
+#  Samples go to a chain of fixed size ring buffers (array.array of doubles,
+#  one row of sensor values per sample): the first tier keeps every sample,
+#  each following tier keeps the average of a number of samples of the tier
+#  before it (BMC_CONST.SAMPLER_TIERS). Old data gets coarser instead of being
+#  dropped or kept per sample, so the memory used is set when the sampler is
+#  made and stays the same however long it runs. The time series is written
+#  as CSV, or as NPZ when NumPy is installed; the times are epoch seconds, like
+#  the SOL arrival times the boot profile is built from.
+
+import csv
+import math
+import time
+import array
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+NAN = float('nan')
+
+
+##
+# One ring buffer of the sampler: i_capacity rows of a time and i_width sensor
+# values, each row the average of i_factor rows of the tier below
+#
+class _SamplerTier():
+
+    def __init__(self, i_capacity, i_width, i_factor):
+        self.cv_capacity = i_capacity
+        self.cv_width = i_width
+        self.cv_factor = i_factor
+        self.cv_times = array.array('d', [NAN]) * i_capacity
+        self.cv_values = array.array('d', [NAN]) * (i_capacity * i_width)
+        # next row written, rows written so far (up to the capacity)
+        self.cv_next = 0
+        self.cv_count = 0
+        # sum and count of the rows of the tier below not averaged yet
+        self.cv_accTime = 0.0
+        self.cv_accRows = 0
+        self.cv_accSums = array.array('d', [0.0]) * i_width
+        self.cv_accCounts = array.array('l', [0]) * i_width
+
+    def append(self, i_time, i_values):
+        l_base = self.cv_next * self.cv_width
+        self.cv_times[self.cv_next] = i_time
+        self.cv_values[l_base:l_base + self.cv_width] = i_values
+        self.cv_next = (self.cv_next + 1) % self.cv_capacity
+        self.cv_count = min(self.cv_count + 1, self.cv_capacity)
+
+    ##
+    # @brief Adds a row of the tier below to the running average
+    #
+    # @return (time, values) of the average once i_factor rows were added,
+    #         else None
+    #
+    def accumulate(self, i_time, i_values):
+        self.cv_accTime += i_time
+        self.cv_accRows += 1
+        for l_index in range(self.cv_width):
+            l_value = i_values[l_index]
+            if not math.isnan(l_value):
+                self.cv_accSums[l_index] += l_value
+                self.cv_accCounts[l_index] += 1
+        if self.cv_accRows < self.cv_factor:
+            return None
+
+        l_time = self.cv_accTime / self.cv_accRows
+        l_values = array.array('d', [NAN]) * self.cv_width
+        for l_index in range(self.cv_width):
+            if self.cv_accCounts[l_index]:
+                l_values[l_index] = self.cv_accSums[l_index] / \
+                                    self.cv_accCounts[l_index]
+            self.cv_accSums[l_index] = 0.0
+            self.cv_accCounts[l_index] = 0
+        self.cv_accTime = 0.0
+        self.cv_accRows = 0
+        self.append(l_time, l_values)
+        return (l_time, l_values)
+
+    ##
+    # @brief Returns the rows, oldest first
+    #
+    # @return list of (time, list of values)
+    #
+    def rows(self):
+        l_rows = []
+        l_first = (self.cv_next - self.cv_count) % self.cv_capacity
+        for l_row in range(self.cv_count):
+            l_pos = (l_first + l_row) % self.cv_capacity
+            l_base = l_pos * self.cv_width
+            l_rows.append((self.cv_times[l_pos],
+                           self.cv_values[l_base:l_base + self.cv_width].tolist()))
+        return l_rows
+
+
+class OpTestSampler():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_ipmi @type OpTestIPMI: IPMI object of the system
+    # @param i_sensors @type list: sensor names, as in 'sdr list'
+    # @param i_interval @type float: seconds between two polls
+    # @param i_tiers @type list: (rows, factor) of each ring buffer, the
+    #        factor being the number of rows of the tier before averaged in
+    #        one row (1 for the first tier)
+    #
+    def __init__(self, i_ipmi, i_sensors,
+                 i_interval=BMC_CONST.SAMPLER_INTERVAL,
+                 i_tiers=BMC_CONST.SAMPLER_TIERS):
+        if not i_sensors:
+            raise OpTestError("No sensors to sample")
+        self.cv_IPMI = i_ipmi
+        self.cv_sensors = list(i_sensors)
+        self.cv_index = dict((x, i) for i, x in enumerate(self.cv_sensors))
+        self.cv_interval = i_interval
+        self.cv_tiers = [_SamplerTier(l_rows, len(self.cv_sensors), l_factor)
+                         for l_rows, l_factor in i_tiers]
+        self.cv_lock = threading.Lock()
+        self.cv_stop = threading.Event()
+        self.cv_thread = None
+        self.cv_samples = 0
+        self.cv_errors = 0
+
+    ##
+    # @brief Starts polling in the background
+    #
+    # @return this object, stop() it when done
+    #
+    def start(self):
+        if self.cv_thread is not None:
+            return self
+        # dumps the SDR repository now rather than on the first poll
+        self.cv_IPMI.ipmi_sdr_cache()
+        self.cv_stop.clear()
+        self.cv_thread = threading.Thread(target=self._poll)
+        self.cv_thread.daemon = True
+        self.cv_thread.start()
+        return self
+
+    def stop(self):
+        self.cv_stop.set()
+        if self.cv_thread is not None:
+            self.cv_thread.join()
+            self.cv_thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, i_type, i_value, i_tb):
+        self.stop()
+
+    def _poll(self):
+        l_next = time.time()
+        while not self.cv_stop.is_set():
+            try:
+                self.sample()
+            except OpTestError:
+                self.cv_errors += 1
+            # fixed rate: polls that fall behind are skipped, not bunched up
+            l_next += self.cv_interval
+            l_now = time.time()
+            if l_next < l_now:
+                l_next += math.ceil((l_now - l_next) / self.cv_interval) * \
+                          self.cv_interval
+            self.cv_stop.wait(l_next - l_now)
+
+    ##
+    # @brief Reads the sensors once and stores the sample
+    #
+    # @return list of the values, NaN for sensors without a reading
+    #
+    def sample(self):
+        l_time = time.time()
+        l_values = self.read()
+        self.add(l_time, l_values)
+        return l_values.tolist()
+
+    ##
+    # @brief Reads the sensors
+    #
+    # @return array.array of the values, NaN for sensors without a reading
+    #
+    def read(self):
+        l_readings = self.cv_IPMI.ipmi_sensor_values(self.cv_sensors)
+
+        l_values = array.array('d', [NAN]) * len(self.cv_sensors)
+        l_found = False
+        for l_name, l_value in l_readings.items():
+            l_index = self.cv_index.get(l_name)
+            if l_index is None:
+                continue
+            l_found = True
+            if l_value is not None:
+                l_values[l_index] = l_value
+        if not l_found:
+            l_msg = "No sensor reading from %s" % self.cv_IPMI.cv_bmcIP
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_values
+
+    ##
+    # @brief Stores a sample in the first tier and the averages it completes
+    #        in the following ones
+    #
+    # @param i_time @type float: epoch seconds
+    # @param i_values: one value per sensor
+    #
+    def add(self, i_time, i_values):
+        if len(i_values) != len(self.cv_sensors):
+            raise OpTestError("A sample needs %d values"
+                              % len(self.cv_sensors))
+        l_row = (i_time, array.array('d', i_values))
+        with self.cv_lock:
+            self.cv_samples += 1
+            self.cv_tiers[0].append(*l_row)
+            for l_tier in self.cv_tiers[1:]:
+                l_row = l_tier.accumulate(*l_row)
+                if l_row is None:
+                    break
+
+    ##
+    # @brief Returns the time series, oldest first. Without a tier the tiers
+    #        are merged: each tier only gives the rows older than the oldest
+    #        row of the finer tiers.
+    #
+    # @param i_tier @type int: tier to return, 0 being the finest
+    #
+    # @return list of (time, list of values)
+    #
+    def series(self, i_tier=None):
+        with self.cv_lock:
+            if i_tier is not None:
+                return self.cv_tiers[i_tier].rows()
+            l_rows = []
+            l_oldest = None
+            for l_tier in self.cv_tiers:
+                l_tierRows = l_tier.rows()
+                if l_oldest is not None:
+                    l_tierRows = [x for x in l_tierRows if x[0] < l_oldest]
+                if l_tierRows:
+                    l_oldest = l_tierRows[0][0]
+                l_rows = l_tierRows + l_rows
+            return l_rows
+
+    ##
+    # @brief Writes the time series as CSV: a time column (epoch seconds)
+    #        and one column per sensor, empty for a missing value
+    #
+    # @param i_path @type string: file written
+    # @param i_tier @type int: see series()
+    #
+    def write_csv(self, i_path, i_tier=None):
+        with open(i_path, 'wb') as f:
+            l_writer = csv.writer(f)
+            l_writer.writerow(['time'] + self.cv_sensors)
+            for l_time, l_values in self.series(i_tier):
+                l_writer.writerow(['%.3f' % l_time] +
+                                  ['' if math.isnan(x) else '%g' % x
+                                   for x in l_values])
+
+    ##
+    # @brief Writes the time series as NumPy arrays: 'time' (N,), 'values'
+    #        (N, sensors) with NaN for a missing value, and 'sensors'
+    #
+    # @param i_path @type string: file written
+    # @param i_tier @type int: see series()
+    #
+    def write_npz(self, i_path, i_tier=None):
+        if numpy is None:
+            raise OpTestError("NPZ export needs the numpy module")
+        l_rows = self.series(i_tier)
+        l_values = numpy.array([x[1] for x in l_rows], dtype=numpy.float64)
+        numpy.savez(i_path,
+                    time=numpy.array([x[0] for x in l_rows],
+                                     dtype=numpy.float64),
+                    values=l_values.reshape(len(l_rows),
+                                            len(self.cv_sensors)),
+                    sensors=numpy.array(self.cv_sensors))
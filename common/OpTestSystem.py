@@ -35,6 +35,7 @@ import subprocess
 
 from OpTestBMC import OpTestBMC
 from OpTestIPMI import OpTestIPMI
+from OpTestSampler import OpTestSampler
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
 from OpTestLpar import OpTestLpar
@@ -54,13 +55,15 @@ class OpTestSystem():
     # @param i_lparIP The IP address of the LPAR
     # @param i_lparuser The userid to log into the LPAR
     # @param i_lparPasswd The password of the userid to log into the LPAR with
+    # @param i_ipmiBackend Optional IPMI backend, see OpTestIPMI
     #
     def __init__(self, i_bmcIP, i_bmcUser, i_bmcPasswd,
                  i_bmcUserIpmi,i_bmcPasswdIpmi,i_ffdcDir=None, i_lparip=None,
-                 i_lparuser=None, i_lparPasswd=None):
+                 i_lparuser=None, i_lparPasswd=None,
+                 i_ipmiBackend=BMC_CONST.IPMI_BACKEND_IPMITOOL):
         self.cv_BMC = OpTestBMC(i_bmcIP,i_bmcUser,i_bmcPasswd,i_ffdcDir)
         self.cv_IPMI = OpTestIPMI(i_bmcIP,i_bmcUserIpmi,i_bmcPasswdIpmi,
-                                  i_ffdcDir)
+                                  i_ffdcDir, i_ipmiBackend)
         self.cv_LPAR = OpTestLpar(i_lparip, i_lparuser, i_lparPasswd)
         self.util = OpTestUtil()
 
@@ -164,6 +167,19 @@ class OpTestSystem():
             return BMC_CONST.FW_FAILED
         return rc
 
+    ##
+    # @brief Write the boot milestone timing profile of the last IPL. The
+    #        profile is only a report: a missing one is a warning.
+    #
+    # @return BMC_CONST.FW_SUCCESS
+    #
+    def sys_boot_profile(self):
+        try:
+            self.cv_IPMI.ipmi_boot_profile()
+        except OpTestError as e:
+            print "Warning: no boot profile written: %s" % e
+        return BMC_CONST.FW_SUCCESS
+
     ##
     # @brief get all SDR's in the System
     #
@@ -176,6 +192,23 @@ class OpTestSystem():
             return BMC_CONST.FW_FAILED
         return rc
 
+    ##
+    # @brief Starts sampling sensors in the background, e.g. around an IPL:
+    #
+    #     with l_system.sys_sensor_sampler(['CPU Temp', 'Fan 1']) as l_sampler:
+    #         l_system.sys_power_on()
+    #         l_system.sys_ipl_wait_for_working_state()
+    #     l_sampler.write_csv(l_ffdcDir + '/sensors.csv')
+    #
+    # @param i_sensors @type list: sensor names
+    # @param i_interval @type float: seconds between two polls
+    #
+    # @return started OpTestSampler, stop() it when done
+    #
+    def sys_sensor_sampler(self, i_sensors,
+                           i_interval=BMC_CONST.SAMPLER_INTERVAL):
+        return OpTestSampler(self.cv_IPMI, i_sensors, i_interval).start()
+
 
     ############################################################################
     # BMC Interfaces
@@ -289,6 +322,7 @@ class OpTestSystem():
             self.sys_bmc_validate_lpar()
             self.cv_IPMI.ipmi_cold_reset()
             self.cv_IPMI.ipmi_preserve_network_setting()
+            self.cv_IPMI.ipmi_flash_manifest_invalidate()
             self.cv_LPAR.lpar_code_update(i_image, BMC_CONST.BMC_PNOR_IMAGE_UPDATE)
         except OpTestError as e:
             return BMC_CONST.FW_FAILED
@@ -309,6 +343,7 @@ class OpTestSystem():
             self.sys_bmc_validate_lpar()
             self.cv_IPMI.ipmi_cold_reset()
             self.cv_IPMI.ipmi_preserve_network_setting()
+            self.cv_IPMI.ipmi_flash_manifest_invalidate()
             self.cv_LPAR.lpar_code_update(i_image, BMC_CONST.BMC_FWANDPNOR_IMAGE_UPDATE)
         except OpTestError as e:
             return BMC_CONST.FW_FAILED
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestTempDir.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+
+## @package OpTestTempDir
+#  Per user temporary directories
+#
+#  Sockets and state files with a predictable name must not go straight into
+#  a world writable directory like /tmp, where another local user could
+#  create them first, e.g. an ssh ControlPath socket that would then receive
+#  every command. They go to <tmp>/<name>-<uid> instead, which is created
+#  only accessible to this user and refused if anybody else could write to it.
+
+import os
+import errno
+import tempfile
+
+from OpTestError import OpTestError
+
+
+##
+# @brief Returns a directory of the temporary directory only this user can
+#        access, creating it if needed
+#
+# @param i_name @type string: directory name prefix, e.g. 'optest-ssh'
+#
+# @return path or raise OpTestError
+#
+def private_dir(i_name):
+    l_dir = os.path.join(tempfile.gettempdir(), '%s-%d' % (i_name, os.getuid()))
+    try:
+        os.mkdir(l_dir, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    l_stat = os.lstat(l_dir)
+    if l_stat.st_uid != os.getuid() or l_stat.st_mode & 077 or \
+       not os.path.isdir(l_dir) or os.path.islink(l_dir):
+        l_msg = "%s is not a private directory of this user" % l_dir
+        print l_msg
+        raise OpTestError(l_msg)
+    return l_dir
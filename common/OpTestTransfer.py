@@ -0,0 +1,321 @@
+#!/usr/bin/python
+# IBM_PROLOG_BEGIN_TAG
+# This is an automatically generated prolog.
+#
+# $Source: op-auto-test/common/OpTestTransfer.py $
+#
+# OpenPOWER Automated Test Project
+#
+# Contributors Listed Below - COPYRIGHT 2015
+# [+] International Business Machines Corp.
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# IBM_PROLOG_END_TAG
+
+## @package OpTestTransfer
+#  Streaming file transfer over a persistent ssh connection
+#
+#  OpTestTransfer copies a local file to a host by streaming it in large
+#  chunks into 'cat' running over an OpTestSSHMaster connection. A partial
+#  copy left by an earlier attempt is resumed when its content matches the
+#  start of the local file, progress is reported per chunk, and the md5sum of
+#  the copy is checked against the local file at the end. Images that are
+#  mostly erased flash can be sent sparse (only the non 0xFF extents, written
+#  in place with dd) or gzip compressed.
+
+import os
+import sys
+import pipes
+import zlib
+import hashlib
+import subprocess
+
+from OpTestConstants import OpTestConstants as BMC_CONST
+from OpTestError import OpTestError
+
+class OpTestTransfer():
+
+    ##
+    # @brief Initialize this object
+    #
+    # @param i_master @type OpTestSSHMaster: connection to the destination
+    # @param i_chunk @type int: bytes read and written at a time
+    #
+    def __init__(self, i_master, i_chunk=BMC_CONST.TRANSFER_CHUNK):
+        self.cv_master = i_master
+        self.cv_chunk = i_chunk
+
+    ##
+    # @brief Runs a command on the destination and returns its output
+    #
+    # @return output string or raise OpTestError on a non zero exit code
+    #
+    def _run(self, i_cmd):
+        l_rc, l_output = self.cv_master.run(i_cmd)
+        if l_rc != 0:
+            l_msg = "'%s' failed on %s (rc %d): %s" % (
+                i_cmd, self.cv_master.cv_host, l_rc, l_output.strip())
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_output
+
+    ##
+    # @brief Returns the size of a file on the destination, 0 if it is missing
+    #
+    def remote_size(self, i_path):
+        l_path = pipes.quote(i_path)
+        l_output = self._run('if [ -f %s ]; then wc -c < %s; else echo 0; fi'
+                             % (l_path, l_path))
+        try:
+            return int(l_output.split()[-1])
+        except (ValueError, IndexError):
+            raise OpTestError("Can not read the size of %s on %s: %s"
+                              % (i_path, self.cv_master.cv_host, l_output))
+
+    ##
+    # @brief Returns the md5sum of a file on the destination, or of its first
+    #        i_size bytes
+    #
+    def remote_md5(self, i_path, i_size=None):
+        l_path = pipes.quote(i_path)
+        if i_size is None:
+            l_output = self._run('md5sum < %s' % l_path)
+        else:
+            l_output = self._run('head -c %d %s | md5sum' % (i_size, l_path))
+        return l_output.split()[0]
+
+    ##
+    # @brief Default progress callback, prints every 10%
+    #
+    def print_progress(self, i_sent, i_total):
+        l_step = max(i_total / 10, 1)
+        if i_sent == i_total or i_sent / l_step != (i_sent - self.cv_chunk) / l_step:
+            print "%d%% %d/%d bytes" % (i_sent * 100 / max(i_total, 1),
+                                        i_sent, i_total)
+            sys.stdout.flush()
+
+    ##
+    # @brief Streams bytes of a local file into a command run on the
+    #        destination
+    #
+    # @param i_cmd @type string: command reading the data on its stdin
+    # @param i_file: local file object, read from its current position
+    # @param i_length @type int: bytes to send, None for all up to the end
+    # @param i_md5: optional hashlib object updated with the bytes read
+    # @param i_progress: optional progress(sent, total) callback
+    # @param i_done @type int: bytes already counted as sent in the progress
+    # @param i_total @type int: total bytes for the progress
+    # @param i_remote @type string: destination file, for messages
+    # @param i_encode: optional compressobj the data is passed through
+    #
+    # @return (bytes read from the file, bytes written to the connection)
+    #         or raise OpTestError
+    #
+    def _stream(self, i_cmd, i_file, i_length, i_md5, i_progress, i_done,
+                i_total, i_remote, i_encode=None):
+        l_proc = self.cv_master.popen(i_cmd, stdin=subprocess.PIPE)
+        l_read = 0
+        l_written = 0
+        try:
+            while i_length is None or l_read < i_length:
+                l_size = self.cv_chunk
+                if i_length is not None:
+                    l_size = min(l_size, i_length - l_read)
+                l_data = i_file.read(l_size)
+                if not l_data:
+                    break
+                l_read += len(l_data)
+                if i_md5 is not None:
+                    i_md5.update(l_data)
+                if i_encode is not None:
+                    l_data = i_encode.compress(l_data)
+                l_proc.stdin.write(l_data)
+                l_written += len(l_data)
+                if i_progress is not None:
+                    i_progress(i_done + l_read, i_total)
+            if i_encode is not None:
+                l_data = i_encode.flush()
+                l_proc.stdin.write(l_data)
+                l_written += len(l_data)
+            l_proc.stdin.close()
+        except (IOError, OSError) as e:
+            l_proc.kill()
+            l_proc.wait()
+            l_msg = "Copy to %s:%s failed after %d bytes: %s" % (
+                self.cv_master.cv_host, i_remote, i_done + l_read, e)
+            print l_msg
+            raise OpTestError(l_msg)
+        l_output = l_proc.stdout.read()
+        if l_proc.wait() != 0:
+            l_msg = "Copy to %s:%s failed: %s" % (self.cv_master.cv_host,
+                                                  i_remote, l_output)
+            print l_msg
+            raise OpTestError(l_msg)
+        return l_read, l_written
+
+    ##
+    # @brief Compares the md5sum of the copy with the local one
+    #
+    def _verify(self, i_local, i_remote, i_md5):
+        if self.remote_md5(i_remote) != i_md5:
+            l_msg = "md5sum of %s:%s does not match %s" % (
+                self.cv_master.cv_host, i_remote, i_local)
+            print l_msg
+            raise OpTestError(l_msg)
+
+    def _file_md5(self, i_file):
+        l_md5 = hashlib.md5()
+        i_file.seek(0)
+        for l_data in iter(lambda: i_file.read(self.cv_chunk), ''):
+            l_md5.update(l_data)
+        i_file.seek(0)
+        return l_md5.hexdigest()
+
+    def _open(self, i_local):
+        try:
+            l_file = open(i_local, 'rb')
+            return l_file, os.fstat(l_file.fileno()).st_size
+        except (IOError, OSError) as e:
+            l_msg = "Can not read %s: %s" % (i_local, e)
+            print l_msg
+            raise OpTestError(l_msg)
+
+    ##
+    # @brief Copies a local file to the destination
+    #
+    # @param i_local @type string: local file
+    # @param i_remote @type string: destination file, or directory ending
+    #        with '/'
+    # @param i_progress: optional function called as progress(sent, total)
+    #        after every chunk, sent counting the resumed bytes too
+    # @param i_resume @type bool: continue a partial copy left on the
+    #        destination if it matches the start of the local file
+    # @param i_verify @type bool: compare the md5sum of the copy
+    #
+    # @return the number of bytes sent, or raise OpTestError
+    #
+    def put(self, i_local, i_remote, i_progress=None, i_resume=True,
+            i_verify=True):
+        if i_remote.endswith('/'):
+            i_remote += os.path.basename(i_local)
+        l_file, l_total = self._open(i_local)
+        with l_file:
+            l_md5 = hashlib.md5()
+            l_offset = 0
+            if i_resume:
+                l_offset = self.remote_size(i_remote)
+                if l_offset > l_total:
+                    l_offset = 0
+            if l_offset:
+                l_left = l_offset
+                while l_left:
+                    l_data = l_file.read(min(self.cv_chunk, l_left))
+                    l_md5.update(l_data)
+                    l_left -= len(l_data)
+                if l_md5.hexdigest() != self.remote_md5(i_remote, l_offset):
+                    print "%s on %s differs from %s, copying it again" % (
+                        i_remote, self.cv_master.cv_host, i_local)
+                    l_offset = 0
+                    l_md5 = hashlib.md5()
+                    l_file.seek(0)
+                else:
+                    print "Resuming %s at %d of %d bytes" % (i_remote, l_offset,
+                                                             l_total)
+
+            l_redirect = '>>' if l_offset else '>'
+            l_sent = l_offset + self._stream(
+                'cat %s %s' % (l_redirect, pipes.quote(i_remote)), l_file,
+                None, l_md5, i_progress, l_offset, l_total, i_remote)[0]
+
+        if l_total == l_offset and i_progress is not None:
+            i_progress(l_sent, l_total)
+        if i_verify:
+            self._verify(i_local, i_remote, l_md5.hexdigest())
+        return l_sent - l_offset
+
+    ##
+    # @brief Copies only the given regions of a local file. The destination
+    #        file is first filled with 0xFF up to the local file size, so this
+    #        suits images whose other regions are erased flash.
+    #
+    # @param i_local @type string: local file
+    # @param i_remote @type string: destination file, or directory ending
+    #        with '/'
+    # @param i_extents @type list: (offset, length) regions to send, offsets
+    #        being multiples of i_granule (see OpTestPNOR.extents)
+    # @param i_granule @type int: dd block size on the destination
+    # @param i_progress: optional progress(sent, total) callback, counting
+    #        the bytes of the extents
+    # @param i_verify @type bool: compare the md5sum of the copy
+    #
+    # @return the number of bytes sent, or raise OpTestError
+    #
+    def put_sparse(self, i_local, i_remote, i_extents,
+                   i_granule=BMC_CONST.PNOR_SCAN_CHUNK, i_progress=None,
+                   i_verify=True):
+        if i_remote.endswith('/'):
+            i_remote += os.path.basename(i_local)
+        l_path = pipes.quote(i_remote)
+        l_file, l_size = self._open(i_local)
+        l_total = sum(x[1] for x in i_extents)
+        l_sent = 0
+        with l_file:
+            self._run("tr '\\000' '\\377' < /dev/zero | head -c %d > %s"
+                      % (l_size, l_path))
+            for l_offset, l_length in i_extents:
+                if l_offset % i_granule:
+                    raise OpTestError("Extent at 0x%x is not %d byte aligned"
+                                      % (l_offset, i_granule))
+                l_file.seek(l_offset)
+                l_sent += self._stream(
+                    'dd of=%s bs=%d seek=%d conv=notrunc 2>/dev/null'
+                    % (l_path, i_granule, l_offset / i_granule),
+                    l_file, l_length, None, i_progress, l_sent, l_total,
+                    i_remote)[1]
+            if i_verify:
+                self._verify(i_local, i_remote, self._file_md5(l_file))
+        print "%s: sent %d of %d bytes in %d extents" % (i_remote, l_sent,
+                                                         l_size, len(i_extents))
+        return l_sent
+
+    ##
+    # @brief Copies a local file gzip compressed, the destination runs
+    #        'gzip -dc' to rebuild it
+    #
+    # @param i_local @type string: local file
+    # @param i_remote @type string: destination file, or directory ending
+    #        with '/'
+    # @param i_progress: optional progress(sent, total) callback, counting
+    #        uncompressed bytes
+    # @param i_verify @type bool: compare the md5sum of the copy
+    #
+    # @return the number of compressed bytes sent, or raise OpTestError
+    #
+    def put_gzip(self, i_local, i_remote, i_progress=None, i_verify=True):
+        if i_remote.endswith('/'):
+            i_remote += os.path.basename(i_local)
+        l_file, l_size = self._open(i_local)
+        l_md5 = hashlib.md5()
+        with l_file:
+            # wbits 31: gzip header and trailer
+            l_encode = zlib.compressobj(BMC_CONST.TRANSFER_GZIP_LEVEL,
+                                        zlib.DEFLATED, 31)
+            l_sent = self._stream('gzip -dc > %s' % pipes.quote(i_remote),
+                                  l_file, None, l_md5, i_progress, 0, l_size,
+                                  i_remote, l_encode)[1]
+        if i_verify:
+            self._verify(i_local, i_remote, l_md5.hexdigest())
+        print "%s: sent %d bytes compressed from %d" % (i_remote, l_sent, l_size)
+        return l_sent
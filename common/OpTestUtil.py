@@ -25,20 +25,20 @@
 # IBM_PROLOG_END_TAG
 
 import sys
-import os
 import string
-import subprocess
 import random
 import re
 import telnetlib
 import socket
 import select
 import time
-import pty
 import pexpect
 
 from OpTestConstants import OpTestConstants as BMC_CONST
 from OpTestError import OpTestError
+from OpTestReachability import OpTestReachability
+from OpTestSSHMaster import OpTestSSHMaster
+from OpTestTransfer import OpTestTransfer
 
 class OpTestUtil():
 
@@ -47,52 +47,36 @@ class OpTestUtil():
         pass
 
     ##
-    # @brief Pings 2 packages to system under test
+    # @brief Pings the system under test until it answers, with sub second
+    #        retries backing off up to BMC_CONST.REACH_POLL_MAX
     #
     # @param i_ip @type string: ip address of system under test
-    # @param i_try @type int: number of times the system is
-    #        pinged before returning Failed
+    # @param i_try @type int: the system is pinged for up to
+    #        i_try * BMC_CONST.LPAR_BRINGUP_TIME seconds before returning Failed
     #
     # @return   BMC_CONST.PING_SUCCESS when PASSED or
     #           raise OpTestError when FAILED
     #
     def PingFunc(self, i_ip, i_try=1):
 
-        arglist = "ping -c 2 " + str(i_ip)
-        while(i_try != 0):
-
-            try:
-                p1 = subprocess.Popen(
-                    arglist, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-                stdout_value, stderr_value = p1.communicate()
-            except:
-                l_msg = "Ping Test Failed."
-                print l_msg
-                raise OpTestError(l_msg)
-
-            if(stdout_value.__contains__("2 received")):
-                print ("Partition is pinging")
-                return BMC_CONST.PING_SUCCESS
-
-            else:
-                print ("Partition is not pinging")
-                i_try -= 1
-                time.sleep(BMC_CONST.LPAR_BRINGUP_TIME)
-
-        print stderr_value
-        raise OpTestError(stderr_value)
+        l_reach = OpTestReachability(i_ip)
+        l_reach.wait(['icmp'], i_try * BMC_CONST.LPAR_BRINGUP_TIME)
+        print ("Partition is pinging")
+        return BMC_CONST.PING_SUCCESS
 
     ##
-    #   @brief    This method does a scp from local system (where files are found)
-    #             to destination(Path where files will be stored)
+    #   @brief    This method copies a file from the local system (where files
+    #             are found) to the destination (Path where files will be
+    #             stored), streaming it over a persistent ssh connection. A
+    #             partial copy is resumed and the md5sum of the copy checked.
     #   @param    hostfile
     #   @param    destid
     #   @param    destName
     #   @param    destPath
     #   @param    passwd
-    #   @param    ssh_ver
-    #   @return   output from terminal
-    #   @throw    subprocess or OpTestError
+    #   @param    ssh_ver (unused, the connection always uses ssh protocol 2)
+    #   @return   transfer summary
+    #   @throw    OpTestError
     #
     def copyFilesToDest(
             self,
@@ -102,82 +86,13 @@ class OpTestUtil():
             destPath,
             passwd,
             ssh_ver="2"):
-        pid, fd = pty.fork()
-        Password = passwd + "\r\n"
-        list = ''
-        destinationPath = destid.strip() + "@" + destName.strip() + \
-            ":" + destPath
-
-        # We've spawned a separate process with the .fork above so one process
-        # will execute the scp command, and the other process will handle the
-        # back and forth of the password and the error paths
-        if pid == 0:
-            arglist = (
-                "/usr/bin/scp",
-                "-o AfsTokenPassing=no",
-                "-" +
-                ssh_ver.strip(),
-                hostfile,
-                destinationPath)
-            print(arglist)
-            os.execv("/usr/bin/scp", arglist)
-        else:
-            while True:
-                try:
-                    x = os.read(fd, 1024)
-                    print("x=" + x)
-                    if(x.__contains__('(yes/no)')):
-                        l_res = "yes\r\n"
-                        os.write(fd, l_res)
-                    if(x.__contains__('s password:')):
-                        x = ''
-                        print("Entered password")
-                        pwd = Password
-                        os.write(fd, pwd)
-                    if(x.__contains__('Password:')):
-                        x = ''
-                        os.write(fd, Password)
-                    if(x.__contains__('password')):
-                        response = Password
-                        os.write(fd, response)
-                    if(x.__contains__('yes')):
-                        response = '1' + "\r\n"
-                        os.write(fd, response)
-                    if(x.__contains__('100%')):
-                        # We copied 100% of file so break out
-                        break
-                    if(x.__contains__("Invalid ssh2 packet type")):
-                        print(x)
-                        raise OpTestError(x)
-                    if(x.__contains__("Protocol major versions differ: 1 vs. 2")):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__("Connection refused")):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__('Connection closed by')):
-                        print (x)
-                        raise OpTestError(x)
-                    if(x.__contains__("WARNING: REMOTE HOST IDENTIFICATION HAS CHANGED")):
-                        print (x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("WARNING: POSSIBLE DNS SPOOFING DETECTED")):
-                        print(x)
-                        raise OpTestError("Its a RSA key problem : \n" + x)
-                    if(x.__contains__("Permission denied")):
-                        print(x)
-                        raise OpTestError("Wrong Login or Password :" + x)
-                    list = list + x
-                    time.sleep(1)
-                except OSError as e:
-                    print("OSError string: " + e.strerror)
-                    raise OpTestError(e.strerror)
-
-        if list.__contains__("Name or service not known"):
-            reason = 'SSH Failed for :' + destid + \
-                "\n Please provide a valid Hostname"
-            print("scp command failed!")
-            raise OpTestError(reason)
-
-        print(list)
-        return list
+        l_master = OpTestSSHMaster.get_master(destName.strip(), destid.strip(),
+                                              passwd)
+        l_transfer = OpTestTransfer(l_master)
+        l_start = time.time()
+        l_sent = l_transfer.put(hostfile, destPath.rstrip('/') + '/',
+                                l_transfer.print_progress)
+        l_summary = "%s copied to %s:%s, %d bytes sent in %.1fs, md5sum ok" % (
+            hostfile, destName, destPath, l_sent, time.time() - l_start)
+        print(l_summary)
+        return l_summary